@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bench : I/O benchmarks of GF module and converters
+  times GF_FILE.read (both byte orders), read_ascii, write, and the
+  entry points of gf2lsv, gf2lsvPara and gf2vtk, on synthetic GF files
+  (see gendata.py), each case in its own process for its peak RSS.
+  the peak RSS is of the whole case process, so it includes the inputs
+  read before the timed section (e.g. MESH and FLOW for write and the
+  converters), not only the memory used while timed.
+  results are written as JSON, and compared to a baseline JSON if given.
+"""
+import sys, os
+import getopt
+import json
+import time
+import platform
+import subprocess
+import numpy
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'pyGF'))
+sys.path.insert(0, BENCH_DIR)
+import GF
+import gendata
+
+# high resolution clock where available (Python 3)
+timer = getattr(time, 'perf_counter', time.time)
+
+OPS = ('read', 'read_ascii', 'write', 'gf2lsv', 'gf2lsvPara', 'gf2vtk')
+
+
+def usage0():
+    print('usage: %s [-h|--help]' % os.path.basename(sys.argv[0]))
+    print('       %s [--nodes n] [--kinds hex,tet,mixed] [--ops op,...] \\'
+          % os.path.basename(sys.argv[0]))
+    print('          [--steps n] [--domains n] [--repeat n] [--data dir] \\')
+    print('          [--out result.json] [--baseline base.json] '
+          '[--tolerance 0.2]')
+    print('  ops: ' + ','.join(OPS))
+
+
+def peakRSS():
+    """
+    returns peak RSS of this process in KiB, or None if unknown
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss // 1024
+    return rss
+
+
+def nrecords(*gfs):
+    return sum(len(ds.data) for gf in gfs for ds in gf.dataset)
+
+
+def readGF(path):
+    gf = GF.GF_FILE()
+    if os.path.basename(path).startswith('A'):
+        ret = gf.read_ascii(path)
+    else:
+        ret = gf.read(path)
+    if not ret:
+        raise IOError('read failed: ' + path)
+    return gf
+
+
+#----- cases -----
+# each case function takes (data directory, work directory), and returns
+# (dict of stage: seconds, bytes, records)
+
+def caseRead(ddir, wdir, variant):
+    suffix = {'le': '', 'be': '.be'}[variant]
+    paths = [os.path.join(ddir, 'MESH' + suffix),
+             os.path.join(ddir, 'FLOW' + suffix)]
+    t0 = timer()
+    gfs = [readGF(p) for p in paths]
+    t1 = timer()
+    return ({'read': t1 - t0}, sum(os.path.getsize(p) for p in paths),
+            nrecords(*gfs))
+
+
+def caseReadAscii(ddir, wdir, variant):
+    paths = [os.path.join(ddir, 'AMESH'), os.path.join(ddir, 'AFLOW')]
+    t0 = timer()
+    gfs = [readGF(p) for p in paths]
+    t1 = timer()
+    return ({'read_ascii': t1 - t0}, sum(os.path.getsize(p) for p in paths),
+            nrecords(*gfs))
+
+
+def caseWrite(ddir, wdir, variant):
+    obo = {'le': '<', 'be': '>'}[variant]
+    gfs = [readGF(os.path.join(ddir, 'MESH')),
+           readGF(os.path.join(ddir, 'FLOW'))]
+    paths = [os.path.join(wdir, 'MESH.out'), os.path.join(wdir, 'FLOW.out')]
+    t0 = timer()
+    for (gf, p) in zip(gfs, paths):
+        if not gf.write(p, obo):
+            raise IOError('write failed: ' + p)
+        continue
+    t1 = timer()
+    return ({'write': t1 - t0}, sum(os.path.getsize(p) for p in paths),
+            nrecords(*gfs))
+
+
+def caseGf2lsv(ddir, wdir, variant):
+    import gf2lsv
+    mesh = readGF(os.path.join(ddir, 'MESH'))
+    data = readGF(os.path.join(ddir, 'FLOW'))
+    order = {'node': 0, 'elem': 1}[variant]
+    (outMesh, outData, outIndex) = [os.path.join(wdir, 'GFDATA' + e)
+                                    for e in ('.unm', '.und', '.idx')]
+    t0 = timer()
+    (nNode, nElem) = gf2lsv.outUnm(outMesh, mesh)
+    t1 = timer()
+    if nNode < 1 or gf2lsv.outUnd(outData, nNode, nElem, mesh, data,
+                                  order) == 0:
+        raise IOError('gf2lsv failed')
+    t2 = timer()
+    if gf2lsv.outIdx(outIndex, outMesh, outData, data, order) == 0:
+        raise IOError('gf2lsv failed')
+    t3 = timer()
+    stages = {'outUnm': t1 - t0, 'outUnd': t2 - t1, 'outIdx': t3 - t2}
+    return (stages, os.path.getsize(outMesh) + os.path.getsize(outData),
+            nrecords(mesh, data))
+
+
+def caseGf2lsvPara(ddir, wdir, variant):
+    import gf2lsvPara
+    ddd = readGF(os.path.join(ddir, 'DDD'))
+    ndom = gf2lsvPara.checkDDD(ddd)
+    if ndom < 1:
+        raise IOError('no domains, generate with --domains')
+    parts = [(readGF(os.path.join(ddir, 'MESH.P%04d' % d)),
+              readGF(os.path.join(ddir, 'FLOW.P%04d' % d)))
+             for d in range(ndom)]
+    outMesh = [os.path.join(wdir, 'GFDATA_%04d.unm' % d) for d in range(ndom)]
+    outData = [os.path.join(wdir, 'GFDATA_%04d.und' % d) for d in range(ndom)]
+    stages = {'outUnm': 0.0, 'outUnd': 0.0, 'outIdx': 0.0}
+    for d in range(ndom):
+        (mesh, data) = parts[d]
+        t0 = timer()
+        (nNode, nElem) = gf2lsvPara.outUnm(outMesh[d], mesh, ddd, d)
+        t1 = timer()
+        if nNode < 1 or gf2lsvPara.outUnd(outData[d], nNode, nElem,
+                                          mesh, data, 0) == 0:
+            raise IOError('gf2lsvPara failed')
+        t2 = timer()
+        stages['outUnm'] = stages['outUnm'] + t1 - t0
+        stages['outUnd'] = stages['outUnd'] + t2 - t1
+        continue
+    t0 = timer()
+    if gf2lsvPara.outIdx(os.path.join(wdir, 'GFDATA.idx'), outMesh,
+                         outData, parts[-1][1], 0) == 0:
+        raise IOError('gf2lsvPara failed')
+    stages['outIdx'] = timer() - t0
+    nbytes = sum(os.path.getsize(p) for p in outMesh + outData)
+    return (stages, nbytes, nrecords(ddd, *[g for p in parts for g in p]))
+
+
+def caseGf2vtk(ddir, wdir, variant):
+    try:
+        import vtk
+    except ImportError:
+        return None
+    import gf2vtk
+    mesh = readGF(os.path.join(ddir, 'MESH'))
+    data = readGF(os.path.join(ddir, 'FLOW'))
+    outvtk = os.path.join(wdir, 'GFDATA.vtk')
+    t0 = timer()
+    grid = vtk.vtkUnstructuredGrid()
+    (nNode, nElem) = gf2vtk.setupMesh(grid, mesh)
+    t1 = timer()
+    if nNode < 1 or gf2vtk.setupData(nNode, nElem, grid, data, 0) == 0:
+        raise IOError('gf2vtk failed')
+    t2 = timer()
+    if not gf2vtk.outVTK(outvtk, grid):
+        raise IOError('gf2vtk failed')
+    t3 = timer()
+    stages = {'setupMesh': t1 - t0, 'setupData': t2 - t1, 'outVTK': t3 - t2}
+    return (stages, os.path.getsize(outvtk), nrecords(mesh, data))
+
+
+CASES = {
+    'read': (caseRead, ('le', 'be')),
+    'read_ascii': (caseReadAscii, ('',)),
+    'write': (caseWrite, ('le', 'be')),
+    'gf2lsv': (caseGf2lsv, ('node', 'elem')),
+    'gf2lsvPara': (caseGf2lsvPara, ('',)),
+    'gf2vtk': (caseGf2vtk, ('',)),
+}
+
+
+def caseNames(ops, kinds):
+    names = []
+    for op in ops:
+        for kind in kinds:
+            for v in CASES[op][1]:
+                names.append('.'.join([x for x in (op, kind, v) if x]))
+                continue
+            continue
+        continue
+    return names
+
+
+def runCase(name, datadir, repeat):
+    """
+    run a case repeat times in this process
+    returns dict of the result of the best run
+    """
+    parts = name.split('.')
+    (op, kind) = (parts[0], parts[1])
+    variant = len(parts) > 2 and parts[2] or ''
+    ddir = os.path.join(datadir, kind)
+    wdir = os.path.join(datadir, 'work')
+    if not os.path.isdir(wdir):
+        os.makedirs(wdir)
+
+    best = None
+    for i in range(repeat):
+        ret = CASES[op][0](ddir, wdir, variant)
+        if ret is None:
+            return {'skipped': True}
+        (stages, nbytes, nrec) = ret
+        sec = sum(stages.values())
+        if best is None or sec < best[0]:
+            best = (sec, stages, nbytes, nrec)
+        continue
+    (sec, stages, nbytes, nrec) = best
+    sec = max(sec, 1e-9)
+    return {'seconds': sec, 'stages': stages, 'bytes': nbytes,
+            'records': nrec, 'MB_per_s': nbytes / sec / 1.0e6,
+            'records_per_s': nrec / sec, 'peak_rss_kb': peakRSS()}
+
+
+def prepare(datadir, kinds, nodes, steps, domains, ascii):
+    """
+    generate data of kinds into datadir, unless generated with same params
+    """
+    params = {'nodes': nodes, 'steps': steps, 'domains': domains,
+              'ascii': ascii}
+    for kind in kinds:
+        ddir = os.path.join(datadir, kind)
+        pfile = os.path.join(ddir, 'params.json')
+        try:
+            if json.load(open(pfile)) == params:
+                continue
+        except:
+            pass
+        sys.stdout.write('generating %s mesh of %d nodes ...' % (kind, nodes))
+        sys.stdout.flush()
+        gendata.generate(ddir, nodes, kind, steps, domains, ascii)
+        json.dump(params, open(pfile, 'w'))
+        print('done')
+        continue
+    return params
+
+
+def compare(result, baseline, tolerance):
+    """
+    print ratios of seconds and peak RSS of result to baseline
+    returns list of names of regressed cases
+    """
+    regressed = []
+    print('%-28s %10s %10s %7s %7s' % ('case', 'base[s]', 'new[s]',
+                                        'time', 'rss'))
+    for name in sorted(result['cases']):
+        new = result['cases'][name]
+        base = baseline.get('cases', {}).get(name)
+        if base is None or 'seconds' not in base or 'seconds' not in new:
+            continue
+        tr = new['seconds'] / max(base['seconds'], 1e-9)
+        rr = None
+        if new.get('peak_rss_kb') and base.get('peak_rss_kb'):
+            rr = float(new['peak_rss_kb']) / base['peak_rss_kb']
+        mark = ''
+        if tr > 1.0 + tolerance or (rr is not None and rr > 1.0 + tolerance):
+            mark = '  REGRESSION'
+            regressed.append(name)
+        print('%-28s %10.4f %10.4f %6.2fx %7s%s' %
+              (name, base['seconds'], new['seconds'], tr,
+               rr is None and '-' or '%.2fx' % rr, mark))
+        continue
+    return regressed
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'h',
+                                   ['nodes=', 'kinds=', 'ops=', 'steps=',
+                                    'domains=', 'repeat=', 'data=', 'out=',
+                                    'baseline=', 'tolerance=', 'run=',
+                                    'help'])
+    except getopt.GetoptError:
+        usage0()
+        sys.exit(1)
+
+    (nodes, kinds, ops, steps, domains) = (10000, gendata.KINDS, OPS, 1, 2)
+    (repeat, datadir, outfile) = (3, 'bench_data', None)
+    (basefile, tolerance, run) = (None, 0.2, None)
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage0()
+            sys.exit(0)
+        if o == '--nodes':
+            nodes = int(float(a))
+        elif o == '--kinds':
+            kinds = a.split(',')
+        elif o == '--ops':
+            ops = a.split(',')
+        elif o == '--steps':
+            steps = int(a)
+        elif o == '--domains':
+            domains = int(a)
+        elif o == '--repeat':
+            repeat = int(a)
+        elif o == '--data':
+            datadir = a
+        elif o == '--out':
+            outfile = a
+        elif o == '--baseline':
+            basefile = a
+        elif o == '--tolerance':
+            tolerance = float(a)
+        elif o == '--run':
+            run = a
+        continue
+
+    if run is not None:
+        # child: run a case and print its result
+        print(json.dumps(runCase(run, datadir, repeat)))
+        sys.exit(0)
+
+    for x in kinds:
+        if x not in gendata.KINDS:
+            print('%s: invalid kind: %s' % (sys.argv[0], x))
+            sys.exit(1)
+    for x in ops:
+        if x not in OPS:
+            print('%s: invalid op: %s' % (sys.argv[0], x))
+            sys.exit(1)
+    if 'gf2lsvPara' not in ops:
+        domains = 0
+    params = prepare(datadir, kinds, nodes, steps, domains,
+                     'read_ascii' in ops)
+
+    result = {'meta': {'python': platform.python_version(),
+                       'numpy': numpy.__version__,
+                       'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'repeat': repeat,
+                       'peak_rss_kb': 'peak RSS of the case process, '
+                       'including inputs read before the timed section'},
+              'params': params, 'cases': {}}
+    failed = False
+    for name in caseNames(ops, kinds):
+        sys.stdout.write('%-28s ' % name)
+        sys.stdout.flush()
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                 '--run', name, '--data', datadir,
+                                 '--repeat', str(repeat)],
+                                stdout=subprocess.PIPE)
+        out = proc.communicate()[0]
+        try:
+            res = json.loads(out.decode('utf-8').strip().split('\n')[-1])
+        except:
+            res = {'failed': True}
+        if proc.returncode != 0:
+            res = {'failed': True}
+        result['cases'][name] = res
+        if res.get('failed'):
+            failed = True
+            print('failed')
+        elif res.get('skipped'):
+            print('skipped')
+        else:
+            print('%9.4f s %9.1f MB/s %11.1f rec/s %9s KiB' %
+                  (res['seconds'], res['MB_per_s'], res['records_per_s'],
+                   res['peak_rss_kb']))
+        continue
+
+    if outfile is not None:
+        ofp = open(outfile, 'w')
+        json.dump(result, ofp, indent=1, sort_keys=True)
+        ofp.close()
+
+    if basefile is not None:
+        baseline = json.load(open(basefile))
+        if compare(result, baseline, tolerance):
+            sys.exit(2)
+    if failed:
+        sys.exit(3)
+    sys.exit(0)
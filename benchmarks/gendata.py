@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+gendata : generate synthetic GF files for benchmarks
+  mesh: structured hex, tet (6 tetras per cell) or mixed hex/pyramid/tet
+  flow: *TIME_PS, *STEP_PS, *VELO_3D (nodes) and *PRES_3E (elements)
+  ddd:  domains as slabs of cell layers, for gf2lsvPara
+written in binary (little and big endian) and ascii GF formats.
+"""
+import sys, os
+import getopt
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pyGF'))
+import GF
+
+KINDS = ('hex', 'tet', 'mixed')
+
+# corners of a hex cell, as offsets of (i, j, k)
+HEX_CORNERS = ((0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+               (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1))
+
+# tetras of a hex cell around its diagonal 0-6, by corners
+TET_CORNERS = ((0, 1, 2, 6), (0, 2, 3, 6), (0, 3, 7, 6),
+               (0, 7, 4, 6), (0, 4, 5, 6), (0, 5, 1, 6))
+
+
+def usage0():
+    print('usage: %s [-h|--help]' % os.path.basename(sys.argv[0]))
+    print('       %s [--nodes n] [--kind hex|tet|mixed] [--steps n] \\'
+          % os.path.basename(sys.argv[0]))
+    print('          [--domains n] [--ascii] [--out dir]')
+
+
+def gridDims(nodes):
+    """
+    returns number of nodes along an edge of a cube of about nodes nodes
+    """
+    return max(2, int(round(nodes ** (1.0 / 3.0))))
+
+
+def _gfData(atp, keyword, comment, ary):
+    """
+    make a GF_DATA keeping ary (int32/float32) as is
+    """
+    d = GF.GF_DATA()
+    d.native = True
+    d.setType(atp)
+    d.keyword = keyword
+    d.comment = comment.ljust(30)[:30]
+    d.aryNum = [ary.shape[0], ary.shape[1]]
+    d.array = ary
+    return d
+
+
+def _gfFile(comment, datasets):
+    """
+    make a GF_FILE of datasets, list of list of GF_DATA
+    """
+    f = GF.GF_FILE()
+    f.fileType = '#U_GF_V1'
+    f.comment = [comment.ljust(60)[:60]]
+    for datas in datasets:
+        ds = GF.GF_DATASET()
+        ds.comment = [comment.ljust(60)[:60]]
+        for d in datas:
+            ds.append(d)
+            continue
+        f.dataset.append(ds)
+        continue
+    return f
+
+
+def cells(n):
+    """
+    returns (ijk of cells, node table of hex cells, 1-based) of a
+    structured grid of n x n x n nodes
+    """
+    m = n - 1
+    (k, j, i) = numpy.mgrid[0:m, 0:m, 0:m].reshape(3, -1)
+    base = i + n * (j + n * k)
+    off = numpy.array([c[0] + n * (c[1] + n * c[2]) for c in HEX_CORNERS])
+    tbl = (base[:, None] + off[None, :] + 1).astype(numpy.int32)
+    return ((i, j, k), tbl)
+
+
+def meshArrays(kind, n):
+    """
+    returns (coordinates (nNode, 3), node table (nElem, 8), cell layer
+    of each element) of a synthetic mesh of n x n x n nodes
+    """
+    x = numpy.linspace(0.0, 1.0, n).astype(numpy.float32)
+    (z, y, xx) = numpy.meshgrid(x, x, x, indexing='ij')
+    xyz = numpy.empty((n * n * n, 3), dtype=numpy.float32)
+    xyz[:, 0] = xx.reshape(-1)
+    xyz[:, 1] = y.reshape(-1)
+    xyz[:, 2] = z.reshape(-1)
+    del z, y, xx
+
+    ((i, j, k), hexa) = cells(n)
+    if kind == 'hex':
+        return (xyz, hexa, k)
+
+    tets = numpy.zeros((len(hexa) * 6, 8), dtype=numpy.int32)
+    for t in range(6):
+        tets[t::6, 0:4] = hexa[:, TET_CORNERS[t]]
+        continue
+    if kind == 'tet':
+        return (xyz, tets, numpy.repeat(k, 6))
+
+    # mixed: cells of (i + j + k) % 3 == 0, 1, 2 as hexa, pyramid, tetras
+    sel = (i + j + k) % 3
+    pyra = hexa[sel == 1].copy()
+    pyra[:, 5:8] = 0
+    tsel = numpy.repeat(sel == 2, 6)
+    tbl = numpy.concatenate((hexa[sel == 0], pyra, tets[tsel]))
+    layer = numpy.concatenate((k[sel == 0], k[sel == 1],
+                               numpy.repeat(k, 6)[tsel]))
+    return (xyz, tbl, layer)
+
+
+def makeMesh(xyz, tbl):
+    return _gfFile('MESH', [[
+        _gfData(GF.FLT_ARY_TYPE, '*GRID_3D', 'GRID COORDINATES (3-D)', xyz),
+        _gfData(GF.INT_ARY_TYPE, '*NODE_3D', 'NODE TABLE (3-D)', tbl)]])
+
+
+def makeFlow(nNode, nElem, steps):
+    datasets = []
+    for s in range(steps):
+        t = numpy.array([[0.01 * s]], dtype=numpy.float32)
+        stp = numpy.array([[s]], dtype=numpy.int32)
+        velo = numpy.arange(nNode * 3, dtype=numpy.float32).reshape(-1, 3)
+        velo *= numpy.float32(1.0e-3)
+        velo += numpy.float32(s)
+        pres = numpy.arange(nElem, dtype=numpy.float32).reshape(-1, 1)
+        pres += numpy.float32(s)
+        datasets.append([
+            _gfData(GF.FLT_ARY_TYPE, '*TIME_PS', 'TIME', t),
+            _gfData(GF.INT_ARY_TYPE, '*STEP_PS', 'STEP', stp),
+            _gfData(GF.FLT_ARY_TYPE, '*VELO_3D',
+                    'FLOW VELOCITY AT NODES (3-D)', velo),
+            _gfData(GF.FLT_ARY_TYPE, '*PRES_3E',
+                    'PRESSURE AT ELEMENTS (3-D)', pres)])
+        continue
+    return _gfFile('FLOW', datasets)
+
+
+def makeDomains(xyz, tbl, layer, ndom):
+    """
+    split a mesh into ndom slabs of cell layers
+    returns (list of (mesh GF_FILE, flow GF_FILE), ddd GF_FILE)
+    """
+    nlayer = int(layer.max()) + 1
+    dom = layer * ndom // nlayer
+    nodeDoms = numpy.zeros((len(xyz), ndom), dtype=bool)
+    elems = []
+    for d in range(ndom):
+        eidx = numpy.nonzero(dom == d)[0]
+        sub = tbl[eidx]
+        nodes = numpy.unique(sub[sub > 0]) # 1-based global ids
+        nodeDoms[nodes - 1, d] = True
+        elems.append((eidx, sub, nodes))
+        continue
+
+    parts = []
+    ddd = []
+    for d in range(ndom):
+        (eidx, sub, nodes) = elems[d]
+        local = numpy.zeros_like(sub)
+        nz = sub > 0
+        local[nz] = numpy.searchsorted(nodes, sub[nz]) + 1
+        mesh = makeMesh(xyz[nodes - 1], local.astype(numpy.int32))
+        flow = makeFlow(len(nodes), len(eidx), 1)
+
+        # boundary nodes: (local node id, neighbor domain id), 1-based
+        bnd = []
+        for e in range(ndom):
+            if e == d:
+                continue
+            shared = numpy.nonzero(nodeDoms[nodes - 1, e])[0] + 1
+            for nid in shared:
+                bnd.append((nid, e + 1))
+            continue
+        if len(bnd) < 1:
+            bnd = [(1, d + 1)]
+        ddd.append([
+            _gfData(GF.INT_ARY_TYPE, '*NODE_GL', 'GLOBAL NODE IDS',
+                    nodes.astype(numpy.int32).reshape(-1, 1)),
+            _gfData(GF.INT_ARY_TYPE, '*ELEM_GL', 'GLOBAL ELEM IDS',
+                    (eidx + 1).astype(numpy.int32).reshape(-1, 1)),
+            _gfData(GF.INT_ARY_TYPE, '*BOUN_PE', 'BOUNDARY NODES',
+                    numpy.array(bnd, dtype=numpy.int32))])
+        parts.append((mesh, flow))
+        continue
+    return (parts, _gfFile('DDD', ddd))
+
+
+def writeAscii(gf, path, chunk = 65536):
+    """
+    write a GF_FILE into an ascii GF file
+    """
+    ofp = open(path, 'w')
+    ofp.write(gf.fileType.replace('#U_', '#A_') + '\n')
+    ofp.write('%d\n' % len(gf.comment))
+    for c in gf.comment:
+        ofp.write(c + '\n')
+    for ds in gf.dataset:
+        ofp.write('#NEW_SET\n%d\n' % len(ds.comment))
+        for c in ds.comment:
+            ofp.write(c + '\n')
+        for d in ds.data:
+            if d.aryType == GF.FLT_ARY_TYPE:
+                (tag, fmt) = ('#FLT_ARY', '%.7e')
+            else:
+                (tag, fmt) = ('#INT_ARY', '%d')
+            ofp.write('%s\n%s\n%s\n' % (tag, d.keyword, d.comment))
+            ofp.write('%d %d\n' % (d.aryNum[1], d.aryNum[0]))
+            for i in range(0, d.aryNum[0], chunk):
+                numpy.savetxt(ofp, d.array[i:i+chunk], fmt=fmt)
+                continue
+            continue
+        continue
+    ofp.write('#ENDFILE\n')
+    ofp.close()
+    return True
+
+
+def generate(outdir, nodes, kind, steps = 1, domains = 0, ascii = True):
+    """
+    generate GF files of a synthetic mesh into outdir:
+      MESH, FLOW (little endian), MESH.be, FLOW.be (big endian),
+      AMESH, AFLOW (ascii, if ascii), and DDD, MESH.Pnnnn, FLOW.Pnnnn
+      (if domains > 0)
+    returns dict of name: path
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    n = gridDims(nodes)
+    (xyz, tbl, layer) = meshArrays(kind, n)
+    mesh = makeMesh(xyz, tbl)
+    flow = makeFlow(len(xyz), len(tbl), steps)
+
+    files = {}
+    for (name, gf, obo) in (('MESH', mesh, '<'), ('FLOW', flow, '<'),
+                            ('MESH.be', mesh, '>'), ('FLOW.be', flow, '>')):
+        path = os.path.join(outdir, name)
+        if not gf.write(path, obo):
+            raise IOError('write failed: ' + path)
+        files[name] = path
+        continue
+    if ascii:
+        for (name, gf) in (('AMESH', mesh), ('AFLOW', flow)):
+            path = os.path.join(outdir, name)
+            writeAscii(gf, path)
+            files[name] = path
+            continue
+    del mesh, flow
+
+    if domains > 0:
+        (parts, ddd) = makeDomains(xyz, tbl, layer, domains)
+        path = os.path.join(outdir, 'DDD')
+        ddd.write(path)
+        files['DDD'] = path
+        for d in range(domains):
+            for (name, gf) in (('MESH.P%04d' % d, parts[d][0]),
+                               ('FLOW.P%04d' % d, parts[d][1])):
+                path = os.path.join(outdir, name)
+                gf.write(path)
+                files[name] = path
+                continue
+            continue
+    return files
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'h',
+                                   ['nodes=', 'kind=', 'steps=', 'domains=',
+                                    'ascii', 'out=', 'help'])
+    except getopt.GetoptError:
+        usage0()
+        sys.exit(1)
+
+    (nodes, kind, steps, domains) = (10000, 'hex', 1, 0)
+    (ascii, outdir) = (False, '.')
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage0()
+            sys.exit(0)
+        if o == '--nodes':
+            nodes = int(float(a))
+            continue
+        if o == '--kind':
+            kind = a
+            continue
+        if o == '--steps':
+            steps = int(a)
+            continue
+        if o == '--domains':
+            domains = int(a)
+            continue
+        if o == '--ascii':
+            ascii = True
+            continue
+        if o == '--out':
+            outdir = a
+            continue
+        continue
+    if kind not in KINDS:
+        print('%s: invalid kind: %s' % (sys.argv[0], kind))
+        usage0()
+        sys.exit(1)
+
+    files = generate(outdir, nodes, kind, steps, domains, ascii)
+    for name in sorted(files):
+        print('%s: %d bytes' % (files[name], os.path.getsize(files[name])))
+        continue
+    sys.exit(0)
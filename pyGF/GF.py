@@ -3,13 +3,666 @@
 """
 GF File representation for FFB
 """
-import sys
+import sys, os
+import copy
+import time
 import struct
+import threading
+import mmap as _mmap
+import numbers
+import collections
+import hashlib
+import json
 import numpy
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 INT_ARY_TYPE = int
 FLT_ARY_TYPE = float
 
+# max size in bytes of a temporary buffer used for writing an array
+WRITE_CHUNK_SIZE = 16 * 1024 * 1024
+
+# number of lines of ascii GF file converted at once
+ASCII_CHUNK_LINES = 65536
+
+# max length in bytes of a subrecord with 4-byte record markers;
+# longer records are split into subrecords, as gfortran/ifort do
+SUBRECORD_MAX = 2147483639
+
+# max gap in bytes between rows which GF_DATA.read_rows reads at once
+READ_GAP_SIZE = 64 * 1024
+
+# default of GF_DATA.native; if True, arrays are kept in memory as
+# int32/float32 as stored in GF files, instead of int/float
+NATIVE_DTYPE = False
+
+# process-wide cache of GF files used by GF_FILE.read/read_ascii;
+# None (default) as no cache, or set a GF_CACHE to enable it
+CACHE = None
+
+# on-disk cache of ascii GF files used by GF_FILE.read_ascii;
+# None (default) as no cache, or set a GF_SIDECAR to enable it
+SIDECAR = None
+
+# number of chunks queued to the thread compressing output
+COMPRESS_QUEUE_SIZE = 4
+
+# collector of per-record I/O events of read and write paths;
+# None (default) as no profiling, or set a GF_PROFILE to enable it
+PROFILE = None
+
+# high resolution clock for profiling, where available (Python 3)
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _aryDtype(atp, bo = '='):
+    """
+    numpy dtype of the 4-byte on-disk representation of a GF array
+      atp: INT_ARY_TYPE or FLT_ARY_TYPE
+      bo: byte order, '<' as little-endian, '>' as big-endian,
+          '=' as system byte order.
+    """
+    if atp == INT_ARY_TYPE:
+        return numpy.dtype(bo+'i4')
+    return numpy.dtype(bo+'f4')
+
+
+def _memType(atp, native):
+    """
+    in-memory dtype of a GF array
+      atp: INT_ARY_TYPE or FLT_ARY_TYPE
+      native: if True, 4-byte dtype as stored in GF file
+    """
+    if native:
+        return _aryDtype(atp)
+    return numpy.dtype(atp)
+
+
+def _recFmt(bo, rm, body = ''):
+    """
+    struct format of a Fortran record (marker, body, marker)
+      bo: byte order, '<' as little-endian, '>' as big-endian,
+          '=' as system byte order.
+      rm: size of record markers, 4 or 8
+      body: struct format of the record body, '' for a marker alone
+    """
+    if rm == 8:
+        m = 'q'
+    else:
+        m = 'i'
+    if body == '':
+        return bo + m
+    return bo + m + body + m
+
+
+def _str(b):
+    """
+    returns a string field of a record as str (bytes are decoded as
+    latin-1 on Python 3)
+    """
+    if isinstance(b, bytes) and not isinstance(b, str):
+        return b.decode('latin-1')
+    return b
+
+
+def _bytes(s):
+    """
+    returns a string as bytes for a string field of a record
+    """
+    if isinstance(s, bytes):
+        return s
+    return s.encode('latin-1')
+
+
+def _readRec(ifp, bo, rm, body):
+    """
+    read a Fortran record of fixed format
+      body: struct format of the record body
+    returns tuple of (marker, values..., marker), with strings as str
+    """
+    fmt = _recFmt(bo, rm, body)
+    buff = struct.unpack(fmt, ifp.read(struct.calcsize(fmt)))
+    if 's' in body:
+        buff = tuple([_str(x) for x in buff])
+    return buff
+
+
+def _readPayload(ifp, bo, rm, sz):
+    """
+    read the body of a Fortran record of sz bytes, which may be split
+    into subrecords (negative markers, see SUBRECORD_MAX)
+    returns the bytes (possibly followed by the trailing marker),
+    or None if failed.
+    """
+    mf = _recFmt(bo, rm)
+    try:
+        head = struct.unpack(mf, ifp.read(rm))[0]
+        if head == sz:
+            # single record, read the body and trailer at once
+            # (into a writable buffer, which the array can view as is)
+            if hasattr(ifp, 'readinto'):
+                buff = bytearray(sz + rm)
+                n = ifp.readinto(buff)
+            else:
+                buff = ifp.read(sz + rm)
+                n = len(buff)
+            if n != sz + rm:
+                return None
+            if struct.unpack_from(mf, buff, sz)[0] != sz:
+                return None
+            return buff
+
+        # subrecords: leading marker < 0 if more subrecords follow,
+        #             trailing marker < 0 if preceded by a subrecord
+        if head >= 0:
+            return None
+        buff = bytearray(sz)
+        (pos, first) = (0, True)
+        while ( True ):
+            n = abs(head)
+            if pos + n > sz:
+                return None
+            data = ifp.read(n)
+            if len(data) != n:
+                return None
+            buff[pos:pos+n] = data
+            pos = pos + n
+            tail = struct.unpack(mf, ifp.read(rm))[0]
+            if abs(tail) != n or (tail < 0) == first:
+                return None
+            if head >= 0:
+                break
+            head = struct.unpack(mf, ifp.read(rm))[0]
+            first = False
+            continue
+    except:
+        return None
+    if pos != sz:
+        return None
+    return buff
+
+
+def _skipPayload(ifp, bo, rm, sz):
+    """
+    seek past the body of a Fortran record of sz bytes, which may be split
+    into subrecords, checking its markers
+    """
+    mf = _recFmt(bo, rm)
+    (pos, first) = (0, True)
+    try:
+        head = struct.unpack(mf, ifp.read(rm))[0]
+        while ( True ):
+            n = abs(head)
+            ifp.seek(n, 1)
+            pos = pos + n
+            tail = struct.unpack(mf, ifp.read(rm))[0]
+            if abs(tail) != n or (tail < 0) != (not first):
+                return False
+            if head >= 0:
+                break
+            head = struct.unpack(mf, ifp.read(rm))[0]
+            first = False
+            continue
+    except:
+        return False
+    return pos == sz
+
+
+def _readRange(ifp, segs, start, n):
+    """
+    read n bytes from start of a record payload located by segs
+    (see GF_DATA._segments)
+    returns the bytes, or None if failed.
+    """
+    if n == 0:
+        return b''
+    parts = []
+    try:
+        for (pos, fpos, sz) in segs:
+            if pos + sz <= start or pos >= start + n:
+                continue
+            p0 = max(start, pos)
+            p1 = min(start + n, pos + sz)
+            ifp.seek(fpos + p0 - pos)
+            parts.append(ifp.read(p1 - p0))
+            continue
+    except:
+        return None
+    if len(parts) == 1:
+        buff = parts[0]
+    else:
+        buff = b''.join(parts)
+    if len(buff) != n:
+        return None
+    return buff
+
+
+def _writePayload(ofp, bo, rm, ary, dt, stat = None):
+    """
+    write a 2D array as the body of a Fortran record, converted to dt by
+    chunks of rows (see WRITE_CHUNK_SIZE). with 4-byte markers, bodies
+    longer than SUBRECORD_MAX are split into subrecords.
+      stat: if not None, list [seconds] to add the time of conversion to
+    """
+    (num, num2) = (ary.shape[0], ary.shape[1])
+    sz = dt.itemsize * num * num2
+    if rm == 8 or sz <= SUBRECORD_MAX:
+        lens = [sz,]
+    else:
+        lens = [SUBRECORD_MAX,] * (sz // SUBRECORD_MAX)
+        if sz % SUBRECORD_MAX > 0:
+            lens.append(sz % SUBRECORD_MAX)
+    last = len(lens) - 1
+    mf = _recFmt(bo, rm)
+
+    try:
+        (iseg, left) = (0, lens[0])
+        if last > 0:
+            ofp.write(struct.pack(mf, -lens[0]))
+        else:
+            ofp.write(struct.pack(mf, lens[0]))
+
+        # cast to the on-disk dtype by chunks of rows, so that
+        # the temporary copy is bounded by WRITE_CHUNK_SIZE
+        step = max(1, WRITE_CHUNK_SIZE // (dt.itemsize * num2))
+        for i in range(0, num, step):
+            if stat is not None:
+                t0 = _clock()
+            buff = numpy.ascontiguousarray(ary[i:i+step], dtype=dt).tobytes()
+            if stat is not None:
+                stat[0] = stat[0] + _clock() - t0
+            pos = 0
+            while ( pos < len(buff) ):
+                if left == 0:
+                    # close the subrecord and start the next one
+                    if iseg > 0:
+                        ofp.write(struct.pack(mf, -lens[iseg]))
+                    else:
+                        ofp.write(struct.pack(mf, lens[iseg]))
+                    iseg = iseg + 1
+                    left = lens[iseg]
+                    if iseg < last:
+                        ofp.write(struct.pack(mf, -left))
+                    else:
+                        ofp.write(struct.pack(mf, left))
+                n = min(left, len(buff) - pos)
+                if pos == 0 and n == len(buff):
+                    ofp.write(buff)
+                else:
+                    ofp.write(buff[pos:pos+n])
+                pos = pos + n
+                left = left - n
+                continue
+            continue
+
+        if iseg > 0:
+            ofp.write(struct.pack(mf, -lens[iseg]))
+        else:
+            ofp.write(struct.pack(mf, lens[iseg]))
+    except:
+        return False
+    return True
+
+
+_preadLock = threading.Lock()
+
+def _pread(fd, n, pos):
+    """
+    read n bytes at pos of an opened file descriptor, without using
+    a shared file position (os.pread, or lseek/read under a lock
+    where os.pread is not available)
+    returns the bytes, which are shorter than n at EOF.
+    """
+    parts = []
+    while ( n > 0 ):
+        if hasattr(os, 'pread'):
+            data = os.pread(fd, min(n, 0x40000000), pos)
+        else:
+            with _preadLock:
+                os.lseek(fd, pos, 0)
+                data = os.read(fd, min(n, 0x40000000))
+        if not data:
+            break
+        parts.append(data)
+        n = n - len(data)
+        pos = pos + len(data)
+        continue
+    if len(parts) == 1:
+        return parts[0]
+    return b''.join(parts)
+
+
+class _PosReader(object):
+    """
+    file-like reader over an opened file descriptor with its own position,
+    reading by _pread; several readers can share one descriptor among
+    threads.
+    """
+    def __init__(self, fd, pos = 0):
+        self.fd = fd
+        self.pos = pos
+        return
+
+    def _size(self):
+        return os.fstat(self.fd).st_size
+
+    def read(self, n = -1):
+        if n < 0:
+            n = self._size() - self.pos
+        data = _pread(self.fd, n, self.pos)
+        self.pos = self.pos + len(data)
+        return data
+
+    def seek(self, offset, whence = 0):
+        if whence == 1:
+            offset = self.pos + offset
+        elif whence == 2:
+            offset = self._size() + offset
+        self.pos = offset
+        return
+
+    def tell(self):
+        return self.pos
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        # the descriptor is owned by the opener
+        return
+
+
+class _MapReader(_PosReader):
+    """
+    file-like reader over a read-only mmap of a whole file with its own
+    position; several readers can share one mmap among threads.
+    """
+    def __init__(self, fd, mm, pos = 0):
+        _PosReader.__init__(self, fd, pos)
+        self.mm = mm
+        return
+
+    def _size(self):
+        return len(self.mm)
+
+    def read(self, n = -1):
+        if n < 0:
+            n = len(self.mm) - self.pos
+        data = self.mm[self.pos:self.pos+n]
+        self.pos = self.pos + len(data)
+        return data
+
+
+def _openMap(path):
+    """
+    open a binary GF file as a _MapReader over a read-only mmap of the
+    whole file; arrays mapped through it are views of the one mmap (one
+    mapping and descriptor per file), which is unmapped when no array
+    refers it.
+    returns the reader, or None if failed.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except:
+        return None
+    try:
+        mm = _mmap.mmap(fd, 0, access=_mmap.ACCESS_READ)
+    except:
+        mm = None
+    os.close(fd) # mmap keeps its own
+    if mm is None:
+        return None
+    return _MapReader(None, mm)
+
+
+def _loadData(args):
+    """
+    load array of a scanned GF_DATA through its own reader
+      args: (GF_DATA, _PosReader, native)
+    """
+    (data, reader, native) = args
+    try:
+        return data.load(reader, False, native)
+    except:
+        return False
+
+
+class _StreamReader(object):
+    """
+    file-like reader over a decompressing stream, which can not be seeked
+    randomly; seeks forward by skipping, and backward within HISTORY bytes
+    read last (enough for rewinding a record header or a line).
+    """
+    HISTORY = 64 * 1024
+
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0
+        self.hist = bytearray() # bytes read last, up to pos
+        self.back = b''         # bytes pushed back by seek, from pos
+        return
+
+    def _deliver(self, data):
+        self.pos = self.pos + len(data)
+        if len(data) >= self.HISTORY:
+            self.hist = bytearray(data[-self.HISTORY:])
+        else:
+            self.hist.extend(data)
+            if len(self.hist) > 2 * self.HISTORY:
+                del self.hist[:-self.HISTORY]
+        return data
+
+    def read(self, n = -1):
+        if not self.back:
+            return self._deliver(self.f.read(n))
+        if n < 0:
+            data = self.back + self.f.read()
+            self.back = b''
+        elif n <= len(self.back):
+            data = self.back[:n]
+            self.back = self.back[n:]
+        else:
+            data = self.back + self.f.read(n - len(self.back))
+            self.back = b''
+        return self._deliver(data)
+
+    def readline(self):
+        i = self.back.find(b'\n')
+        if i >= 0:
+            line = self.back[:i+1]
+            self.back = self.back[i+1:]
+        else:
+            line = self.back + self.f.readline()
+            self.back = b''
+        return self._deliver(line)
+
+    def seek(self, offset, whence = 0):
+        if whence == 1:
+            offset = self.pos + offset
+        elif whence != 0:
+            raise IOError('can not seek from the end of a stream')
+        if offset < self.pos:
+            d = self.pos - offset
+            if d > len(self.hist):
+                raise IOError('can not seek backward in a stream')
+            self.back = bytes(self.hist[-d:]) + self.back
+            del self.hist[-d:]
+            self.pos = offset
+        while ( offset > self.pos ):
+            n = min(offset - self.pos, WRITE_CHUNK_SIZE)
+            if not self.read(n):
+                raise IOError('can not seek past the end of a stream')
+            continue
+        return
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        self.f.close()
+        return
+
+
+class _ThreadedWriter(object):
+    """
+    file-like writer passing data to a compressing file object, which
+    compresses in a background thread; errors are raised on close().
+    """
+    def __init__(self, f):
+        self.f = f
+        self.error = None
+        self.queue = queue.Queue(COMPRESS_QUEUE_SIZE)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return
+
+    def _run(self):
+        while ( True ):
+            buff = self.queue.get()
+            if buff is None:
+                break
+            if self.error is None:
+                try:
+                    self.f.write(buff)
+                except Exception as e:
+                    self.error = e
+            continue
+        return
+
+    def write(self, buff):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(buff)
+        return
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.f.close()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        if self.error is not None:
+            raise self.error
+        return
+
+
+class _TextReader(object):
+    """
+    reader of lines of a binary file object as str (decoded as latin-1),
+    with positions in bytes; for ascii GF files on Python 3.
+    """
+    def __init__(self, f):
+        self.f = f
+        return
+
+    def readline(self):
+        return self.f.readline().decode('latin-1')
+
+    def seek(self, offset, whence = 0):
+        return self.f.seek(offset, whence)
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+        return
+
+
+def _openRead(path, mode = 'rb'):
+    """
+    open a GF file for reading; a compressed file (gzip, bzip2 or xz,
+    detected by its magic bytes) is opened as a _StreamReader decompressing
+    it, which allows sequential reads only.
+      mode: 'rb', or 'r' to read lines as str
+    returns the file object, or None if failed.
+    """
+    try:
+        ifp = open(path, 'rb')
+        magic = ifp.read(6)
+        ifp.close()
+        if magic[:2] == b'\x1f\x8b':
+            import gzip
+            ifp = _StreamReader(gzip.GzipFile(path, 'rb'))
+        elif magic[:3] == b'BZh':
+            import bz2
+            ifp = _StreamReader(bz2.BZ2File(path, 'rb'))
+        elif magic == b'\xfd7zXZ\x00':
+            import lzma
+            ifp = _StreamReader(lzma.LZMAFile(path, 'rb'))
+        else:
+            ifp = open(path, 'rb')
+    except:
+        return None
+    if mode == 'r' and bytes is not str:
+        return _TextReader(ifp)
+    return ifp
+
+
+def _openWrite(path, compress = None):
+    """
+    open a GF file for writing
+      compress: None, 'gzip', 'bz2' or 'xz'; compressed in a thread
+    returns the file object, or None if failed.
+    """
+    try:
+        if compress is None:
+            return open(path, 'wb')
+        if compress == 'gzip':
+            import gzip
+            return _ThreadedWriter(gzip.GzipFile(path, 'wb'))
+        if compress == 'bz2':
+            import bz2
+            return _ThreadedWriter(bz2.BZ2File(path, 'wb'))
+        if compress == 'xz':
+            import lzma
+            return _ThreadedWriter(lzma.LZMAFile(path, 'wb'))
+    except:
+        pass
+    return None
+
+
+def _closeFailed(ofp):
+    """
+    close a file opened by _openWrite after a failed write, ignoring
+    errors (a _ThreadedWriter raises the error of its thread on close)
+    """
+    try:
+        ofp.close()
+    except:
+        pass
+    return
+
+
+def _writeHeader(ofp, obo, orm, tag, comment):
+    """
+    write header (8, tag, 8) and comment list (4, n, 4), (60, "xxx...", 60)*n
+    of binary GF file or DATASET record
+      ofp: opened binary GF file
+      obo: byte order, '<' as little-endian, '>' as big-endian,
+           '=' as system byte order.
+      orm: size of record markers, 4 or 8
+      tag: "#U_GF_XX" or "#NEW_SET"
+      comment: array of comment string (60 characters each)
+    """
+    try:
+        ofp.write(struct.pack(_recFmt(obo, orm, '8s'), 8, _bytes(tag), 8))
+        ofp.write(struct.pack(_recFmt(obo, orm, 'i'), 4, len(comment), 4))
+        for c in comment:
+            ofp.write(struct.pack(_recFmt(obo, orm, '60s'),
+                                  60, _bytes(c), 60))
+            continue
+    except:
+        return False
+    return True
+
+
 class GF_DATA(object):
     """
     DATA record of GF File
@@ -17,14 +670,22 @@ class GF_DATA(object):
       keyword: keyword string ("*xxxxxxx")
       comment: comment string ("xxxxxxxx")
       aryNum : (num, num2)
-      array  : 2D array of data
+      array  : 2D array of data (None if scanned and not loaded yet)
+      offset : file offset of the record read from a binary GF file (or -1)
+      byteOrder: byte order of the binary GF file read from
+      recMarker: size of record markers of the binary GF file read from
+      native : if True, array is kept as int32/float32 (see NATIVE_DTYPE)
     """
     def __init__(self):
         self.aryType = INT_ARY_TYPE
         self.keyword = 'x' * 8
         self.comment = 'x' * 30
         self.aryNum = [0, 0] # num, num2
-        self.array = numpy.array(0, dtype=self.aryType)
+        self.native = NATIVE_DTYPE
+        self.array = numpy.array(0, dtype=_memType(self.aryType, self.native))
+        self.offset = -1
+        self.byteOrder = '='
+        self.recMarker = 4
         return
 
     def __str__(self):
@@ -51,7 +712,7 @@ class GF_DATA(object):
         if self.aryType == atp:
             return True
         self.aryType = atp
-        self.array = numpy.array(0, dtype=self.aryType)
+        self.array = numpy.array(0, dtype=_memType(atp, self.native))
         if self.aryNum[0] > 0 and self.aryNum[1] > 0:
             self.array.resize(self.aryNum)
         return True
@@ -62,119 +723,360 @@ class GF_DATA(object):
         """
         if num == self.aryNum[0] and num2 == self.aryNum[1]:
             return True
+        dt = _memType(self.aryType, self.native)
         if num < 1 or num2 < 1:
             self.aryNum[0] = 0; self.aryNum[1] = 0
-            self.array = numpy.array(0, dtype=self.aryType)
+            self.array = numpy.array(0, dtype=dt)
             return True
         self.aryNum[0] = num
         self.aryNum[1] = num2
+        if self.array is None:
+            self.array = numpy.array(0, dtype=dt)
+        elif self.array.dtype != dt:
+            self.array = self.array.astype(dt)
+        elif not (self.array.flags.writeable and self.array.flags.owndata):
+            # shared (e.g. cached) array, or a view of the read buffer
+            self.array = self.array.copy()
         self.array.resize(self.aryNum)
         return True
 
-    def read(self, ifp, ibo = '='):
+    def setNative(self, native):
+        """
+        set whether array is kept as int32/float32 as stored in GF file,
+        converting the array if needed (e.g. native=False to upcast).
+          native: True or False
+        """
+        self.native = native
+        if self.array is None:
+            return True
+        dt = _memType(self.aryType, native)
+        if self.array.dtype != dt:
+            self.array = self.array.astype(dt)
+        return True
+
+    def read(self, ifp, ibo = '=', mmap = False, native = None, irm = 4):
         """
         read DATA record from binary GF file
           ifp: opened binary GF file
           ibo: byte order, '<' as little-endian, '>' as big-endian,
                '=' as system byte order.
+          mmap: if True, array is a read-only view over the payload (of the
+                mmap of ifp if a _MapReader, or else a numpy.memmap)
+                in the file byte order, instead of a decoded copy.
+                (payloads split into subrecords are decoded anyway)
+          native: if not None, set self.native before reading
+          irm: size of record markers, 4 or 8
+        """
+        if ifp is None: return False
+        if native is not None:
+            self.native = native
+        self.setNums(0, 0)
+        fpos = ifp.tell()
+
+        nums = self._read_header(ifp, ibo, irm)
+        if nums is None:
+            return False
+        (num, num2) = nums
+
+        # read data (sz, data, sz), sz = 4 * num2 * num
+        if mmap and num > 0:
+            if not self._map(ifp, ibo, irm, num, num2):
+                return False
+        else:
+            if not self._decode(ifp, ibo, irm, num, num2):
+                return False
+
+        self.offset = fpos
+        self.byteOrder = ibo
+        self.recMarker = irm
+        return True
+
+    def scan(self, ifp, ibo = '=', irm = 4):
+        """
+        read header of DATA record from binary GF file and skip its payload.
+        array is left None, use load() to read it later.
+          ifp: opened binary GF file
+          ibo: byte order, '<' as little-endian, '>' as big-endian,
+               '=' as system byte order.
+          irm: size of record markers, 4 or 8
         """
         if ifp is None: return False
         self.setNums(0, 0)
         fpos = ifp.tell()
 
+        nums = self._read_header(ifp, ibo, irm)
+        if nums is None:
+            return False
+        (num, num2) = nums
+
+        # skip data (sz, data, sz), sz = 4 * num2 * num
+        if not _skipPayload(ifp, ibo, irm, 4 * num * num2):
+            return False
+
+        self.aryNum = [num, num2]
+        self.array = None
+        self.offset = fpos
+        self.byteOrder = ibo
+        self.recMarker = irm
+        return True
+
+    def load(self, ifp, mmap = False, native = None):
+        """
+        (re)read array of the DATA record from where it was read or scanned
+          ifp: opened binary GF file which the record belongs to
+          mmap: if True, map the array (see read())
+          native: if not None, set self.native before reading
+        """
+        if ifp is None or self.offset < 0: return False
+        try:
+            ifp.seek(self.offset)
+        except:
+            return False
+        return self.read(ifp, self.byteOrder, mmap, native, self.recMarker)
+
+    def _read_header(self, ifp, ibo, irm):
+        """
+        read type, keyword, comment and num2, num of DATA record.
+        returns (num, num2), or None if failed.
+        ifp is rewound if the record is not a DATA record.
+        """
+        fpos = ifp.tell()
+
         # read array_type_header (8, "#ARY_TYP", 8)
         try:
-            buff = struct.unpack(ibo+'i8si', ifp.read(16))
+            buff = _readRec(ifp, ibo, irm, '8s')
         except:
             try:
                 ifp.seek(fpos)
             except:
                 pass
-            return False
+            return None
         if buff[0] != 8 or buff[2] != 8:
             try:
                 ifp.seek(fpos)
             except:
                 pass
-            return False
+            return None
         if buff[1] == '#FLT_ARY':
             if not self.setType(FLT_ARY_TYPE):
                 try:
                     ifp.seek(fpos)
                 except:
                     pass
-                return False
+                return None
         elif buff[1] == '#INT_ARY':
             if not self.setType(INT_ARY_TYPE):
                 try:
                     ifp.seek(fpos)
                 except:
                     pass
-                return False
+                return None
         else:
             try:
                 ifp.seek(fpos)
             except:
                 pass
-            return False
+            return None
 
         # read keyword (8, "xxxxxxxx", 8)
         try:
-            buff = struct.unpack(ibo+'i8si', ifp.read(16))
+            buff = _readRec(ifp, ibo, irm, '8s')
         except:
-            return False
-        if buff[0] != 8 or buff[2] != 8: return False
+            return None
+        if buff[0] != 8 or buff[2] != 8: return None
         self.keyword = buff[1]
 
         # read comment (30, "xxxxxxxx...", 30)
         try:
-            buff = struct.unpack(ibo+'i30si', ifp.read(38))
+            buff = _readRec(ifp, ibo, irm, '30s')
         except:
-            return False
-        if buff[0] != 30 or buff[2] != 30: return False
+            return None
+        if buff[0] != 30 or buff[2] != 30: return None
         self.comment = buff[1]
 
         # read num2, num (8, num2, num, 8)
         try:
-            buff = struct.unpack(ibo+'iiii', ifp.read(16))
+            buff = _readRec(ifp, ibo, irm, 'ii')
         except:
+            return None
+        if buff[0] != 8 or buff[3] != 8: return None
+        if buff[2] < 1 or buff[1] < 1:
+            return (0, 0)
+        return (buff[2], buff[1])
+
+    def _decode(self, ifp, ibo, irm, num, num2):
+        """
+        read payload (sz, data, sz) of DATA record in one block,
+        and decode it into array
+        """
+        if PROFILE is not None:
+            t0 = _clock()
+        buff = _readPayload(ifp, ibo, irm, 4 * num * num2)
+        if buff is None:
             return False
-        if buff[0] != 8 or buff[3] != 8: return False
-        if not self.setNums(buff[2], buff[1]): # args are (num, num2)
-            return False
+        if PROFILE is not None:
+            t1 = _clock()
+        self.aryNum = [num, num2]
+        ary = numpy.frombuffer(buff, dtype=_aryDtype(self.aryType, ibo),
+                               count=num * num2).reshape(self.aryNum)
+        dt = _memType(self.aryType, self.native)
+        if ary.dtype != dt or not ary.flags.writeable:
+            ary = ary.astype(dt)
+        self.array = ary
+        if PROFILE is not None:
+            PROFILE.record('read', self.keyword, 4 * num * num2, t1 - t0,
+                           _clock() - t1)
+        return True
 
-        # read data (sz, data, sz), sz = 4 * num2 * num
+    def _map(self, ifp, ibo, irm, num, num2):
+        """
+        map payload (sz, data, sz) of DATA record as a read-only view of
+        the mmap of ifp if a _MapReader, or else as a numpy.memmap,
+        and seek ifp past the record
+        """
+        sz = 4 * num * num2
+        fpos = ifp.tell()
         try:
-            buff = struct.unpack(ibo+'i', ifp.read(4))
+            buff = struct.unpack(_recFmt(ibo, irm), ifp.read(irm))
         except:
             return False
-        if buff[0] != 4 * self.aryNum[0] * self.aryNum[1]:
+        if buff[0] < 0:
+            # split into subrecords, can not be mapped as one array
+            try:
+                ifp.seek(fpos)
+            except:
+                return False
+            return self._decode(ifp, ibo, irm, num, num2)
+        if buff[0] != sz:
             return False
-        if self.aryType == INT_ARY_TYPE:
-            fmt = ibo+'%di' % self.aryNum[1]
-        else:
-            fmt = ibo+'%df' % self.aryNum[1]
-        sz = 4 * self.aryNum[1]
+        if PROFILE is not None:
+            t0 = _clock()
+        offset = ifp.tell()
+        dt = _aryDtype(self.aryType, ibo)
         try:
-            for i in range(self.aryNum[0]):
-                buff = struct.unpack(fmt, ifp.read(sz))
-                self.array[i][:] = buff[:]
-                continue
+            if getattr(ifp, 'mm', None) is not None:
+                # a view of the mmap of the whole file (see _openMap)
+                ary = numpy.frombuffer(ifp.mm, dtype=dt, count=num * num2,
+                                       offset=offset).reshape((num, num2))
+            else:
+                ary = numpy.memmap(ifp, dtype=dt, mode='r', offset=offset,
+                                   shape=(num, num2))
+            ifp.seek(offset + sz)
+            buff = struct.unpack(_recFmt(ibo, irm), ifp.read(irm))
         except:
             return False
-        try:
-            buff = struct.unpack(ibo+'i', ifp.read(4))
-        except:
+        if buff[0] != sz:
             return False
-
+        self.aryNum = [num, num2]
+        self.array = ary
+        if PROFILE is not None:
+            PROFILE.record('map', self.keyword, sz, _clock() - t0, 0.0)
         return True
 
-    def read_ascii(self, ifp):
+    def read_rows(self, ifp, rows, native = None):
+        """
+        read some rows of the array, seeking to them in the binary GF file
+        instead of reading the whole record. if the array is loaded or
+        mapped, it is sliced instead.
+          ifp: opened binary GF file which the record belongs to
+               (not used if the array is loaded or mapped)
+          rows: (i0, i1) for rows [i0, i1), or list of row indices
+          native: if True, returns int32/float32 array,
+                  if None, self.native is applied.
+        returns 2D array of the rows, or None if failed.
+        """
+        if native is None:
+            native = self.native
+        dt = _memType(self.aryType, native)
+        (num, num2) = (self.aryNum[0], self.aryNum[1])
+        if isinstance(rows, tuple):
+            (i0, i1) = rows
+            if i0 < 0 or i1 < i0 or i1 > num:
+                return None
+            idx = None
+        else:
+            idx = numpy.asarray(rows, dtype=numpy.int64).reshape(-1)
+            if len(idx) > 0 and (idx.min() < 0 or idx.max() >= num):
+                return None
+
+        # loaded or mapped array
+        if self.array is not None:
+            if idx is None:
+                return numpy.array(self.array[i0:i1], dtype=dt)
+            return numpy.array(self.array[idx], dtype=dt)
+
+        if ifp is None or self.offset < 0:
+            return None
+        segs = self._segments(ifp)
+        if segs is None:
+            return None
+        fdt = _aryDtype(self.aryType, self.byteOrder)
+        rsz = 4 * num2
+
+        # range of rows
+        if idx is None:
+            buff = _readRange(ifp, segs, rsz * i0, rsz * (i1 - i0))
+            if buff is None:
+                return None
+            ary = numpy.frombuffer(buff, dtype=fdt)
+            return ary.reshape((i1 - i0, num2)).astype(dt)
+
+        # list of rows, read by runs of rows close to each other
+        (uidx, inv) = numpy.unique(idx, return_inverse=True)
+        ret = numpy.empty((len(uidx), num2), dtype=dt)
+        brk = numpy.nonzero(numpy.diff(uidx) * rsz > READ_GAP_SIZE + rsz)[0]
+        (k0, runs) = (0, list(brk + 1) + [len(uidx),])
+        for k1 in runs:
+            if k1 <= k0:
+                continue
+            (r0, r1) = (int(uidx[k0]), int(uidx[k1-1]) + 1)
+            buff = _readRange(ifp, segs, rsz * r0, rsz * (r1 - r0))
+            if buff is None:
+                return None
+            ary = numpy.frombuffer(buff, dtype=fdt).reshape((r1 - r0, num2))
+            ret[k0:k1] = ary[uidx[k0:k1] - r0]
+            k0 = k1
+            continue
+        return ret[inv]
+
+    def _segments(self, ifp):
+        """
+        locate the payload of the record in the binary GF file
+        returns list of (offset in payload, file offset, length) of
+        the payload (subrecords), or None if failed.
+        """
+        irm = self.recMarker
+        mf = _recFmt(self.byteOrder, irm)
+        # header: type, keyword, comment, (num2, num) records
+        fpos = self.offset + 54 + 8 * irm
+        segs = []
+        (pos, sz) = (0, 4 * self.aryNum[0] * self.aryNum[1])
+        try:
+            while ( True ):
+                ifp.seek(fpos)
+                head = struct.unpack(mf, ifp.read(irm))[0]
+                n = abs(head)
+                segs.append((pos, fpos + irm, n))
+                pos = pos + n
+                if head >= 0:
+                    break
+                fpos = fpos + n + 2 * irm
+                continue
+        except:
+            return None
+        if pos != sz:
+            return None
+        return segs
+
+    def read_ascii(self, ifp, native = None):
         """
         read DATA record from ascii GF file
           ifp: opened ascii GF file
+          native: if not None, set self.native before reading
         """
         if ifp is None: return False
+        if native is not None:
+            self.native = native
         self.setNums(0, 0)
         fpos = ifp.tell()
 
@@ -231,55 +1133,93 @@ class GF_DATA(object):
 
         # read data, #of data = num2 * num
         sz = self.aryNum[0] * self.aryNum[1]
+        stat = None
+        if PROFILE is not None:
+            stat = [_clock(), 0.0, 0] # start, seconds of conversion, bytes
         try:
             line = ifp.readline()
         except:
             return False
-        if line[0] == '#':
+        if not line or line[0] == '#':
             return False
-        buff = line.rstrip()
+        flat = self.array.reshape(-1)
+        n = 0
+        lines = [line,]
         while ( True ):
             fpos2 = ifp.tell()
             try:
                 line = ifp.readline()
             except:
                 break
+            if not line:
+                break
             if line[0] == '#':
                 ifp.seek(fpos2)
                 break
-            buff = buff + line.rstrip()
-            continue
-        buff = buff.split()
-        if len(buff) < sz:
-            return False
-        if self.aryType == FLT_ARY_TYPE:
-            for i in range(self.aryNum[0]):
-                for j in range(self.aryNum[1]):
-                    self.array[i][j] = float(buff[i*self.aryNum[1] + j])
-        elif self.aryType == INT_ARY_TYPE:
-            for i in range(self.aryNum[0]):
-                for j in range(self.aryNum[1]):
-                    self.array[i][j] = int(buff[i*self.aryNum[1] + j])
+            lines.append(line)
+            if len(lines) >= ASCII_CHUNK_LINES:
+                n = self._convert_ascii(lines, flat, n, stat)
+                if n < 0:
+                    return False
+                lines = []
+            continue
+        n = self._convert_ascii(lines, flat, n, stat)
+        if n < sz:
+            return False
+        if stat is not None:
+            t = _clock() - stat[0]
+            PROFILE.record('read_ascii', self.keyword, stat[2],
+                           t - stat[1], stat[1])
         return True
 
-    def write(self, ofp, obo = '='):
+    def _convert_ascii(self, lines, flat, n, stat = None):
+        """
+        convert a chunk of data lines of ascii GF file in bulk,
+        and store values into flat[n:]
+          stat: if not None, list [start, seconds, bytes] to add the time
+                of conversion and bytes of lines to
+        returns the number of values stored so far, or -1 if failed.
+        """
+        if len(lines) < 1 or n >= len(flat):
+            return n
+        if stat is not None:
+            t0 = _clock()
+        try:
+            text = ''.join(lines)
+            buff = numpy.fromstring(text, dtype=self.aryType, sep=' ')
+        except:
+            return -1
+        m = min(len(buff), len(flat) - n)
+        flat[n:n+m] = buff[:m]
+        if stat is not None:
+            stat[1] = stat[1] + _clock() - t0
+            stat[2] = stat[2] + len(text)
+        return n + m
+
+    def write(self, ofp, obo = '=', orm = 4):
         """
         write DATA record to binary GF file
           ifp: opened binary GF file
           obo: byte order, '<' as little-endian, '>' as big-endian,
                '=' as system byte order.
+          orm: size of record markers, 4 or 8. with 4-byte markers,
+               payloads longer than SUBRECORD_MAX are split into subrecords.
         """
         if ofp is None: return False
         if self.aryNum[0] < 1 or self.aryNum[1] < 1:
             return False
+        if PROFILE is not None:
+            t0 = _clock()
 
         # write header
         sz = 8
         try:
             if self.aryType == INT_ARY_TYPE:
-                ofp.write(struct.pack(obo+'i8si', sz, '#INT_ARY', sz))
+                ofp.write(struct.pack(_recFmt(obo, orm, '8s'),
+                                      sz, b'#INT_ARY', sz))
             elif self.aryType == FLT_ARY_TYPE:
-                ofp.write(struct.pack(obo+'i8si', sz, '#FLT_ARY', sz))
+                ofp.write(struct.pack(_recFmt(obo, orm, '8s'),
+                                      sz, b'#FLT_ARY', sz))
             else:
                 return False
         except:
@@ -288,51 +1228,38 @@ class GF_DATA(object):
         # write keyword
         sz = 8
         try:
-            ofp.write(struct.pack(obo+'i8si', sz, self.keyword, sz))
+            ofp.write(struct.pack(_recFmt(obo, orm, '8s'),
+                                  sz, _bytes(self.keyword), sz))
         except:
             return False
 
         # write comment
         sz = 30
         try:
-            ofp.write(struct.pack(obo+'i30si', sz, self.comment, sz))
+            ofp.write(struct.pack(_recFmt(obo, orm, '30s'),
+                                  sz, _bytes(self.comment), sz))
         except:
             return False
 
         # write num2, num
         sz = 8
         try:
-            ofp.write(struct.pack(obo+'iiii',
+            ofp.write(struct.pack(_recFmt(obo, orm, 'ii'),
                                   sz, self.aryNum[1], self.aryNum[0], sz))
         except:
             return False
 
         # write data
-        sz = 4 * self.aryNum[1] * self.aryNum[0]
-        try:
-            ofp.write(struct.pack(obo+'i', sz))
-        except:
-            return False
-        
-        if self.aryType == INT_ARY_TYPE:
-            fmt = obo+'i'
-        else:
-            fmt = obo+'f'
-        try:
-            for i in range(self.aryNum[0]):
-                for j in range(self.aryNum[1]):
-                    ofp.write(struct.pack(fmt, self.array[i][j]))
-                    continue
-                continue
-        except:
-            return False
-
-        try:
-            ofp.write(struct.pack(obo+'i', sz))
-        except:
-            return False
-
-        return True
+        if PROFILE is None:
+            return _writePayload(ofp, obo, orm, self.array,
+                                 _aryDtype(self.aryType, obo))
+        stat = [0.0]
+        ret = _writePayload(ofp, obo, orm, self.array,
+                            _aryDtype(self.aryType, obo), stat)
+        PROFILE.record('write', self.keyword,
+                       4 * self.aryNum[0] * self.aryNum[1],
+                       _clock() - t0 - stat[0], stat[0])
+        return ret
 
 
 class GF_DATASET(object):
@@ -340,12 +1267,68 @@ class GF_DATASET(object):
     DATASET record of GF File
       comment: array of comment string (60 characters each)
       data:    array of GF_DATA
+    DATA records are indexed by keyword (without trailing spaces):
+      ds['*VELO_3D'], '*VELO_3D' in ds, ds.keys(), ds.get('*PRES_3D')
+    and by position as ds[i].
     """
     def __init__(self):
         self.comment = []
         self.data = []
+        self._index = {} # keyword: position of the first DATA
+        self._nindexed = 0
         return
 
+    def __getitem__(self, key):
+        if isinstance(key, numbers.Integral):
+            return self.data[key]
+        i = self._lookup(key)
+        if i is None:
+            raise KeyError(key)
+        return self.data[i]
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def keys(self):
+        """
+        returns list of keywords of DATA records, in order of records
+        """
+        self._lookup('')
+        return sorted(self._index.keys(), key=lambda k: self._index[k])
+
+    def get(self, key, default = None):
+        """
+        returns DATA record of keyword, or default if not found
+        """
+        i = self._lookup(key)
+        if i is None:
+            return default
+        return self.data[i]
+
+    def append(self, data):
+        """
+        append a DATA record, and index it by keyword
+          data: GF_DATA
+        """
+        self.data.append(data)
+        if self._nindexed == len(self.data) - 1:
+            self._index.setdefault(data.keyword.strip(), self._nindexed)
+            self._nindexed = len(self.data)
+        return True
+
+    def _lookup(self, key):
+        """
+        returns position of the first DATA record of keyword, or None;
+        the index is rebuilt if data was modified without append()
+        """
+        if self._nindexed != len(self.data):
+            self._index = {}
+            for i in range(len(self.data)):
+                self._index.setdefault(self.data[i].keyword.strip(), i)
+                continue
+            self._nindexed = len(self.data)
+        return self._index.get(key.strip())
+
     def __str__(self):
         if len(self.comment) > 0:
             r = 'GF_DATASET("%s", #of DATA=%d)' % \
@@ -354,21 +1337,69 @@ class GF_DATASET(object):
             r = 'GF_DATASET(#of DATA=%d)' % len(self.data) 
         return r
 
-    def read(self, ifp, ibo = '='):
+    def read(self, ifp, ibo = '=', mmap = False, native = None, irm = 4):
         """
         read DATASET record from binary GF file
           ifp: opened binary GF file
           ibo: byte order, '<' as little-endian, '>' as big-endian,
                '=' as system byte order.
+          mmap: if True, map arrays of DATA records (see GF_DATA.read)
+          native: if not None, native flag of DATA records
+          irm: size of record markers, 4 or 8
         """
         if ifp is None: return False
+        if not self._read_header(ifp, ibo, irm):
+            return False
+
+        # read data list
+        data = GF_DATA()
+        while ( data.read(ifp, ibo, mmap, native, irm) ):
+            self.append(data)
+            data = GF_DATA()
+            continue
+
+        if len(self.data) < 1:
+            return False
+        return True
+
+    def scan(self, ifp, ibo = '=', irm = 4):
+        """
+        read DATASET record from binary GF file, skipping payloads of
+        DATA records (see GF_DATA.scan)
+          ifp: opened binary GF file
+          ibo: byte order, '<' as little-endian, '>' as big-endian,
+               '=' as system byte order.
+          irm: size of record markers, 4 or 8
+        """
+        if ifp is None: return False
+        if not self._read_header(ifp, ibo, irm):
+            return False
+
+        # scan data list
+        data = GF_DATA()
+        while ( data.scan(ifp, ibo, irm) ):
+            self.append(data)
+            data = GF_DATA()
+            continue
+
+        if len(self.data) < 1:
+            return False
+        return True
+
+    def _read_header(self, ifp, ibo, irm):
+        """
+        read header and comment list of DATASET record.
+        ifp is rewound if the record is not a DATASET record.
+        """
         self.comment = []
         self.data = []
+        self._index = {}
+        self._nindexed = 0
         fpos = ifp.tell()
 
         # read header (8, "#NEW_SET", 8)
         try:
-            buff = struct.unpack(ibo+'i8si', ifp.read(16))
+            buff = _readRec(ifp, ibo, irm, '8s')
         except:
             try:
                 ifp.seek(fpos)
@@ -390,7 +1421,7 @@ class GF_DATASET(object):
 
         # read size of comment list (4, n, 4)
         try:
-            buff = struct.unpack(ibo+'iii', ifp.read(12))
+            buff = _readRec(ifp, ibo, irm, 'i')
         except:
             return False
         if buff[0] != 4 or buff[2] != 4: return False
@@ -399,31 +1430,24 @@ class GF_DATASET(object):
         # read comment list (60, "xxx...", 60) * ncl
         for i in range(ncl):
             try:
-                buff = struct.unpack(ibo+'i60si', ifp.read(68))
+                buff = _readRec(ifp, ibo, irm, '60s')
             except:
                 return False
             self.comment = self.comment + [buff[1],]
             continue
-
-        # read data list
-        data = GF_DATA()
-        while ( data.read(ifp, ibo) ):
-            self.data = self.data + [data,]
-            data = GF_DATA()
-            continue
-
-        if len(self.data) < 1:
-            return False
         return True
 
-    def read_ascii(self, ifp):
+    def read_ascii(self, ifp, native = None):
         """
         read DATASET record from ascii GF file
           ifp: opened ascii GF file
+          native: if not None, native flag of DATA records
         """
         if ifp is None: return False
         self.comment = []
         self.data = []
+        self._index = {}
+        self._nindexed = 0
         fpos = ifp.tell()
 
         # read header ("#NEW_SET")
@@ -459,8 +1483,8 @@ class GF_DATASET(object):
 
         # read data list
         data = GF_DATA()
-        while ( data.read_ascii(ifp) ):
-            self.data = self.data + [data,]
+        while ( data.read_ascii(ifp, native) ):
+            self.append(data)
             data = GF_DATA()
             continue
 
@@ -468,43 +1492,35 @@ class GF_DATASET(object):
             return False
         return True
 
+    def setNative(self, native):
+        """
+        set native flag of all DATA records (see GF_DATA.setNative)
+          native: True or False
+        """
+        for d in self.data:
+            d.setNative(native)
+            continue
+        return True
 
-    def write(self, ofp, obo = '='):
+    def write(self, ofp, obo = '=', orm = 4):
         """
         write DATASET record to binary GF file
           ifp: opened binary GF file
           obo: byte order, '<' as little-endian, '>' as big-endian,
                '=' as system byte order.
+          orm: size of record markers, 4 or 8
         """
         if ofp is None: return False
         if len(self.data) < 1:
             return False
 
-        # write header
-        sz = 8
-        try:
-            ofp.write(struct.pack(obo+'i8si', sz, '#NEW_SET', sz))
-        except:
-            return False
-
-        # write size of comment list
-        sz = 4
-        try:
-            ofp.write(struct.pack(obo+'iii', sz, len(self.comment), sz))
-        except:
+        # write header and comment list
+        if not _writeHeader(ofp, obo, orm, '#NEW_SET', self.comment):
             return False
 
-        # write comment list
-        for i in range(len(self.comment)):
-            try:
-                ofp.write(struct.pack(obo+'i60si', sz, self.comment[i], sz))
-            except:
-                return False
-            continue
-
         # write data list
         for i in range(len(self.data)):
-            if not self.data[i].write(ofp, obo):
+            if not self.data[i].write(ofp, obo, orm):
                 return False
             continue
 
@@ -517,13 +1533,24 @@ class GF_FILE(object):
       fileType: file type keyword ("#U_GF_XX" or "#A_GF_XX")
       comment:  array of comment string (60 characters each)
       dataset:  array of GF_DATASET
+      path:     path of the binary GF file read or scanned from
     """
     def __init__(self):
         self.fileType = ''
         self.comment = []
         self.dataset = []
+        self.path = None
+        self._fd = None # descriptor (and mmap) kept by open()
+        self._mm = None
         return
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
     def __str__(self):
         if len(self.comment) > 0:
             r = 'GF_FILE("%s", type=%s, #of DATASET=%d)' % \
@@ -533,80 +1560,358 @@ class GF_FILE(object):
                 (self.fileType, len(self.dataset))
         return r
     
-    def read(self, path):
+    def read(self, path, mmap = False, native = None, workers = 0,
+             keywords = None):
         """
         read from a binary GF file
           path: path of the binary GF file
+          mmap: if True, arrays are read-only views of one mmap of
+                the file, loaded on demand when touched.
+          native: if True, arrays are kept as int32/float32 as stored,
+                  if None, NATIVE_DTYPE is applied.
+          workers: if > 1 (and not mmap), scan the file first, then read
+                   and decode DATA records concurrently by the number of
+                   threads, with positional reads on one descriptor.
+          keywords: if not None, list of keywords of DATA records to load;
+                    the file is scanned, and other DATA records are left
+                    unloaded (see scan).
+        a compressed file (gzip, bzip2 or xz) is decompressed as a stream,
+        ignoring mmap, workers and keywords.
+        if CACHE is set (and not mmap nor keywords), the file is looked up
+        in CACHE, and arrays are read-only, shared with other readers of
+        the file.
+        """
+        if CACHE is not None and not mmap and keywords is None:
+            return CACHE.fetch(self, path, 'binary', native,
+                               lambda: self._read(path, False, native,
+                                                  workers, None))
+        return self._read(path, mmap, native, workers, keywords)
+
+    def _read(self, path, mmap, native, workers, keywords):
+        ifp = _openRead(path)
+        if ifp is None:
+            return False
+        if isinstance(ifp, _StreamReader):
+            (mmap, workers, keywords) = (False, 0, None)
+        if keywords is not None or (workers > 1 and not mmap):
+            ifp.close()
+            if not self.scan(path):
+                return False
+            return self._load_all(workers, native, keywords, mmap)
+        if mmap:
+            # arrays are views of one mmap of the file
+            ifp.close()
+            ifp = _openMap(path)
+            if ifp is None:
+                return False
+
+        (ibo, irm) = self._read_header(ifp)
+        if ibo is None:
+            ifp.close()
+            return False
+        self.path = path
+
+        # read dataset list
+        dataset = GF_DATASET()
+        while ( dataset.read(ifp, ibo, mmap, native, irm) ):
+            self.dataset = self.dataset + [dataset,]
+            dataset = GF_DATASET()
+            continue
+
+        ifp.close()
+        if len(self.dataset) < 1:
+            return False
+        return True
+
+    def scan(self, path):
+        """
+        scan a binary GF file, without reading payloads of DATA records.
+        DATA records have their type, keyword, comment, aryNum, offset and
+        byteOrder set, and None as array; use load() to read arrays.
+          path: path of the binary GF file (not compressed)
+        """
+        ifp = _openRead(path)
+        if ifp is None:
+            return False
+        if isinstance(ifp, _StreamReader):
+            # loading arrays later needs random access
+            ifp.close()
+            return False
+
+        (ibo, irm) = self._read_header(ifp)
+        if ibo is None:
+            ifp.close()
+            return False
+        self.path = path
+
+        # scan dataset list
+        dataset = GF_DATASET()
+        while ( dataset.scan(ifp, ibo, irm) ):
+            self.dataset = self.dataset + [dataset,]
+            dataset = GF_DATASET()
+            continue
+
+        ifp.close()
+        if len(self.dataset) < 1:
+            return False
+        return True
+
+    def open(self, path = None, mmap = False):
+        """
+        keep a binary GF file open, for loading arrays by positional reads
+        without a shared file position (os.pread, or slices of one mmap);
+        load() and read_rows() may then be called from several threads at
+        once, sharing one descriptor. close() to release it.
+          path: path of the binary GF file to scan, if not scanned (or read)
+          mmap: if True, read through a read-only mmap of the whole file
         """
+        self.close()
+        if path is not None:
+            self.comment = []
+            self.dataset = []
+            if not self.scan(path):
+                return False
+        if self.path is None:
+            return False
         try:
-            ifp = open(path, 'rb')
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
         except:
             return False
+        mm = None
+        if mmap:
+            try:
+                mm = _mmap.mmap(fd, 0, access=_mmap.ACCESS_READ)
+            except:
+                os.close(fd)
+                return False
+        (self._fd, self._mm) = (fd, mm)
+        return True
 
+    def close(self):
+        """
+        release the file kept open by open()
+        """
+        if self._fd is None:
+            return True
+        # the mmap is not closed but released, as arrays mapped by load()
+        # may still refer it; it is unmapped when they are freed
+        os.close(self._fd)
+        (self._fd, self._mm) = (None, None)
+        return True
+
+    def _reader(self):
+        """
+        returns a new positional reader of the file kept open by open(),
+        or a newly opened file object if not open
+        """
+        if self._fd is None:
+            return open(self.path, 'rb')
+        if self._mm is not None:
+            return _MapReader(self._fd, self._mm)
+        return _PosReader(self._fd)
+
+    def load(self, key, ds = 0, mmap = False, native = None):
+        """
+        get a DATA record of a scanned (or read) binary GF file,
+        reading its array from the file if not loaded yet.
+          key: keyword ("*xxxxxxx") or position of the DATA in the DATASET
+          ds: index of the DATASET
+          mmap: if True, map the array (see GF_DATA.read)
+          native: if not None, native flag of the DATA record
+        returns GF_DATA, or None if not found or failed.
+        """
+        data = self._find(key, ds)
+        if data is None:
+            return None
+        if data.array is not None:
+            return data
+
+        # read into a new GF_DATA, and set the array when it is complete,
+        # as other threads may test data.array meanwhile
+        new = GF_DATA()
+        (new.offset, new.byteOrder, new.recMarker, new.native) = \
+            (data.offset, data.byteOrder, data.recMarker, data.native)
+        try:
+            ifp = self._reader()
+        except:
+            return None
+        ret = new.load(ifp, mmap, native)
+        ifp.close()
+        if not ret:
+            return None
+        (data.native, data.aryNum) = (new.native, new.aryNum)
+        data.array = new.array
+        return data
+
+    def read_rows(self, key, rows, ds = 0, native = None):
+        """
+        read some rows of a DATA record of a scanned (or read) binary
+        GF file (see GF_DATA.read_rows)
+          key: keyword ("*xxxxxxx") or position of the DATA in the DATASET
+          rows: (i0, i1) for rows [i0, i1), or list of row indices
+          ds: index of the DATASET
+          native: if True, returns int32/float32 array
+        returns 2D array of the rows, or None if not found or failed.
+        """
+        data = self._find(key, ds)
+        if data is None:
+            return None
+        if data.array is not None:
+            return data.read_rows(None, rows, native)
+
+        try:
+            ifp = self._reader()
+        except:
+            return None
+        ret = data.read_rows(ifp, rows, native)
+        ifp.close()
+        return ret
+
+    def _load_all(self, workers, native = None, keywords = None,
+                  mmap = False):
+        """
+        load arrays of scanned DATA records by a pool of threads
+          workers: number of threads (loaded serially if < 2)
+          native: if not None, native flag of DATA records
+          keywords: if not None, load DATA records of the keywords only
+          mmap: if True, map arrays (serially)
+        """
+        datas = []
+        for ds in self.dataset:
+            if keywords is None:
+                dlist = ds.data
+            else:
+                dlist = [ds.get(k) for k in keywords if k in ds]
+            for d in dlist:
+                if d.array is None:
+                    datas.append(d)
+                continue
+            continue
+        if mmap:
+            if self._mm is not None:
+                ifp = self._reader()
+            else:
+                ifp = _openMap(self.path)
+            if ifp is None:
+                return False
+            rets = [d.load(ifp, True, native) for d in datas]
+            ifp.close()
+            return all(rets)
+        # largest first, for balancing the load of threads
+        datas.sort(key=lambda d: d.aryNum[0] * d.aryNum[1], reverse=True)
+
+        opened = self._fd is None
+        if opened and not self.open():
+            return False
+        args = [(d, self._reader(), native) for d in datas]
+        pool = None
+        if workers > 1:
+            try:
+                from multiprocessing.pool import ThreadPool
+                pool = ThreadPool(workers)
+            except:
+                pass
+        try:
+            if pool is None:
+                rets = [_loadData(a) for a in args]
+            else:
+                rets = pool.map(_loadData, args, 1)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if opened:
+                self.close()
+        return all(rets)
+
+    def _find(self, key, ds):
+        """
+        find a DATA record by keyword or position in the DATASET
+        returns GF_DATA, or None if not found.
+        """
+        if ds < 0 or ds >= len(self.dataset):
+            return None
+        dlist = self.dataset[ds].data
+        if isinstance(key, numbers.Integral):
+            if key >= 0 and key < len(dlist):
+                return dlist[key]
+            return None
+        return self.dataset[ds].get(key)
+
+    def _read_header(self, ifp):
+        """
+        read header and comment list of binary GF file, and detect
+        its byte order and size of record markers.
+        returns (byte order ('<' or '>'), size of record markers (4 or 8)),
+        or (None, None) if failed.
+        """
         self.fileType = ''
         self.comment = []
         self.dataset = []
-        ibo = '<' # byte order
+        failRet = (None, None)
 
         # read header (8, "#U_GF_XX", 8)
         try:
             header = ifp.read(16)
         except:
-            ifp.close()
-            return False
-        buff = struct.unpack(ibo+'i8si', header)
-        if buff[0] != 8:
-            ibo = '>'
-            buff = struct.unpack(ibo+'i8si', header)
-            if buff[0] != 8:
-                ifp.close()
-                return False
-        if buff[2] != 8:
-            ifp.close()
-            return False
-        self.fileType = buff[1]
+            return failRet
+        buff = None
+        for (ibo, irm) in (('<', 4), ('>', 4), ('<', 8), ('>', 8)):
+            try:
+                if irm == 8 and len(header) == 16:
+                    header = header + ifp.read(8)
+                buff = struct.unpack(_recFmt(ibo, irm, '8s'), header)
+            except:
+                return failRet
+            if buff[0] == 8 and buff[2] == 8:
+                break
+            buff = None
+            continue
+        if buff is None:
+            return failRet
+        self.fileType = _str(buff[1])
 
         # read size of comment list (4, n, 4)
         try:
-            buff = struct.unpack(ibo+'iii', ifp.read(12))
+            buff = _readRec(ifp, ibo, irm, 'i')
         except:
-            ifp.close()
-            return False
+            return failRet
         if buff[0] != 4 or buff[2] != 4:
-            ifp.close()
-            return False
+            return failRet
         ncl = buff[1]
 
         # read comment list (60, "xxx...", 60) * ncl
         for i in range(ncl):
             try:
-                buff = struct.unpack(ibo+'i60si', ifp.read(68))
+                buff = _readRec(ifp, ibo, irm, '60s')
             except:
-                ifp.close()
-                return False
+                return failRet
             self.comment = self.comment + [buff[1],]
             continue
+        return (ibo, irm)
 
-        # read dataset list
-        dataset = GF_DATASET()
-        while ( dataset.read(ifp, ibo) ):
-            self.dataset = self.dataset + [dataset,]
-            dataset = GF_DATASET()
-            continue
-
-        ifp.close()
-        if len(self.dataset) < 1:
-            return False
-        return True
-
-    def read_ascii(self, path):
+    def read_ascii(self, path, native = None):
         """
         read from an ascii GF file
           path: path of the ascii GF file
+          native: if True, arrays are kept as int32/float32,
+                  if None, NATIVE_DTYPE is applied.
+        if CACHE is set, the file is looked up in CACHE (see read).
         """
-        try:
-            ifp = open(path, 'r')
-        except:
+        if CACHE is not None:
+            return CACHE.fetch(self, path, 'ascii', native,
+                               lambda: self._read_ascii(path, native))
+        return self._read_ascii(path, native)
+
+    def _read_ascii(self, path, native):
+        if SIDECAR is not None:
+            return SIDECAR.fetch(self, path, native,
+                                 lambda: self._parse_ascii(path, native))
+        return self._parse_ascii(path, native)
+
+    def _parse_ascii(self, path, native):
+        ifp = _openRead(path, 'r')
+        if ifp is None:
             return False
 
         self.fileType = ''
@@ -645,7 +1950,7 @@ class GF_FILE(object):
 
         # read dataset list
         dataset = GF_DATASET()
-        while ( dataset.read_ascii(ifp) ):
+        while ( dataset.read_ascii(ifp, native) ):
             self.dataset = self.dataset + [dataset,]
             dataset = GF_DATASET()
             continue
@@ -655,69 +1960,699 @@ class GF_FILE(object):
             return False
         return True
 
-    def write(self, path, obo = '='):
+    def setNative(self, native):
+        """
+        set native flag of all DATA records (see GF_DATA.setNative)
+          native: True or False
+        """
+        for ds in self.dataset:
+            ds.setNative(native)
+            continue
+        return True
+
+    def write(self, path, obo = '=', orm = 4, compress = None):
         """
         write into a binary GF file
           path: path of the binary GF file
           obo: byte order, '<' as little-endian, '>' as big-endian,
                '=' as system byte order.
+          orm: size of record markers, 4 or 8. with 4-byte markers,
+               records longer than SUBRECORD_MAX are split into subrecords.
+          compress: None, 'gzip', 'bz2' or 'xz', to compress the file
+                    in a background thread while writing.
         """
         if len(self.dataset) < 1:
             return False
         if len(self.fileType) != 8:
             return False
-        try:
-            ofp = open(path, 'wb')
-        except:
+        ofp = _openWrite(path, compress)
+        if ofp is None:
             return False
 
-        # write header
+        # write header and comment list
+        if not _writeHeader(ofp, obo, orm, self.fileType, self.comment):
+            _closeFailed(ofp)
+            return False
+
+        # write dataset list
+        for i in range(len(self.dataset)):
+            if not self.dataset[i].write(ofp, obo, orm):
+                _closeFailed(ofp)
+                return False
+            continue
+
+        # write trailer
         sz = 8
         try:
-            ofp.write(struct.pack(obo+'i8si', sz, self.fileType, sz))
+            ofp.write(struct.pack(_recFmt(obo, orm, '8s'),
+                                  sz, b'#ENDFILE', sz))
         except:
+            _closeFailed(ofp)
+            return False
+
+        try:
             ofp.close()
+        except:
+            return False
+        return True
+
+
+class GF_WRITER(object):
+    """
+    Incremental writer of binary GF file, writing DATASET and DATA records
+    one at a time, without the whole GF_FILE in memory.
+      with GF_WRITER() as w:
+          w.open(path, '#U_GF_V1', comment)
+          w.newDataset(comment)
+          w.writeData(data)  # GF_DATA
+          ...
+      # '#ENDFILE' is written on close()
+    """
+    def __init__(self):
+        self.ofp = None
+        self.obo = '='
+        self.orm = 4
+        self.ndataset = 0
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self, path, fileType, comment = [], obo = '=', orm = 4,
+             compress = None):
+        """
+        open a binary GF file and write its header and comment list
+          path: path of the binary GF file
+          fileType: file type keyword ("#U_GF_XX")
+          comment: array of comment string (60 characters each)
+          obo: byte order, '<' as little-endian, '>' as big-endian,
+               '=' as system byte order.
+          orm: size of record markers, 4 or 8
+          compress: None, 'gzip', 'bz2' or 'xz' (see GF_FILE.write)
+        """
+        if self.ofp is not None:
             return False
+        if len(fileType) != 8:
+            return False
+        self.ofp = _openWrite(path, compress)
+        if self.ofp is None:
+            return False
+        self.obo = obo
+        self.orm = orm
+        self.ndataset = 0
+        if not _writeHeader(self.ofp, obo, orm, fileType, comment):
+            _closeFailed(self.ofp)
+            self.ofp = None
+            return False
+        return True
 
-        # write size of comment list
-        sz = 4
+    def newDataset(self, comment = []):
+        """
+        start a new DATASET record
+          comment: array of comment string (60 characters each)
+        """
+        if self.ofp is None: return False
+        if not _writeHeader(self.ofp, self.obo, self.orm, '#NEW_SET', comment):
+            return False
+        self.ndataset = self.ndataset + 1
+        return True
+
+    def writeData(self, data):
+        """
+        append a DATA record to the current DATASET
+          data: GF_DATA
+        """
+        if self.ofp is None or self.ndataset < 1: return False
+        return data.write(self.ofp, self.obo, self.orm)
+
+    def writeDataset(self, dataset):
+        """
+        append a whole DATASET record
+          dataset: GF_DATASET
+        """
+        if self.ofp is None: return False
+        if not dataset.write(self.ofp, self.obo, self.orm):
+            return False
+        self.ndataset = self.ndataset + 1
+        return True
+
+    def close(self):
+        """
+        write trailer ('#ENDFILE') and close the file
+        """
+        if self.ofp is None: return False
+        ret = True
         try:
-            ofp.write(struct.pack(obo+'iii', sz, len(self.comment), sz))
+            self.ofp.write(struct.pack(_recFmt(self.obo, self.orm, '8s'),
+                                       8, b'#ENDFILE', 8))
         except:
-            ofp.close()
+            ret = False
+        try:
+            self.ofp.close()
+        except:
+            ret = False
+        self.ofp = None
+        return ret
+
+
+class GF_CACHE(object):
+    """
+    LRU cache of GF files read by GF_FILE.read/read_ascii, keyed by
+    (path, size, mtime, inode) of the file; enabled by GF.CACHE = GF_CACHE().
+    arrays of cached files are read-only and shared by all readers;
+    GF_DATA objects are not shared.
+      budget: max total size in bytes of arrays cached
+      hits, misses, evictions: counters of lookups and evicted files
+    """
+    def __init__(self, budget = 1024 * 1024 * 1024):
+        self.budget = budget
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict() # key: (GF_FILE, nbytes)
+        self._lock = threading.Lock()
+        return
+
+    def __str__(self):
+        return 'GF_CACHE(#of files=%d, %d/%d bytes, ' \
+            'hits=%d, misses=%d, evictions=%d)' % \
+            (len(self._entries), self.nbytes, self.budget,
+             self.hits, self.misses, self.evictions)
+
+    def stats(self):
+        """
+        returns a dict of counters and sizes of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'files': len(self._entries),
+                    'nbytes': self.nbytes, 'budget': self.budget}
+
+    def clear(self):
+        """
+        drop all cached files (counters are kept)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        return
+
+    def fetch(self, gf, path, kind, native, loader):
+        """
+        set a cached file into gf, or load it by loader and cache it
+          gf: GF_FILE to set
+          path: path of the GF file
+          kind: 'binary' or 'ascii'
+          native: native flag of the read
+          loader: function loading the file into gf, returning True/False
+        """
+        if native is None:
+            native = NATIVE_DTYPE
+        try:
+            st = os.stat(path)
+        except:
+            return loader()
+        key = (os.path.realpath(path), st.st_size, st.st_mtime, st.st_ino,
+               kind, bool(native))
+
+        with self._lock:
+            ent = self._entries.pop(key, None)
+            if ent is not None:
+                self._entries[key] = ent # most recently used
+                self.hits = self.hits + 1
+            else:
+                self.misses = self.misses + 1
+        if ent is not None:
+            _cloneFile(ent[0], gf)
+            return True
+
+        if not loader():
             return False
+        arrays = [d.array for ds in gf.dataset for d in ds.data
+                  if d.array is not None]
+        nbytes = sum([a.nbytes for a in arrays])
+        if nbytes > self.budget:
+            # not cached, arrays are left as read
+            return True
+        for a in arrays:
+            a.flags.writeable = False
+            continue
+        cached = GF_FILE()
+        _cloneFile(gf, cached)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes = self.nbytes - old[1]
+            self._entries[key] = (cached, nbytes)
+            self.nbytes = self.nbytes + nbytes
+            while ( self.nbytes > self.budget ):
+                (k, ent) = self._entries.popitem(last=False)
+                self.nbytes = self.nbytes - ent[1]
+                self.evictions = self.evictions + 1
+                continue
+        return True
 
-        # write comment list
-        for i in range(len(self.comment)):
-            try:
-                ofp.write(struct.pack(obo+'i60si', sz, self.comment[i], sz))
-            except:
-                ofp.close()
+
+class GF_SIDECAR(object):
+    """
+    on-disk cache of ascii GF files read by GF_FILE.read_ascii; enabled by
+    GF.SIDECAR = GF_SIDECAR(). on first read, a binary image of the parsed
+    file (header, record index and raw arrays in native byte order) is
+    written into directory, and later reads map arrays of the image
+    (read-only numpy.memmap) while it matches (path, size, mtime, inode)
+    of the ascii file.
+      directory: directory of images
+      cap: max total size in bytes of images, removed oldest first
+      hits, misses: counters of lookups
+    """
+    MAGIC = b'GFSIDE01'
+    ALIGN = 64
+
+    def __init__(self, directory = None, cap = 4 * 1024 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'),
+                                     '.cache', 'pyGF')
+        self.directory = directory
+        self.cap = cap
+        self.hits = 0
+        self.misses = 0
+        return
+
+    def __str__(self):
+        return 'GF_SIDECAR("%s", cap=%d, hits=%d, misses=%d)' % \
+            (self.directory, self.cap, self.hits, self.misses)
+
+    def fetch(self, gf, path, native, loader):
+        """
+        set contents of an image into gf, or load the ascii file by loader
+        and write its image
+          gf: GF_FILE to set
+          path: path of the ascii GF file
+          native: native flag of the read
+          loader: function loading the file into gf, returning True/False
+        """
+        if native is None:
+            native = NATIVE_DTYPE
+        try:
+            st = os.stat(path)
+        except:
+            return loader()
+        rpath = os.path.realpath(path)
+        source = [rpath, st.st_size, st.st_mtime, st.st_ino, bool(native)]
+        name = hashlib.sha1(repr((rpath, bool(native))).encode('utf-8'))
+        image = os.path.join(self.directory, name.hexdigest() + '.gfc')
+
+        if self._map(gf, image, source):
+            self.hits = self.hits + 1
+            return True
+        self.misses = self.misses + 1
+        if not loader():
+            return False
+        if self._write(gf, image, source):
+            self._evict()
+        return True
+
+    def _map(self, gf, image, source):
+        """
+        set contents of an image into gf, if it matches source
+        """
+        try:
+            ifp = open(image, 'rb')
+        except:
+            return False
+        try:
+            if ifp.read(8) != self.MAGIC:
                 return False
+            hlen = struct.unpack('=Q', ifp.read(8))[0]
+            head = json.loads(ifp.read(hlen).decode('utf-8'))
+            base = self._base(hlen)
+        except:
+            return False
+        finally:
+            ifp.close()
+        if head.get('source') != source:
+            return False
+
+        try:
+            buff = numpy.memmap(image, dtype='u1', mode='r')
+        except:
+            return False
+        gf.fileType = str(head['fileType'])
+        gf.comment = [str(c) for c in head['comment']]
+        gf.dataset = []
+        for (dsComment, datas) in head['dataset']:
+            ds = GF_DATASET()
+            ds.comment = [str(c) for c in dsComment]
+            for (atp, keyword, comment, num, num2, dt, pos) in datas:
+                d = GF_DATA()
+                d.aryType = atp == 'INT' and INT_ARY_TYPE or FLT_ARY_TYPE
+                d.keyword = str(keyword)
+                d.comment = str(comment)
+                d.aryNum = [num, num2]
+                d.native = source[4]
+                dt = numpy.dtype(str(dt))
+                n = num * num2 * dt.itemsize
+                d.array = buff[base+pos:base+pos+n].view(dt)
+                d.array = d.array.reshape(num, num2)
+                ds.append(d)
+                continue
+            gf.dataset.append(ds)
             continue
+        return True
 
-        # write dataset list
-        for i in range(len(self.dataset)):
-            if not self.dataset[i].write(ofp, obo):
-                ofp.close()
-                return False
+    def _base(self, hlen):
+        """
+        returns offset of arrays in an image, following the header aligned
+        (offsets of arrays in the index are relative to it)
+        """
+        return (16 + hlen + self.ALIGN - 1) // self.ALIGN * self.ALIGN
+
+    def _write(self, gf, image, source):
+        """
+        write image of gf, replacing an old one
+        """
+        datas = []
+        arrays = []
+        pos = 0
+        for ds in gf.dataset:
+            recs = []
+            for d in ds.data:
+                atp = d.aryType == INT_ARY_TYPE and 'INT' or 'FLT'
+                ary = numpy.ascontiguousarray(d.array)
+                recs.append([atp, d.keyword, d.comment,
+                             d.aryNum[0], d.aryNum[1], ary.dtype.str, pos])
+                arrays.append((pos, ary))
+                pos = pos + (ary.nbytes + self.ALIGN - 1) \
+                    // self.ALIGN * self.ALIGN
+                continue
+            datas.append([ds.comment, recs])
             continue
 
-        # write trailer
-        sz = 8
+        head = {'source': source, 'fileType': gf.fileType,
+                'comment': gf.comment, 'dataset': datas}
         try:
-            ofp.write(struct.pack(obo+'i8si', sz, '#ENDFILE', sz))
+            hbuf = json.dumps(head).encode('utf-8')
         except:
-            ofp.close()
             return False
+        base = self._base(len(hbuf))
 
-        ofp.close()
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            tmp = '%s.%d.tmp' % (image, os.getpid())
+            ofp = open(tmp, 'wb')
+        except:
+            return False
+        try:
+            ofp.write(self.MAGIC)
+            ofp.write(struct.pack('=Q', len(hbuf)))
+            ofp.write(hbuf)
+            for (p, ary) in arrays:
+                ofp.write(b'\0' * (base + p - ofp.tell()))
+                ary.tofile(ofp)
+                continue
+            ofp.close()
+            if os.path.exists(image):
+                os.remove(image)
+            os.rename(tmp, image)
+        except:
+            ofp.close()
+            try:
+                os.remove(tmp)
+            except:
+                pass
+            return False
         return True
 
+    def _evict(self):
+        """
+        remove images oldest first, while total size exceeds cap
+        """
+        try:
+            names = os.listdir(self.directory)
+        except:
+            return
+        images = []
+        total = 0
+        for n in names:
+            if not n.endswith('.gfc'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, n))
+            except:
+                continue
+            images.append((st.st_mtime, st.st_size, n))
+            total = total + st.st_size
+            continue
+        images.sort()
+        for (mtime, size, n) in images:
+            if total <= self.cap:
+                break
+            try:
+                os.remove(os.path.join(self.directory, n))
+                total = total - size
+            except:
+                pass
+            continue
+        return
+
+
+def _cloneFile(src, dst):
+    """
+    set contents of GF_FILE src into dst, sharing arrays
+    """
+    dst.fileType = src.fileType
+    dst.comment = list(src.comment)
+    dst.path = src.path
+    dst.dataset = []
+    for sds in src.dataset:
+        ds = GF_DATASET()
+        ds.comment = list(sds.comment)
+        for sd in sds.data:
+            d = copy.copy(sd)
+            d.aryNum = list(sd.aryNum)
+            ds.append(d)
+            continue
+        dst.dataset.append(ds)
+        continue
+    return
+
+
+class GF_PROFILE(object):
+    """
+    collector of per-record I/O events of GF_DATA read and write paths,
+    enabled by GF.PROFILE = GF_PROFILE(); an event is a dict of
+      op: 'read', 'map', 'read_ascii' or 'write'
+      keyword: keyword of the DATA record
+      bytes: bytes of the payload (of the lines for 'read_ascii')
+      io: seconds of reading/writing the file
+      decode: seconds of decoding (encoding for 'write') the array
+    events are aggregated by op, and wall time of stages of a program
+    can be measured by profile_stage().
+      callback: if not None, function called with each event
+      keep: if True, events are kept in the list events
+    """
+    def __init__(self, callback = None, keep = False):
+        self.callback = callback
+        self.keep = keep
+        self.events = []
+        self.totals = {} # op: [count, bytes, io, decode]
+        self.stages = [] # [name, seconds], in order of first use
+        self._lock = threading.Lock()
+        return
+
+    def record(self, op, keyword, nbytes, io, decode):
+        """
+        record an event
+        """
+        ev = {'op': op, 'keyword': keyword.strip(), 'bytes': nbytes,
+              'io': io, 'decode': decode}
+        with self._lock:
+            tot = self.totals.setdefault(op, [0, 0, 0.0, 0.0])
+            tot[0] = tot[0] + 1
+            tot[1] = tot[1] + nbytes
+            tot[2] = tot[2] + io
+            tot[3] = tot[3] + decode
+            if self.keep:
+                self.events.append(ev)
+        if self.callback is not None:
+            self.callback(ev)
+        return
+
+    def add_stage(self, name, seconds):
+        """
+        add wall time of a stage
+        """
+        with self._lock:
+            for st in self.stages:
+                if st[0] == name:
+                    st[1] = st[1] + seconds
+                    return
+            self.stages.append([name, seconds])
+        return
+
+    def __getstate__(self):
+        # picklable (to return from worker processes) without the lock
+        # and the callback
+        st = self.__dict__.copy()
+        del st['_lock']
+        st['callback'] = None
+        return st
+
+    def __setstate__(self, st):
+        self.__dict__.update(st)
+        self._lock = threading.Lock()
+        return
+
+    def merge(self, other):
+        """
+        add events, totals and stages of another GF_PROFILE (e.g. of a
+        worker process, see profile_task); times are summed, not wall
+        """
+        for (op, (n, nbytes, io, dec)) in other.totals.items():
+            with self._lock:
+                tot = self.totals.setdefault(op, [0, 0, 0.0, 0.0])
+                tot[0] = tot[0] + n
+                tot[1] = tot[1] + nbytes
+                tot[2] = tot[2] + io
+                tot[3] = tot[3] + dec
+            continue
+        for (name, sec) in other.stages:
+            self.add_stage(name, sec)
+            continue
+        for ev in other.events:
+            if self.keep:
+                with self._lock:
+                    self.events.append(ev)
+            if self.callback is not None:
+                self.callback(ev)
+            continue
+        return
+
+    def report(self):
+        """
+        returns a text of time breakdown by stage and by op
+        """
+        r = ''
+        if len(self.stages) > 0:
+            r = r + '%-24s %10s\n' % ('stage', 'seconds')
+            for (name, sec) in self.stages:
+                r = r + '%-24s %10.4f\n' % (name, sec)
+                continue
+        r = r + '%-12s %8s %12s %10s %10s %10s\n' % \
+            ('op', 'records', 'MB', 'io[s]', 'decode[s]', 'MB/s')
+        for op in sorted(self.totals):
+            (n, nbytes, io, dec) = self.totals[op]
+            mbs = 0.0
+            if io + dec > 0.0:
+                mbs = nbytes / (io + dec) / 1.0e6
+            r = r + '%-12s %8d %12.3f %10.4f %10.4f %10.1f\n' % \
+                (op, n, nbytes / 1.0e6, io, dec, mbs)
+            continue
+        return r
+
+
+class _Stage(object):
+    """
+    context measuring wall time of a stage into PROFILE
+    """
+    def __init__(self, name):
+        self.name = name
+        self.t0 = 0.0
+        return
+
+    def __enter__(self):
+        self.t0 = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if PROFILE is not None:
+            PROFILE.add_stage(self.name, _clock() - self.t0)
+        return False
+
+
+def profile_stage(name):
+    """
+    returns a context measuring wall time of a stage of a program into
+    PROFILE (nothing is measured if PROFILE is None)
+      with GF.profile_stage('read mesh'):
+          mesh.read(path)
+    """
+    return _Stage(name)
+
+
+def profile_task(profile, func, *args):
+    """
+    call func(*args) in a worker process, profiling it into a new
+    PROFILE of the worker if profile is True
+    returns (result of func, GF_PROFILE or None), the GF_PROFILE is to be
+    merged into PROFILE of the parent (see GF_PROFILE.merge)
+    """
+    global PROFILE
+    if not profile:
+        return (func(*args), None)
+    (prev, PROFILE) = (PROFILE, GF_PROFILE(keep=True))
+    try:
+        ret = func(*args)
+    finally:
+        (prof, PROFILE) = (PROFILE, prev)
+    return (ret, prof)
+
+
+def iter_records(path, mmap = False, native = None):
+    """
+    iterate DATA records of a binary GF file one at a time, without
+    keeping the whole file in memory.
+      path: path of the binary GF file, may be compressed
+      mmap: if True, map arrays (see GF_DATA.read), ignored if compressed
+      native: if not None, native flag of DATA records
+    yields (index of DATASET, GF_DATA)
+    """
+    ifp = _openRead(path)
+    if ifp is None:
+        return
+    if isinstance(ifp, _StreamReader):
+        mmap = False
+    try:
+        (ibo, irm) = GF_FILE()._read_header(ifp)
+        if ibo is None:
+            return
+
+        dsIdx = 0
+        dataset = GF_DATASET()
+        while ( dataset._read_header(ifp, ibo, irm) ):
+            data = GF_DATA()
+            while ( data.read(ifp, ibo, mmap, native, irm) ):
+                yield (dsIdx, data)
+                data = GF_DATA()
+                continue
+            dsIdx = dsIdx + 1
+            continue
+    finally:
+        ifp.close()
+    return
+
+
+# asyncio interface (GF_LOADER, aread, aiter_records), Python 3.6 or later
+if sys.version_info >= (3, 6) and __name__ != '__main__':
+    try:
+        from .GFasync import GF_LOADER, aread, aiter_records
+    except (ImportError, ValueError, SystemError):
+        from GFasync import GF_LOADER, aread, aiter_records
+
 
 if __name__ == '__main__':
     gf = GF_FILE()
     binary = True
+    if '--profile' in sys.argv[1:]:
+        PROFILE = GF_PROFILE()
     for f in sys.argv[1:]:
         if f == '-a':
             binary = False
@@ -725,11 +2660,18 @@ if __name__ == '__main__':
         if f == '-b':
             binary = True
             continue
+        if f == '--profile':
+            continue
 
         if binary:
-            ret = gf.read(f)
+            if PROFILE is None:
+                ret = gf.scan(f) or gf.read(f)
+            else:
+                with profile_stage('read ' + f):
+                    ret = gf.read(f)
         else:
-            ret = gf.read_ascii(f)
+            with profile_stage('read ' + f):
+                ret = gf.read_ascii(f)
         if ret:
             print('file: ' + f)
             print(gf)
@@ -740,4 +2682,6 @@ if __name__ == '__main__':
         else:
             print('file: ' + f + '... read failed')
         continue
+    if PROFILE is not None:
+        sys.stdout.write(PROFILE.report())
     sys.exit()
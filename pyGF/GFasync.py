@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+asyncio interface of GF module (Python 3.6 or later)
+"""
+import os
+import copy
+import threading
+import collections
+import asyncio
+import concurrent.futures
+try:
+    from . import GF
+except (ImportError, ValueError, SystemError):
+    import GF
+
+# default max number of threads reading GF files
+ASYNC_WORKERS = 4
+
+# default max size in bytes of DATA records being read at once
+ASYNC_MAX_BYTES = 256 * 1024 * 1024
+
+# GF_LOADER used by aread/aiter_records, created on first use
+_LOADER = None
+
+
+class GF_LOADER(object):
+    """
+    loader of binary GF files for asyncio programs; blocking reads and
+    decoding of DATA records run in a bounded pool of threads, and the size
+    of DATA records being read at once is limited, so that the event loop
+    is not blocked and many files may be loaded at once.
+      workers: max number of threads
+      maxBytes: max size in bytes (as stored) of DATA records being read
+                at once; a larger record is read alone.
+    """
+    def __init__(self, workers = ASYNC_WORKERS, maxBytes = ASYNC_MAX_BYTES):
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.maxBytes = maxBytes
+        self.inflight = 0
+        self._waiters = collections.deque()
+        return
+
+    def __str__(self):
+        return 'GF_LOADER(maxBytes=%d, inflight=%d, waiting=%d)' % \
+            (self.maxBytes, self.inflight, len(self._waiters))
+
+    async def _acquire(self, nbytes):
+        """
+        wait until nbytes may be read within maxBytes
+        returns the size accounted
+        """
+        nbytes = min(nbytes, self.maxBytes)
+        loop = asyncio.get_event_loop()
+        while ( self.inflight > 0 and
+                self.inflight + nbytes > self.maxBytes ):
+            fut = loop.create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            finally:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+            continue
+        self.inflight += nbytes
+        return nbytes
+
+    def _release(self, nbytes):
+        self.inflight -= nbytes
+        while ( len(self._waiters) > 0 ):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+            continue
+        return
+
+    async def _run(self, nbytes, func, *args):
+        """
+        call func(*args) in the pool, accounting nbytes in flight until
+        it returns; if cancelled, func is cancelled unless running, and
+        the bytes are released when it is done.
+        """
+        nbytes = await self._acquire(nbytes)
+        loop = asyncio.get_event_loop()
+        try:
+            cf = self.executor.submit(func, *args)
+        except:
+            self._release(nbytes)
+            raise
+        cf.add_done_callback(
+            lambda f: loop.call_soon_threadsafe(self._release, nbytes))
+        return await asyncio.wrap_future(cf)
+
+    async def _load(self, gf, ds, i, mmap, native):
+        """
+        load a DATA record of a scanned GF_FILE
+        returns GF_DATA, or None if failed.
+        """
+        d = gf.dataset[ds].data[i]
+        if d.array is not None:
+            return d
+        nbytes = 0 if mmap else d.aryNum[0] * d.aryNum[1] * 4
+        return await self._run(nbytes, gf.load, i, ds, mmap, native)
+
+    def _selected(self, gf, keywords):
+        """
+        returns list of (DATASET index, DATA index) to load
+        """
+        sel = []
+        for (ds, dataset) in enumerate(gf.dataset):
+            # the first DATA of each keyword, as GF_FILE.read(keywords=...)
+            if keywords is not None:
+                first = [dataset.get(k) for k in keywords]
+            for (i, d) in enumerate(dataset.data):
+                if keywords is None or any([d is x for x in first]):
+                    sel.append((ds, i))
+                continue
+            continue
+        return sel
+
+    async def read(self, path, keywords = None, mmap = False,
+                   native = None):
+        """
+        read a binary GF file (see GF_FILE.read); the file is scanned,
+        then DATA records are loaded concurrently in the pool.
+          keywords: if not None, list of keywords of DATA records to load
+        a compressed file is read as a whole in the pool, ignoring
+        keywords and mmap; if GF.CACHE is set (and not mmap nor keywords),
+        the file is read through it.
+        returns GF_FILE, or None if failed.
+        """
+        gf = GF.GF_FILE()
+        if GF.CACHE is not None and not mmap and keywords is None:
+            nbytes = os.path.getsize(path) if os.path.exists(path) else 0
+            if await self._run(nbytes, gf.read, path, False, native):
+                return gf
+            return None
+        if not await self._run(0, gf.scan, path):
+            # not random accessible (compressed), or failed
+            gf = GF.GF_FILE()
+            nbytes = os.path.getsize(path) if os.path.exists(path) else 0
+            if await self._run(nbytes, gf.read, path, False, native):
+                return gf
+            return None
+
+        tasks = [asyncio.ensure_future(self._load(gf, ds, i, mmap, native))
+                 for (ds, i) in self._selected(gf, keywords)]
+        try:
+            rets = await asyncio.gather(*tasks)
+        except:
+            for t in tasks:
+                t.cancel()
+                continue
+            raise
+        if not all([d is not None for d in rets]):
+            return None
+        return gf
+
+    async def iter_records(self, path, keywords = None, mmap = False,
+                           native = None, ahead = 2):
+        """
+        async iterator of DATA records of a binary GF file, in file order,
+        loading up to ahead records in advance
+          keywords: if not None, list of keywords of DATA records to yield
+        yields (index of DATASET, GF_DATA); the GF_DATA yielded is not
+        kept by the loader. For a compressed file, the records are read
+        by GF.iter_records in the pool.
+        """
+        gf = GF.GF_FILE()
+        if not await self._run(0, gf.scan, path):
+            it = GF.iter_records(path, False, native)
+            # the generator runs in the pool, and is closed there when
+            # not running
+            lock = threading.Lock()
+            def step():
+                with lock:
+                    return next(it, None)
+            def close():
+                with lock:
+                    it.close()
+                return
+            if keywords is not None:
+                keys = set([k.strip() for k in keywords])
+            seen = set() # (index of DATASET, keyword) yielded
+            # the size of the next record is not known until it is read;
+            # estimated by the file size first, then by the last record
+            nbytes = os.path.getsize(path) if os.path.exists(path) else 0
+            try:
+                while ( True ):
+                    rec = await self._run(nbytes, step)
+                    if rec is None:
+                        break
+                    d = rec[1]
+                    nbytes = d.aryNum[0] * d.aryNum[1] * 4
+                    if keywords is not None:
+                        # the first DATA of each keyword, as _selected
+                        key = (rec[0], d.keyword.strip())
+                        if key[1] not in keys or key in seen:
+                            continue
+                        seen.add(key)
+                    yield rec
+                    continue
+            finally:
+                self.executor.submit(close)
+            return
+
+        sel = collections.deque(self._selected(gf, keywords))
+        pending = collections.deque()
+        try:
+            while ( len(sel) > 0 or len(pending) > 0 ):
+                while ( len(sel) > 0 and len(pending) < max(1, ahead) ):
+                    (ds, i) = sel.popleft()
+                    pending.append((ds, asyncio.ensure_future(
+                        self._load(gf, ds, i, mmap, native))))
+                    continue
+                (ds, task) = pending.popleft()
+                d = await task
+                if d is None:
+                    raise IOError('failed to load a DATA record: %s' % path)
+                # yield a copy, and drop the array from the scanned file
+                rec = copy.copy(d)
+                rec.aryNum = list(d.aryNum)
+                d.array = None
+                yield (ds, rec)
+                continue
+        finally:
+            for (ds, task) in pending:
+                task.cancel()
+                continue
+        return
+
+
+def _loader():
+    global _LOADER
+    if _LOADER is None:
+        _LOADER = GF_LOADER()
+    return _LOADER
+
+
+async def aread(path, keywords = None, mmap = False, native = None):
+    """
+    read a binary GF file without blocking the event loop
+    (see GF_LOADER.read), by the default GF_LOADER
+    returns GF_FILE, or None if failed.
+    """
+    return await _loader().read(path, keywords, mmap, native)
+
+
+def aiter_records(path, keywords = None, mmap = False, native = None,
+                  ahead = 2):
+    """
+    async iterator of DATA records of a binary GF file
+    (see GF_LOADER.iter_records), by the default GF_LOADER
+    """
+    return _loader().iter_records(path, keywords, mmap, native, ahead)
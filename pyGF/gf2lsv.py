@@ -2,20 +2,30 @@
 # -*- coding: utf-8 -*-
 """
 gf2lsv : convert FFB/GF files(with non dividing mesh) to LSV Uns files
-  read : MESH, FLOW
-  write: Index, UnsMesh, UnsData
+  read : MESH, FLOW (one or more files of time steps)
+  write: Index, UnsMesh, UnsData (one per time step)
 """
 import sys, os
+import glob
+import shutil
 import struct
 import getopt
+import tempfile
+import numpy
 import GF
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
 
 
 def usage0():
     print('usage: %s [-h|--help]' % os.path.basename(sys.argv[0]))
     print('       %s <--mesh|--amesh> meshfile <--data|--adata> datafile \\' \
          % os.path.basename(sys.argv[0]))
-    print('          [--out outbase] [--order no]')
+    print('          [datafile ...]')
+    print('          [--out outbase] [--order no|all] [--fields k1,k2,...] \\')
+    print('          [--jobs n] [--profile]')
 
 
 def outUnm(path, mesh):
@@ -39,20 +49,15 @@ def outUnm(path, mesh):
 
     # write node-info block
     ofp.write(struct.pack('2i', nNode, nnNode))
-    for i in range(nNode):
-        ofp.write(struct.pack('i', i))
-        continue
-
-    # scan elem info
-    (nTetra, nPyra, nHexa) = (0, 0, 0)
-    for i in range(nElem):
-        if mesh.dataset[0].data[1].array[i][-1] > 0:
-            nHexa = nHexa + 1
-        elif mesh.dataset[0].data[1].array[i][-4] > 0:
-            nPyra = nPyra + 1
-        else:
-            nTetra = nTetra + 1
-        continue
+    ofp.write(numpy.arange(nNode, dtype=numpy.int32).tobytes())
+
+    # classify elems by the node table
+    tbl = NodeTbl.array
+    hexa = tbl[:, -1] > 0
+    pyra = ~hexa & (tbl[:, -4] > 0)
+    tetra = ~hexa & ~pyra
+    (nTetra, nPyra, nHexa) = \
+        (int(tetra.sum()), int(pyra.sum()), int(hexa.sum()))
     nETypes = 0
     if nHexa > 0 or nPyra > 0: nETypes = nETypes + 1
     if nTetra > 0: nETypes = nETypes + 1
@@ -64,37 +69,26 @@ def outUnm(path, mesh):
     # write TETRA elem block
     if nTetra > 0:
         ofp.write(struct.pack('iii', 4, nTetra, 0)) # EType, nEInner, nEOverlap
-        for i in range(nTetra):
-            ofp.write(struct.pack('i', i))
-            continue
-        for i in range(nElem):
-            arr = mesh.dataset[0].data[1].array[i]
-            if arr[-1] > 0: continue
-            if arr[-4] > 0: continue
-            ofp.write(struct.pack('iiii',
-                                  arr[0]-1, arr[1]-1, arr[2]-1, arr[3]-1))
-            continue
+        ofp.write(numpy.arange(nTetra, dtype=numpy.int32).tobytes())
+        conn = tbl[tetra, 0:4].astype(numpy.int32)
+        conn -= 1
+        ofp.write(conn.tobytes())
+        del conn
 
     # write HEXA elem block
     if nHexa > 0 or nPyra > 0:
         nEInner = nHexa + nPyra
         ofp.write(struct.pack('iii', 8, nEInner, 0)) # EType, nEInner, nEOverlap
-        for i in range(nEInner):
-            ofp.write(struct.pack('i', i + nTetra))
-            continue
-        for i in range(nElem):
-            arr = mesh.dataset[0].data[1].array[i]
-            if arr[-4] == 0: continue
-            if arr[-1] == 0: # Pyramid
-                ofp.write(struct.pack('8i',
-                                      arr[0]-1, arr[1]-1, arr[2]-1, arr[3]-1,
-                                      arr[4]-1, arr[4]-1, arr[4]-1, arr[4]-1 ))
-                                      #arr[1]-1, arr[2]-1, arr[3]-1, arr[4]-1,
-                                      #arr[0]-1, arr[0]-1, arr[0]-1, arr[0]-1 ))
-                continue
-            ofp.write(struct.pack('8i', arr[0]-1, arr[1]-1, arr[2]-1, arr[3]-1,
-                                  arr[4]-1, arr[5]-1, arr[6]-1, arr[7]-1 ))
-            continue
+        ofp.write(numpy.arange(nTetra, nTetra + nEInner,
+                               dtype=numpy.int32).tobytes())
+        hp = hexa | pyra
+        conn = tbl[hp, 0:8].astype(numpy.int32)
+        conn -= 1
+        # Pyramid as a hexa collapsing the top face to the apex
+        py = pyra[hp]
+        conn[py, 5:8] = conn[py, 4:5]
+        ofp.write(conn.tobytes())
+        del conn
 
     # write Ngrp block
     ofp.write(struct.pack('i', 0)) # nNgrp
@@ -111,49 +105,131 @@ def outUnm(path, mesh):
     # write xyz block
     ofp.write(struct.pack('i', nnNode))
     ofp.write(struct.pack('i', 3)) # nD
-    for i in range(nnNode):
-        arr = mesh.dataset[0].data[0].array[i]
-        ofp.write(struct.pack('ddd', arr[0], arr[1], arr[2]))
-        continue
+    xyz = numpy.ascontiguousarray(NodeLst.array[:nnNode, 0:3],
+                                  dtype=numpy.float64)
+    ofp.write(xyz.tobytes())
 
     ofp.close()
     return (nnNode, nTetra + nPyra + nHexa)
 
 
-def outUnd(path, nNode, nElem, mesh, data, dorder=0):
-    if nNode < 1 or nElem < 1: return 0
-    if mesh == None or len(mesh.dataset) < 1 or len(mesh.dataset[0].data) < 2:
-        return 0
+def elemPerm(mesh):
+    """
+    returns the order of elems in the Uns files: indices of tetra elems,
+    then of hexa and pyramid elems, of the node table of mesh
+    """
+    tbl = mesh.dataset[0].data[1].array
+    hexa = tbl[:, -1] > 0
+    pyra = ~hexa & (tbl[:, -4] > 0)
+    tetra = ~hexa & ~pyra
+    return numpy.concatenate((numpy.nonzero(tetra)[0],
+                              numpy.nonzero(hexa | pyra)[0]))
+
+
+def dataOrders(data, order='0', fields=None, warn=False):
+    """
+    returns list of orders of DATA records to convert (0 as the first
+    record after TIME and STEP), or None if invalid
+      order: order number, or 'all' as all records of nodes and elems
+             (but those of other than 1 or 3 components, which are skipped)
+      fields: if not None, list of keywords of records ('*' may be omitted)
+      warn: if True, print records skipped by 'all'
+    """
     if data == None or len(data.dataset) < 1 or len(data.dataset[0].data) < 3:
-        return 0
-    if dorder < 0 or dorder >= len(data.dataset[0].data) - 2:
-        return 0
+        return None
+    ds = data.dataset[0]
+    dlist = ds.data[2:]
+    if fields != None:
+        orders = []
+        for k in fields:
+            k = k.strip()
+            if not k.startswith('*'): k = '*' + k
+            # the first record of the keyword, as GF_FILE.read(keywords=...)
+            d = ds.get(k)
+            found = [i for i in range(len(ds.data)) if ds.data[i] is d]
+            if d is None or found[0] < 2:
+                return None
+            orders.append(found[0] - 2)
+            continue
+        return orders
+    if order == 'all':
+        orders = []
+        for i in range(len(dlist)):
+            if dlist[i].keyword.strip().endswith('PS'):
+                continue
+            if dataDims(dlist[i]) == (0, 0):
+                if warn:
+                    print('%s: skipped %s of %d components' % \
+                              (sys.argv[0], dlist[i].keyword.strip(),
+                               dlist[i].aryNum[1]))
+                continue
+            orders.append(i)
+            continue
+        return orders
+    try:
+        return [int(order),]
+    except:
+        return None
 
-    Etbl = mesh.dataset[0].data[1]
-    Data = data.dataset[0].data[dorder + 2]
-    (nND, nED) = (0, 0)
-    NodeData = True
-    if Data.keyword[-1] == 'E':
-        NodeData = False
 
-    if NodeData:
-        nnNode = Data.aryNum[0]
-        if nNode != nnNode:
-            return 0
+def dataDims(Data, nNode=None, nElem=None):
+    """
+    returns (#of components at nodes, #of components at elems) of a DATA
+    record, or (0, 0) if invalid; sizes are checked if nNode/nElem given
+    """
+    (nND, nED) = (0, 0)
+    if Data.keyword[-1] != 'E':
+        if nNode != None and nNode != Data.aryNum[0]:
+            return (0, 0)
         nND = Data.aryNum[1]
         if nND != 1 and nND != 3:
-            return 0
+            return (0, 0)
     else:
-        nnElem = Data.aryNum[0]
-        if nElem < nnElem:
-            return 0
+        if nElem != None and nElem < Data.aryNum[0]:
+            return (0, 0)
         nED = Data.aryNum[1]
         if nED != 1 and nED != 3:
-            return 0
-
-    if nND == 0 and nED == 0:
+            return (0, 0)
+    return (nND, nED)
+
+
+def outUnd(path, nNode, nElem, mesh, data, dorder=0, perm=None):
+    """
+    write node/elem data of DATA records into a LSV Uns data file;
+    records at nodes are written as components of the node data block,
+    and records at elems as components of the elem data block.
+      mesh: mesh, not used (may be None) if perm is given
+      dorder: order of DATA record, or list of them (see dataOrders)
+      perm: order of elems (see elemPerm), computed from mesh if None
+    returns #of components written, or 0 if failed
+    """
+    if nNode < 1 or nElem < 1: return 0
+    if perm is None and (mesh == None or len(mesh.dataset) < 1 or
+                         len(mesh.dataset[0].data) < 2):
+        return 0
+    if data == None or len(data.dataset) < 1 or len(data.dataset[0].data) < 3:
+        return 0
+    if isinstance(dorder, int):
+        dorder = [dorder,]
+    if len(dorder) < 1:
         return 0
 
+    (nDatas, eDatas) = ([], [])
+    for o in dorder:
+        if o < 0 or o >= len(data.dataset[0].data) - 2:
+            return 0
+        Data = data.dataset[0].data[o + 2]
+        (n, e) = dataDims(Data, nNode, nElem)
+        if n > 0:
+            nDatas.append(Data)
+        elif e > 0:
+            eDatas.append(Data)
+        else:
+            return 0
+        continue
+    nND = sum([d.aryNum[1] for d in nDatas])
+    nED = sum([d.aryNum[1] for d in eDatas])
+
     # open data file
     try:
         ofp = open(path, 'wb')
@@ -162,91 +238,142 @@ def outUnd(path, nNode, nElem, mesh, data, dorder=0):
 
     # write node data block
     ofp.write(struct.pack('2i', nNode, nND))
-    if nND == 1:
-        for i in range(nNode):
-            ofp.write(struct.pack('d', Data.array[i][0]))
-            continue
-    elif nND == 3:
-        for i in range(nNode):
-            ofp.write(struct.pack('ddd', Data.array[i][0],
-                                  Data.array[i][1], Data.array[i][2]))
+    if nND > 0:
+        buff = numpy.empty((nNode, nND), dtype=numpy.float64)
+        j = 0
+        for d in nDatas:
+            buff[:, j:j+d.aryNum[1]] = d.array[:nNode]
+            j = j + d.aryNum[1]
             continue
+        ofp.write(buff.tobytes())
+        del buff
 
-    # write elem data block
+    # write elem data block (TETRA elems, then HEXA/Pyramid elems)
     ofp.write(struct.pack('2i', nElem, nED))
     if nED > 0:
-        (nTetra, nPyra, nHexa) = (0, 0, 0)
-        for i in range(nnElem):
-            if Etbl.array[i][-1] > 0:
-                nHexa = nHexa + 1
-            elif Etbl.array[i][-4] > 0:
-                nPyra = nPyra + 1
-            else:
-                nTetra = nTetra + 1
+        if perm is None:
+            perm = elemPerm(mesh)
+        nnElem = min([d.aryNum[0] for d in eDatas])
+        if nnElem < len(perm):
+            perm = perm[perm < nnElem]
+        buff = numpy.empty((len(perm), nED), dtype=numpy.float64)
+        j = 0
+        for d in eDatas:
+            buff[:, j:j+d.aryNum[1]] = d.array[perm]
+            j = j + d.aryNum[1]
             continue
-
-        # write TETRA elem block
-        if nTetra > 0:
-            for i in range(nnElem):
-                arr = Etbl.array[i]
-                if arr[-4] > 0: continue
-                for j in range(nED):
-                    ofp.write(struct.pack('d', Data.array[i][j]))
-                continue
-
-        # write HEXA elem block
-        if nHexa > 0 or nPyra > 0:
-            for i in range(nnElem):
-                arr = Etbl.array[i]
-                if arr[-4] == 0: continue
-                for j in range(nED):
-                    ofp.write(struct.pack('d', Data.array[i][j]))
-                continue
+        ofp.write(buff.tobytes())
+        del buff
 
     ofp.close()
-    return nND - nED
-
-
-def outIdx(path, meshPath, dataPath, data, dorder=0):
+    return nND + nED
+
+
+def stepInfo(ds):
+    """
+    returns (step, time) of a DATASET of time step, from its *STEP_PS and
+    *TIME_PS records (0 and 0.0 if not found)
+    """
+    (stpIndex, stpTime) = (0, 0.0)
+    if '*TIME_PS' in ds and ds['*TIME_PS'].array is not None:
+        stpTime = float(ds['*TIME_PS'].array[0][0])
+    if '*STEP_PS' in ds and ds['*STEP_PS'].array is not None:
+        stpIndex = int(ds['*STEP_PS'].array[0][0])
+    return (stpIndex, stpTime)
+
+
+def readData(path, binary=True):
+    """
+    read a data file; a binary file is scanned only (arrays are loaded
+    step by step, see convStep), or read if it may not be scanned
+    (compressed)
+    returns GF_FILE, or None if failed
+    """
+    Data = GF.GF_FILE()
+    if not binary:
+        ret = Data.read_ascii(path)
+    else:
+        ret = Data.scan(path) or Data.read(path)
+    if not ret:
+        return None
+    return Data
+
+
+def stepFiles(data):
+    """
+    returns list of GF_FILE of each DATASET (time step) of data, sharing
+    its DATA records; arrays of a scanned file may be loaded by load()
+    """
+    steps = []
+    for ds in data.dataset:
+        step = GF.GF_FILE()
+        (step.fileType, step.comment, step.path) = \
+            (data.fileType, data.comment, data.path)
+        step.dataset = [ds,]
+        steps.append(step)
+        continue
+    return steps
+
+
+def convStep(path, nNode, nElem, mesh, step, order='0', fields=None,
+             perm=None):
+    """
+    write a time step into a LSV Uns data file, loading the arrays needed
+    if not loaded, and releasing arrays of the step after written
+      step: GF_FILE of the time step (see stepFiles)
+      order, fields: DATA records to write (see dataOrders)
+      perm: order of elems (see elemPerm)
+    returns (step, time) of the time step, or None if failed
+    """
+    orders = dataOrders(step, order, fields)
+    if orders == None or len(orders) < 1:
+        return None
+    ds = step.dataset[0]
+    keys = [o + 2 for o in orders] + \
+        [k for k in ('*TIME_PS', '*STEP_PS') if k in ds]
+    ret = 0
+    if all([step.load(k) != None for k in keys]):
+        ret = outUnd(path, nNode, nElem, mesh, step, orders, perm)
+    info = stepInfo(ds)
+    for d in ds.data:
+        d.array = None
+        continue
+    if ret == 0:
+        return None
+    return info
+
+
+def outIdx(path, meshPath, dataPath, data, dorder=0, steps=None):
+    """
+    write a LSV index file
+      data: GF_FILE of data (of the first time step, if steps)
+      steps: if not None, list of (step, time, data file path) of time
+             steps, written in order of step and time (indexed 0, 1, ...),
+             instead of dataPath
+    returns 1, or 0 if failed
+    """
     if data == None or len(data.dataset) < 1 or len(data.dataset[0].data) < 3:
         return 0
-    if dorder < 0 or dorder >= len(data.dataset[0].data) - 2:
+    if isinstance(dorder, int):
+        dorder = [dorder,]
+    if len(dorder) < 1:
         return 0
 
-    Data = data.dataset[0].data[dorder + 2]
     (nND, nED) = (0, 0)
-    NodeData = True
-    if Data.keyword[-1] == 'E':
-        NodeData = False
-
-    if NodeData:
-        nnNode = Data.aryNum[0]
-        if nNode != nnNode:
+    for o in dorder:
+        if o < 0 or o >= len(data.dataset[0].data) - 2:
             return 0
-        nND = Data.aryNum[1]
-        if nND != 1 and nND != 3:
+        (n, e) = dataDims(data.dataset[0].data[o + 2])
+        if n == 0 and e == 0:
             return 0
-    else:
-        nnElem = Data.aryNum[0]
-        if nElem < nnElem:
-            return 0
-        nED = Data.aryNum[1]
-        if nED != 1 and nED != 3:
-            return 0
-    if nND == 0 and nED == 0:
-        return 0
-
-    stpIndex = 0
-    stpTime = 0.0
-    for i in range(2):
-        if data.dataset[0].data[i].keyword == '*TIME_PS':
-            stpTime = float(data.dataset[0].data[i].array[0][0])
-            continue
-        if data.dataset[0].data[i].keyword == '*STEP_PS':
-            stpTime = int(data.dataset[0].data[i].array[0][0])
-            continue
+        (nND, nED) = (nND + n, nED + e)
         continue
 
+    if steps == None:
+        (stpIndex, stpTime) = stepInfo(data.dataset[0])
+        steps = [(stpIndex, stpTime, dataPath),]
+    steps = sorted(steps, key=lambda x: (x[0], x[1]))
+
     # open data file
     try:
         ofp = open(path, 'w')
@@ -265,9 +392,11 @@ def outIdx(path, meshPath, dataPath, data, dorder=0):
     ofp.write('  <mesh>\n')
     ofp.write('    <file>%s</file>\n' % meshPath)
     ofp.write('  </mesh>\n')
-    ofp.write('  <step index="%d" time="%f">\n' % (stpIndex, stpTime))
-    ofp.write('    <file>%s</file>\n' % dataPath)
-    ofp.write('  </step>\n')
+    for (stpIndex, (stpStep, stpTime, stpPath)) in enumerate(steps):
+        ofp.write('  <step index="%d" time="%f">\n' % (stpIndex, stpTime))
+        ofp.write('    <file>%s</file>\n' % stpPath)
+        ofp.write('  </step>\n')
+        continue
     ofp.write('</data>\n')
     ofp.write('</LSV_Index>\n')
 
@@ -275,17 +404,58 @@ def outIdx(path, meshPath, dataPath, data, dorder=0):
     return 1
 
 
+# state of a worker process of --jobs (see initWorker)
+_worker = {}
+
+def initWorker(permPath, nNode, nElem, order, fields):
+    """
+    initialize a worker process converting time steps; the order of
+    elems is shared by a memory-mapped file (permPath, .npy)
+    """
+    _worker['perm'] = numpy.load(permPath, mmap_mode='r')
+    (_worker['nNode'], _worker['nElem']) = (nNode, nElem)
+    (_worker['order'], _worker['fields']) = (order, fields)
+    _worker['data'] = (None, None)
+    return
+
+
+def convTask(task):
+    """
+    convert a time step in a worker process (see initWorker)
+      task: (output path, data file path, binary, index of DATASET)
+    returns (step, time) of the time step, or error message if failed
+    """
+    (outData, datafile, binary, ids) = task
+    try:
+        # keep the last data file read, for the next steps in it
+        if _worker['data'][0] != datafile:
+            _worker['data'] = (datafile, readData(datafile, binary))
+        Data = _worker['data'][1]
+        if Data == None:
+            return 'data file load failed: %s' % datafile
+        info = convStep(outData, _worker['nNode'], _worker['nElem'], None,
+                        stepFiles(Data)[ids], _worker['order'],
+                        _worker['fields'], _worker['perm'])
+    except Exception as e:
+        return '%s: %s' % (outData, e)
+    if info == None:
+        return 'Data file output failed: %s' % outData
+    return info
+
+
 if __name__ == '__main__':
     #-------------- ARGUMENTS CHECK --------------
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'h',
-                                   ['data=', 'adata=', 'mesh=', 'amesh=',
-                                    'out=', 'order=', 'help'])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], 'h',
+                                       ['data=', 'adata=', 'mesh=', 'amesh=',
+                                        'out=', 'order=', 'fields=',
+                                        'jobs=', 'profile', 'help'])
     except getopt.GetoptError:
         usage0()
         sys.exit(1)
 
-    (datafile, meshfile, outbase, order) = (None, None, None, 0)
+    (datafiles, meshfile, outbase, order) = ([], None, None, '0')
+    (fields, jobs) = (None, 1)
     (data_bin, mesh_bin) = (True, True)
     for o, a in opts:
         if o in ('-h', '--help'):
@@ -300,23 +470,33 @@ if __name__ == '__main__':
             mesh_bin = False
             continue
         if o == '--data':
-            datafile = a
+            datafiles = datafiles + (sorted(glob.glob(a)) or [a,])
             data_bin = True
             continue
         if o == '--adata':
-            datafile = a
+            datafiles = datafiles + (sorted(glob.glob(a)) or [a,])
             data_bin = False
             continue
         if o == '--out':
             outbase = a
             continue
         if o == '--order':
-            order = int(a)
+            order = a
+            continue
+        if o == '--fields':
+            fields = [k for k in a.split(',') if k != '']
+            continue
+        if o == '--jobs':
+            jobs = int(a)
+            continue
+        if o == '--profile':
+            GF.PROFILE = GF.GF_PROFILE()
             continue
         continue
 
     #-------------- DATA INPUT --------------
-    if datafile == None or meshfile == None:
+    datafiles = datafiles + args # rest of files expanded by shell
+    if len(datafiles) < 1 or meshfile == None:
         print('%s: invalid argument.' % sys.argv[0])
         usage0()
         sys.exit(1)
@@ -324,49 +504,148 @@ if __name__ == '__main__':
     Mesh = GF.GF_FILE()
     sys.stdout.write('reading mesh file: %s ...' % meshfile)
     sys.stdout.flush()
-    if mesh_bin:
-        ret = Mesh.read(meshfile)
-    else:
-        ret = Mesh.read_ascii(meshfile)
+    with GF.profile_stage('read mesh'):
+        if mesh_bin:
+            ret = Mesh.read(meshfile)
+        else:
+            ret = Mesh.read_ascii(meshfile)
     if not ret:
         print('%s: mesh file load failed: %s\n' % (sys.argv[0], meshfile))
         sys.exit(2)
     print('done')
 
-    Data = GF.GF_FILE()
-    sys.stdout.write('reading data file: %s ...' % datafile)
-    sys.stdout.flush()
-    if data_bin:
-        ret = Data.read(datafile)
-    else:
-        ret = Data.read_ascii(datafile)
-    if not ret:
-        print('%s: data file load failed: %s\n' % (sys.argv[0], datafile))
-        sys.exit(3)
-    print('done')
-
     #-------------- DATA OUTPUT --------------
     if outbase == None:
-        outMesh = 'GFDATA.unm'
-        outData = 'GFDATA.und'
-        outIndex = 'GFDATA.idx'
-    else:
-        outMesh = outbase + '.unm'
-        outData = outbase + '.und'
-        outIndex = outbase + '.idx'
+        outbase = 'GFDATA'
+    outMesh = outbase + '.unm'
+    outIndex = outbase + '.idx'
 
-    (nNode, nElem) = outUnm(outMesh, Mesh)
+    with GF.profile_stage('write mesh'):
+        (nNode, nElem) = outUnm(outMesh, Mesh)
     if nNode < 1 or nElem < 1:
         print('%s: Mesh file output failed: %s\n' % (sys.argv[0], outMesh))
         sys.exit(5)
+    perm = elemPerm(Mesh)
+
+    if jobs > 1 and ProcessPoolExecutor == None:
+        print('%s: --jobs needs concurrent.futures, converting serially'
+              % sys.argv[0])
+        jobs = 1
+
+    #---- loop of time steps ----
+    (steps, first) = ([], None)
+    if jobs > 1:
+        # list time steps, then convert them in a process pool
+        tasks = []
+        for datafile in datafiles:
+            sys.stdout.write('reading data file: %s ...' % datafile)
+            sys.stdout.flush()
+            with GF.profile_stage('read data'):
+                Data = readData(datafile, data_bin)
+            if Data == None:
+                print('%s: data file load failed: %s\n' % \
+                          (sys.argv[0], datafile))
+                sys.exit(3)
+            print('done')
+            if datafile == datafiles[0]: # warn of records skipped by all
+                dataOrders(Data, order, fields, True)
+            for ids in range(len(Data.dataset)):
+                tasks.append(['', datafile, data_bin, ids])
+                continue
+            if first == None:
+                first = stepFiles(Data)[0]
+                for d in first.dataset[0].data:
+                    d.array = None
+                    continue
+            del Data
+            continue
+        for i in range(len(tasks)):
+            if len(tasks) == 1 and len(datafiles) == 1:
+                tasks[i][0] = outbase + '.und'
+            else:
+                tasks[i][0] = outbase + '_%04d.und' % i
+            continue
 
-    if outUnd(outData, nNode, nElem, Mesh, Data, order) == 0:
-        print('%s: Data file output failed: %s\n' % (sys.argv[0], outData))
-        sys.exit(6)
+        failed = 0
+        tmpdir = tempfile.mkdtemp()
+        try:
+            permPath = os.path.join(tmpdir, 'perm.npy')
+            numpy.save(permPath, perm)
+            with GF.profile_stage('write data'):
+                with ProcessPoolExecutor(jobs, initializer=initWorker,
+                                         initargs=(permPath, nNode, nElem,
+                                                   order, fields)) as pool:
+                    # I/O of workers is profiled and merged into PROFILE
+                    futures = [pool.submit(GF.profile_task,
+                                           GF.PROFILE is not None,
+                                           convTask, tuple(t)) for t in tasks]
+                    for (t, f) in zip(tasks, futures):
+                        try:
+                            (ret, prof) = f.result()
+                        except Exception as e:
+                            (ret, prof) = (str(e), None)
+                        if prof is not None:
+                            GF.PROFILE.merge(prof)
+                        if not isinstance(ret, tuple):
+                            print('%s: step %d of %s failed: %s' % \
+                                      (sys.argv[0], t[3], t[1], ret))
+                            failed = failed + 1
+                            continue
+                        print('writing data file: %s ...done' % t[0])
+                        steps.append((ret[0], ret[1], t[0]))
+                        continue
+        finally:
+            shutil.rmtree(tmpdir, True)
+        if failed > 0:
+            print('%s: Data file output failed: %d of %d steps\n' % \
+                      (sys.argv[0], failed, len(tasks)))
+            sys.exit(6)
 
-    if outIdx(outIndex, outMesh, outData, Data, order) == 0:
+    else:
+        for datafile in datafiles:
+            sys.stdout.write('reading data file: %s ...' % datafile)
+            sys.stdout.flush()
+            with GF.profile_stage('read data'):
+                Data = readData(datafile, data_bin)
+            if Data == None:
+                print('%s: data file load failed: %s\n' % \
+                          (sys.argv[0], datafile))
+                sys.exit(3)
+            print('done')
+            if datafile == datafiles[0]: # warn of records skipped by all
+                dataOrders(Data, order, fields, True)
+
+            for step in stepFiles(Data):
+                if len(datafiles) == 1 and len(Data.dataset) == 1:
+                    outData = outbase + '.und'
+                else:
+                    outData = outbase + '_%04d.und' % len(steps)
+                sys.stdout.write('writing data file: %s ...' % outData)
+                sys.stdout.flush()
+                with GF.profile_stage('write data'):
+                    info = convStep(outData, nNode, nElem, Mesh, step,
+                                    order, fields, perm)
+                if info == None:
+                    print('%s: Data file output failed: %s\n' % \
+                              (sys.argv[0], outData))
+                    sys.exit(6)
+                print('done')
+                steps.append((info[0], info[1], outData))
+                if first == None:
+                    first = step
+                continue
+            del Data
+            continue # end of for(datafile)
+    #---- loop of time steps ----
+
+    with GF.profile_stage('write index'):
+        ret = outIdx(outIndex, outMesh, None, first,
+                     dataOrders(first, order, fields), steps)
+    if ret == 0:
         print('%s: Index file output failed: %s\n' % (sys.argv[0], outIndex))
         sys.exit(7)
 
     #-------------- DONE --------------
+    if GF.PROFILE is not None:
+        sys.stdout.write(GF.PROFILE.report())
     sys.exit(0)
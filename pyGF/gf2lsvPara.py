@@ -11,13 +11,18 @@ import numpy
 import struct
 import getopt
 import GF
+from gf2lsv import stepInfo
+try:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+except ImportError:
+    ProcessPoolExecutor = None
 
 
 def usage0():
     print('usage: %s [-h|--help]' % os.path.basename(sys.argv[0]))
     print('       %s --ddd dddfile --mesh meshbase --data database' \
         % os.path.basename(sys.argv[0]))
-    print('       \t\t[--out outbase] [--order dataNo]')
+    print('       \t\t[--out outbase] [--order dataNo] [--jobs n] [--profile]')
 
 
 def checkDDD(ddd):
@@ -65,7 +70,7 @@ def outUnm(path, mesh, ddd, dom):
     # write node-info block
     ofp.write(struct.pack('2i', nNode, nnNode))
     for i in range(nnNode):
-        ofp.write(struct.pack('i', globalNodeLst[i]-1))
+        ofp.write(struct.pack('i', globalNodeLst[i][0]-1))
         continue
 
     # scan elem info
@@ -105,7 +110,7 @@ def outUnm(path, mesh, ddd, dom):
         for i in range(nElem):
             arr = mesh.dataset[0].data[1].array[i]
             if arr[-4] > 0: continue
-            ofp.write(struct.pack('i', globalElemLst[i]-1))
+            ofp.write(struct.pack('i', globalElemLst[i][0]-1))
             continue
 
         for i in range(nElem):
@@ -137,7 +142,7 @@ def outUnm(path, mesh, ddd, dom):
         for i in range(nElem):
             arr = mesh.dataset[0].data[1].array[i]
             if arr[-4] == 0: continue
-            ofp.write(struct.pack('i', globalElemLst[i]-1))
+            ofp.write(struct.pack('i', globalElemLst[i][0]-1))
             continue
 
         for i in range(nElem):
@@ -198,7 +203,20 @@ def outUnm(path, mesh, ddd, dom):
     return (nnNode, nTetra + nPyra + nHexa)
 
 
-def outUnd(path, nNode, nElem, mesh, data, dorder=0):
+def elemPerm(mesh):
+    """
+    returns the order of elems in the Uns files: indices of tetra elems,
+    then of hexa and pyramid elems, of the node table of mesh
+    """
+    tbl = mesh.dataset[0].data[1].array
+    hexa = tbl[:, -1] > 0
+    pyra = ~hexa & (tbl[:, -4] > 0)
+    tetra = ~hexa & ~pyra
+    return numpy.concatenate((numpy.nonzero(tetra)[0],
+                              numpy.nonzero(hexa | pyra)[0]))
+
+
+def outUnd(path, nNode, nElem, mesh, data, dorder=0, perm=None):
     if nNode < 1 or nElem < 1: return 0
     if mesh == None or len(mesh.dataset) < 1 or len(mesh.dataset[0].data) < 2:
         return 0
@@ -207,7 +225,6 @@ def outUnd(path, nNode, nElem, mesh, data, dorder=0):
     if dorder < 0 or dorder >= len(data.dataset[0].data) - 2:
         return 0
 
-    Etbl = mesh.dataset[0].data[1]
     Data = data.dataset[0].data[dorder + 2]
     (nND, nED) = (0, 0)
     NodeData = True
@@ -240,46 +257,23 @@ def outUnd(path, nNode, nElem, mesh, data, dorder=0):
 
     # write node data block
     ofp.write(struct.pack('2i', nNode, nND))
-    if nND == 1:
-        for i in range(nNode):
-            ofp.write(struct.pack('d', Data.array[i][0]))
-            continue
-    elif nND == 3:
-        for i in range(nNode):
-            ofp.write(struct.pack('ddd', Data.array[i][0],
-                                  Data.array[i][1], Data.array[i][2]))
-            continue
+    if nND > 0:
+        buff = numpy.ascontiguousarray(Data.array[:nNode, 0:nND],
+                                       dtype=numpy.float64)
+        ofp.write(buff.tobytes())
+        del buff
 
-    # write elem data block
+    # write elem data block (TETRA elems, then HEXA/Pyramid elems)
     ofp.write(struct.pack('2i', nElem, nED))
     if nED > 0:
-        (nTetra, nPyra, nHexa) = (0, 0, 0)
-        for i in range(nnElem):
-            if Etbl.array[i][-1] > 0:
-                nHexa = nHexa + 1
-            elif Etbl.array[i][-4] > 0:
-                nPyra = nPyra + 1
-            else:
-                nTetra = nTetra + 1
-            continue
-
-        # write TETRA elem block
-        if nTetra > 0:
-            for i in range(nnElem):
-                arr = Etbl.array[i]
-                if arr[-4] > 0: continue
-                for j in range(nED):
-                    ofp.write(struct.pack('d', Data.array[i][j]))
-                continue
-
-        # write HEXA elem block
-        if nHexa > 0 or nPyra > 0:
-            for i in range(nnElem):
-                arr = Etbl.array[i]
-                if arr[-4] == 0: continue
-                for j in range(nED):
-                    ofp.write(struct.pack('d', Data.array[i][j]))
-                continue
+        if perm is None:
+            perm = elemPerm(mesh)
+        if nnElem < len(perm):
+            perm = perm[perm < nnElem]
+        buff = numpy.ascontiguousarray(Data.array[perm, 0:nED],
+                                       dtype=numpy.float64)
+        ofp.write(buff.tobytes())
+        del buff
 
     ofp.close()
     return nND - nED
@@ -299,33 +293,20 @@ def outIdx(path, meshPathes, dataPathes, data, dorder=0):
     if Data.keyword[-1] == 'E':
         NodeData = False
 
+    # sizes are checked by outUnd of each domain
     if NodeData:
-        nnNode = Data.aryNum[0]
-        if nNode != nnNode:
-            return 0
         nND = Data.aryNum[1]
         if nND != 1 and nND != 3:
             return 0
     else:
-        nnElem = Data.aryNum[0]
-        if nElem < nnElem:
-            return 0
         nED = Data.aryNum[1]
         if nED != 1 and nED != 3:
             return 0
     if nND == 0 and nED == 0:
         return 0
 
-    stpIndex = 0
-    stpTime = 0.0
-    for i in range(2):
-        if data.dataset[0].data[i].keyword == '*TIME_PS':
-            stpTime = float(data.dataset[0].data[i].array[0][0])
-            continue
-        if data.dataset[0].data[i].keyword == '*STEP_PS':
-            stpTime = int(data.dataset[0].data[i].array[0][0])
-            continue
-        continue
+    # one step (index 0) of the time of the data
+    (stpIndex, stpTime) = (0, stepInfo(data.dataset[0])[1])
 
     # open data file
     try:
@@ -357,17 +338,117 @@ def outIdx(path, meshPathes, dataPathes, data, dorder=0):
     return 1
 
 
+def convDomain(ddd, sd, meshfile, datafile, outMesh, outData, order=0,
+               verbose=False):
+    """
+    convert a subdomain: read its mesh and data files, and write LSV Uns
+    mesh and data files of them
+      ddd: DDD (GF_FILE, arrays of the subdomain are mapped if scanned)
+      sd: index of the subdomain
+      verbose: if True, print progress
+    returns (0, None), or (exit status, error message) if failed
+    """
+    def progress(msg):
+        if verbose:
+            sys.stdout.write(msg)
+            sys.stdout.flush()
+        return
+
+    # arrays mapped here are released when the domain is done
+    mapped = [d for d in ddd.dataset[sd].data if d.array is None]
+    try:
+        return _convDomain(ddd, sd, meshfile, datafile, outMesh, outData,
+                           order, progress)
+    finally:
+        for d in mapped:
+            d.array = None
+            continue
+
+
+def _convDomain(ddd, sd, meshfile, datafile, outMesh, outData, order,
+                progress):
+    """
+    body of convDomain
+    """
+    for i in range(len(ddd.dataset[sd].data)):
+        if ddd.load(i, sd, mmap=True) == None:
+            return (1, 'ddd file load failed: %s\n' % ddd.path)
+        continue
+
+    # read mesh
+    Mesh = GF.GF_FILE()
+    progress('reading mesh file: %s ...' % meshfile)
+    with GF.profile_stage('read mesh'):
+        ret = Mesh.read(meshfile)
+    if not ret:
+        return (2, 'mesh file load failed: %s\n' % meshfile)
+    progress('done\n')
+
+    # read data
+    Data = GF.GF_FILE()
+    progress('reading data file: %s ...' % datafile)
+    with GF.profile_stage('read data'):
+        ret = Data.read(datafile)
+    if not ret:
+        return (3, 'data file load failed: %s\n' % datafile)
+    progress('done\n')
+
+    # write mesh
+    progress('writing mesh file: %s ...' % outMesh)
+    with GF.profile_stage('write mesh'):
+        (nNode, nElem) = outUnm(outMesh, Mesh, ddd, sd)
+    if nNode < 1 or nElem < 1:
+        return (5, 'Mesh file output failed: %s\n' % outMesh)
+    progress('done\n')
+
+    # write data
+    progress('writing data file: %s ...' % outData)
+    with GF.profile_stage('write data'):
+        ret = outUnd(outData, nNode, nElem, Mesh, Data, order)
+    if ret == 0:
+        return (6, 'Data file output failed: %s\n' % outData)
+    progress('done\n')
+    return (0, None)
+
+
+# state of a worker process of --jobs (see initWorker)
+_worker = {}
+
+def initWorker(ddd):
+    """
+    initialize a worker process converting subdomains
+      ddd: DDD (GF_FILE) scanned by the parent; arrays of a subdomain are
+           mapped read-only from the file when it is converted
+    """
+    _worker['ddd'] = ddd
+    return
+
+
+def convTask(task):
+    """
+    convert a subdomain in a worker process (see initWorker)
+      task: (index of the subdomain, mesh file, data file, output mesh
+            file, output data file, order of data)
+    returns (0, None), or (exit status, error message) if failed
+    """
+    try:
+        return convDomain(_worker['ddd'], *task)
+    except Exception as e:
+        return (6, '%s\n' % e)
+
+
 if __name__ == '__main__':
     #-------------- ARGUMENTS CHECK --------------
     try:
         opts, args = getopt.getopt(sys.argv[1:], 'h',
                                    ['ddd=','data=', 'mesh=', 'out=', 'order=', \
-                                        'help'])
+                                        'jobs=', 'profile', 'help'])
     except getopt.GetoptError:
         usage0()
         sys.exit(1)
 
     (dddfile, database, meshbase, outbase, order) = (None, None, None, None, 0)
+    jobs = 1
     for o, a in opts:
         if o in ('-h', '--help'):
             usage0()
@@ -387,6 +468,12 @@ if __name__ == '__main__':
         if o == '--order':
             order = int(a)
             continue
+        if o == '--jobs':
+            jobs = int(a)
+            continue
+        if o == '--profile':
+            GF.PROFILE = GF.GF_PROFILE()
+            continue
         continue
 
     #-------------- DATA INPUT --------------
@@ -398,7 +485,11 @@ if __name__ == '__main__':
     ddd = GF.GF_FILE()
     sys.stdout.write('reading ddd file: %s ...' % dddfile)
     sys.stdout.flush()
-    if not ddd.read(dddfile):
+    with GF.profile_stage('read ddd'):
+        # headers only, arrays of each subdomain are mapped when converted
+        # (read whole if it may not be scanned, e.g. compressed)
+        ret = ddd.scan(dddfile) or ddd.read(dddfile)
+    if not ret:
         print('%s: ddd file load failed: %s\n' % (sys.argv[0], dddfile))
         sys.exit(1)
     numDomain = checkDDD(ddd)
@@ -422,7 +513,6 @@ if __name__ == '__main__':
     if sdo < 4: sdo = 4
     domFmt = '_%%0%dd' % sdo
 
-    #---- main loop ----
     for sd in range(numDomain):
         if outbase == None:
             outMesh = outMesh + ['GFDATA' + domFmt % sd + '.unm']
@@ -430,48 +520,62 @@ if __name__ == '__main__':
         else:
             outMesh = outMesh + [outbase + domFmt % sd + '.unm']
             outData = outData + [outbase + domFmt % sd + '.und']
+        continue
+
+    if jobs > 1 and ProcessPoolExecutor == None:
+        print('%s: --jobs needs concurrent.futures, converting serially'
+              % sys.argv[0])
+        jobs = 1
 
-        # read mesh
-        meshfile = inMesh[sd]
-        Mesh = GF.GF_FILE()
-        sys.stdout.write('reading mesh file: %s ...' % meshfile)
-        sys.stdout.flush()
-        if not Mesh.read(meshfile):
-            print('%s: mesh file load failed: %s\n' % (sys.argv[0], meshfile))
-            sys.exit(2)
-        print('done')
-
-        # read data
-        datafile = inData[sd]
-        Data = GF.GF_FILE()
-        sys.stdout.write('reading data file: %s ...' % datafile)
-        sys.stdout.flush()
-        if not Data.read(datafile):
-            print('%s: data file load failed: %s\n' % (sys.argv[0], datafile))
-            sys.exit(3)
-        print('done')
-
-        # write mesh
-        sys.stdout.write('writing mesh file: %s ...' % outMesh[sd])
-        sys.stdout.flush()
-        (nNode, nElem) = outUnm(outMesh[sd], Mesh, ddd, sd)
-        if nNode < 1 or nElem < 1:
-            print('%s: Mesh file output failed: %s\n' % \
-                      (sys.argv[0], outMesh[sd]))
-            sys.exit(5)
-        print('done')
-
-        # write data
-        sys.stdout.write('writing data file: %s ...' % outData[sd])
-        sys.stdout.flush()
-        if outUnd(outData[sd], nNode, nElem, Mesh, Data, order) == 0:
-            print('%s: Data file output failed: %s\n' % \
-                      (sys.argv[0], outData[sd]))
-            sys.exit(6)
-        print('done')
-
-        continue # end of for(sd)
     #---- main loop ----
+    if jobs > 1:
+        # convert subdomains in a process pool
+        tasks = [(sd, inMesh[sd], inData[sd], outMesh[sd], outData[sd], order)
+                 for sd in range(numDomain)]
+        failed = []
+        with ProcessPoolExecutor(jobs, initializer=initWorker,
+                                 initargs=(ddd,)) as pool:
+            # stages and I/O of workers are profiled and merged into PROFILE
+            futures = dict([(pool.submit(GF.profile_task,
+                                         GF.PROFILE is not None,
+                                         convTask, t), t[0]) for t in tasks])
+            # reported as each domain is done
+            for f in as_completed(futures):
+                sd = futures[f]
+                try:
+                    ((code, msg), prof) = f.result()
+                except Exception as e:
+                    ((code, msg), prof) = ((6, '%s\n' % e), None)
+                if prof is not None:
+                    GF.PROFILE.merge(prof)
+                if code != 0:
+                    print('%s: domain %d failed: %s' % (sys.argv[0], sd, msg))
+                    failed.append((sd, code))
+                    continue
+                print('domain %d: %s, %s ...done' % \
+                          (sd, outMesh[sd], outData[sd]))
+                continue
+        if len(failed) > 0:
+            print('%s: %d of %d domains failed\n' % \
+                      (sys.argv[0], len(failed), numDomain))
+            sys.exit(min(failed)[1])
+    else:
+        for sd in range(numDomain):
+            (code, msg) = convDomain(ddd, sd, inMesh[sd], inData[sd],
+                                     outMesh[sd], outData[sd], order, True)
+            if code != 0:
+                print('%s: %s' % (sys.argv[0], msg))
+                sys.exit(code)
+            continue # end of for(sd)
+    #---- main loop ----
+
+    # TIME and STEP of the last domain for the index
+    Data = GF.GF_FILE()
+    if not Data.read(inData[numDomain - 1],
+                     keywords=['*TIME_PS', '*STEP_PS']):
+        print('%s: data file load failed: %s\n' % \
+                  (sys.argv[0], inData[numDomain - 1]))
+        sys.exit(3)
 
 
     #-------------- INDEX OUTPUT --------------
@@ -482,10 +586,14 @@ if __name__ == '__main__':
 
     sys.stdout.write('writing index file: %s ...' % outIndex)
     sys.stdout.flush()
-    if outIdx(outIndex, outMesh, outData, Data, order) == 0:
+    with GF.profile_stage('write index'):
+        ret = outIdx(outIndex, outMesh, outData, Data, order)
+    if ret == 0:
         print('%s: Index file output failed: %s\n' % (sys.argv[0], outIndex))
         sys.exit(7)
     print('done')
 
     #-------------- DONE --------------
+    if GF.PROFILE is not None:
+        sys.stdout.write(GF.PROFILE.report())
     sys.exit(0)
@@ -2,15 +2,24 @@
 # -*- coding: utf-8 -*-
 """
 gf2vtk : convert FFB/GF files(with non dividing mesh) to VTK files
-  read : MESH, FLOW
-  write: VTK (Unstructured Grid)
+  read : MESH, FLOW (one or more files of time steps)
+  write: VTK (Unstructured Grid, one per time step)
 """
 import sys, os
-import struct
+import glob
+import shutil
 import getopt
+import tempfile
+import numpy
 import GF
+from gf2lsv import dataOrders
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
 try:
     import vtk
+    from vtk.util import numpy_support
 except:
     print('%s: import vtk failed, VTK may not installed.' % sys.argv[0])
     sys.exit(1)
@@ -20,7 +29,8 @@ def usage0():
     print('usage: %s [-h|--help]' % os.path.basename(sys.argv[0]))
     print('       %s <--mesh|--amesh> meshfile <--data|--adata> datafile \\'\
          % os.path.basename(sys.argv[0]))
-    print('          [--out outfile.vtk] [--order int]')
+    print('          [datafile ...] [--out outfile.vtk] [--order int|all] \\')
+    print('          [--fields k1,k2,...] [--jobs n] [--profile]')
 
 
 def outVTK(path, grid):
@@ -33,82 +43,87 @@ def outVTK(path, grid):
     uWriter.SetInputData(grid)
     uWriter.SetFileName(path)
     try:
-        uWriter.Write()
+        ret = uWriter.Write()
     except:
         return False
-    return True
+    # Write() returns 0 if failed (e.g. the file can not be opened)
+    return ret != 0
 
 
-def setupMesh(grid, mesh):
+def meshArrays(mesh):
     """
-    setupMesh: setup mesh data to the grid data
-    @param grid: grid data (vtkUnstructuredGrid)
+    meshArrays: build arrays of points and cells of the mesh data
     @param mesh: mesh data (GL_FILE)
-    @returns (#of nodes, #of elems)
+    @returns (points, types, offsets, connectivity), where offsets and
+             connectivity are of vtkCellArray.SetData (point ids of cell i
+             are connectivity[offsets[i]:offsets[i+1]]), or None if invalid
     """
-    failRet = (-1, -1)
     if mesh == None or len(mesh.dataset) < 1 or len(mesh.dataset[0].data) < 2:
-        return failRet
+        return None
     NodeLst = mesh.dataset[0].data[0]
     NodeTbl = mesh.dataset[0].data[1]
     nNode = NodeLst.aryNum[0]
     nElem = NodeTbl.aryNum[0]
     if nNode < 1 or nElem < 1:
-        return failRet
-    nnNode = nNode
-    
-    # scan elem info
-    (nTetra, nPyra, nHexa) = (0, 0, 0)
-    for i in range(nElem):
-        if mesh.dataset[0].data[1].array[i][-1] > 0:
-            nHexa = nHexa + 1
-        elif mesh.dataset[0].data[1].array[i][-4] > 0:
-            nPyra = nPyra + 1
-        else:
-            nTetra = nTetra + 1
+        return None
+
+    # classify elems
+    conn = NodeTbl.array
+    hexa = conn[:, -1] > 0
+    pyra = ~hexa & (conn[:, -4] > 0)
+    tetra = ~(hexa | pyra)
+    npts = numpy.where(hexa, 8, numpy.where(pyra, 5, 4))
+    types = numpy.where(hexa, vtk.VTK_HEXAHEDRON,
+                        numpy.where(pyra, vtk.VTK_PYRAMID, vtk.VTK_TETRA))
+
+    # cells: point ids of each elem from offsets in connectivity
+    idt = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+    offsets = numpy.zeros(nElem + 1, dtype=idt)
+    offsets[1:] = numpy.cumsum(npts)
+    connectivity = numpy.empty(int(offsets[-1]), dtype=idt)
+    for (mask, n) in ((hexa, 8), (pyra, 5), (tetra, 4)):
+        off = offsets[:-1][mask]
+        for j in range(n):
+            connectivity[off + j] = conn[mask, j] - 1
+            continue
         continue
-    nETypes = 0
-    if nHexa > 0 or nPyra > 0: nETypes = nETypes + 1
-    if nTetra > 0: nETypes = nETypes + 1
-    if nETypes < 1:
-        return failRet
-
-    # set node array
-    points = vtk.vtkPoints()
-    for i in range(nnNode):
-        arr = mesh.dataset[0].data[0].array[i]
-        points.InsertNextPoint(arr)
-        continue # end of for(i)
-    grid.SetPoints(points)
-    del points
-
-    # set cell array
-    for i in range(nElem):
-        arr = mesh.dataset[0].data[1].array[i]
-        if arr[-1] > 0: # Hexa
-            hex = vtk.vtkHexahedron() 
-            hpids = hex.GetPointIds()
-            for j in range(8):
-                hpids.SetId(j, arr[j]-1)
-                continue # end of for(j)
-            grid.InsertNextCell(hex.GetCellType(), hex.GetPointIds())
-        elif arr[-4] > 0: # Pyramid
-            pyr = vtk.vtkPyramid() 
-            hpids = pyr.GetPointIds()
-            for j in range(5):
-                hpids.SetId(j, arr[j]-1)
-                continue # end of for(j)
-            grid.InsertNextCell(pyr.GetCellType(), pyr.GetPointIds())
-        else: # Tetra
-            tet = vtk.vtkTetra()
-            hpids = tet.GetPointIds()
-            for j in range(4):
-                ids.SetId(j, arr[j]-1)
-                continue # end of for(j)
-            grid.InsertNextCell(tet.GetCellType(), tet.GetPointIds())
-        continue # end of for(i)
-    
-    return (nnNode, nTetra + nPyra + nHexa)
+
+    points = numpy.ascontiguousarray(NodeLst.array, dtype=numpy.float32)
+    return (points, types.astype(numpy.uint8), offsets, connectivity)
+
+
+def setupGrid(grid, arrays):
+    """
+    setupGrid: setup points and cells to the grid data, referring arrays
+    (not copied, they must be kept while the grid is used)
+    @param grid: grid data (vtkUnstructuredGrid)
+    @param arrays: arrays of points and cells (see meshArrays)
+    @returns (#of nodes, #of elems)
+    """
+    (points, types, offsets, connectivity) = arrays
+    pts = vtk.vtkPoints()
+    pts.SetData(numpy_support.numpy_to_vtk(points))
+    grid.SetPoints(pts)
+    del pts
+    cellArray = vtk.vtkCellArray()
+    cellArray.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity))
+    grid.SetCells(numpy_support.numpy_to_vtk(
+                      types, array_type=vtk.VTK_UNSIGNED_CHAR), cellArray)
+    return (len(points), len(types))
+
+
+def setupMesh(grid, mesh):
+    """
+    setupMesh: setup mesh data to the grid data
+    @param grid: grid data (vtkUnstructuredGrid)
+    @param mesh: mesh data (GL_FILE)
+    @returns (#of nodes, #of elems)
+    """
+    arrays = meshArrays(mesh)
+    if arrays == None:
+        return (-1, -1)
+    return setupGrid(grid, arrays)
 
 
 def setupData(nNode, nElem, grid, data, dorder=0):
@@ -118,12 +133,22 @@ def setupData(nNode, nElem, grid, data, dorder=0):
     @param nElem: #of elems
     @param grid: grid data (vtkUnstructuredGrid)
     @param data: numerical data (GL_FILE)
-    @param dorder: the order of data to setup (default=0)
+    @param dorder: the order of data to setup (default=0), or list of them;
+                   each one is set as an array of the point or cell data
     @returns length of data setup'ed
     """
     if nNode < 1 or nElem < 1: return 0
     if data == None or len(data.dataset) < 1 or len(data.dataset[0].data) < 3:
         return 0
+    if isinstance(dorder, list):
+        ret = 0
+        for o in dorder:
+            n = setupData(nNode, nElem, grid, data, o)
+            if n == 0:
+                return 0
+            ret = ret + n
+            continue
+        return ret
     if dorder < 0 or dorder >= len(data.dataset[0].data) - 2:
         return 0
 
@@ -192,17 +217,128 @@ def setupData(nNode, nElem, grid, data, dorder=0):
     return nND + nED
 
 
+def readData(path, binary=True):
+    """
+    readData: read a data file
+    @param path: path to the data file
+    @param binary: True if binary, False if ascii
+    @returns GF_FILE, or None if failed; a binary file is scanned only
+             (arrays are loaded step by step, see convStep), or read if
+             it may not be scanned (compressed)
+    """
+    Data = GF.GF_FILE()
+    if not binary:
+        ret = Data.read_ascii(path)
+    else:
+        ret = Data.scan(path) or Data.read(path)
+    if not ret:
+        return None
+    return Data
+
+
+def stepFiles(data):
+    """
+    stepFiles: split data into time steps
+    @param data: numerical data (GL_FILE)
+    @returns list of GF_FILE of each DATASET (time step) of data, sharing
+             its DATA records
+    """
+    steps = []
+    for ds in data.dataset:
+        step = GF.GF_FILE()
+        (step.fileType, step.comment, step.path) = \
+            (data.fileType, data.comment, data.path)
+        step.dataset = [ds,]
+        steps.append(step)
+        continue
+    return steps
+
+
+def convStep(path, nNode, nElem, base, step, order='0', fields=None):
+    """
+    convStep: write a time step into a VTK file, loading the arrays needed
+    if not loaded, and releasing arrays of the step after written
+    @param path: path to the VTK file
+    @param nNode: #of nodes
+    @param nElem: #of elems
+    @param base: grid data of the mesh (vtkUnstructuredGrid), not modified
+    @param step: GF_FILE of the time step (see stepFiles)
+    @param order, fields: DATA records to set (see dataOrders)
+    @returns (0, None), or (exit status, error message) if failed
+    """
+    orders = dataOrders(step, order, fields)
+    if orders == None or len(orders) < 1:
+        return (6, 'invalid data order or fields.')
+    ret = 0
+    if all([step.load(o + 2) != None for o in orders]):
+        grid = vtk.vtkUnstructuredGrid()
+        grid.ShallowCopy(base)
+        ret = setupData(nNode, nElem, grid, step, orders)
+    for d in step.dataset[0].data:
+        d.array = None
+        continue
+    if ret == 0:
+        return (6, 'Data traverse failed.')
+    if not outVTK(path, grid):
+        return (7, 'vtk file output failed: %s' % path)
+    return (0, None)
+
+
+# state of a worker process of --jobs (see initWorker)
+_worker = {}
+
+def initWorker(arrayPaths, order, fields):
+    """
+    initWorker: initialize a worker process converting time steps;
+    the grid refers arrays of points and cells built by the parent,
+    mapped copy-on-write from .npy files (pages are shared by workers)
+    @param arrayPaths: paths to .npy files of arrays (see meshArrays)
+    @param order, fields: DATA records to set (see dataOrders)
+    """
+    arrays = tuple([numpy.load(p, mmap_mode='c') for p in arrayPaths])
+    grid = vtk.vtkUnstructuredGrid()
+    (nNode, nElem) = setupGrid(grid, arrays)
+    (_worker['arrays'], _worker['grid']) = (arrays, grid)
+    (_worker['nNode'], _worker['nElem']) = (nNode, nElem)
+    (_worker['order'], _worker['fields']) = (order, fields)
+    _worker['data'] = (None, None)
+    return
+
+
+def convTask(task):
+    """
+    convTask: convert a time step in a worker process (see initWorker)
+    @param task: (VTK file path, data file path, binary, index of DATASET)
+    @returns (0, None), or (exit status, error message) if failed
+    """
+    (outvtk, datafile, binary, ids) = task
+    try:
+        # keep the last data file read, for the next steps in it
+        if _worker['data'][0] != datafile:
+            _worker['data'] = (datafile, readData(datafile, binary))
+        Data = _worker['data'][1]
+        if Data == None:
+            return (3, 'data file load failed: %s' % datafile)
+        return convStep(outvtk, _worker['nNode'], _worker['nElem'],
+                        _worker['grid'], stepFiles(Data)[ids],
+                        _worker['order'], _worker['fields'])
+    except Exception as e:
+        return (6, '%s: %s' % (outvtk, e))
+
+
 if __name__ == '__main__':
     #-------------- ARGUMENTS CHECK --------------
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'h',
-                                   ['data=', 'adata=', 'mesh=', 'amesh=',
-                                    'out=', 'order=', 'help'])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], 'h',
+                                       ['data=', 'adata=', 'mesh=', 'amesh=',
+                                        'out=', 'order=', 'fields=',
+                                        'jobs=', 'profile', 'help'])
     except getopt.GetoptError:
         usage0()
         sys.exit(1)
 
-    (datafile, meshfile, outbase, order) = (None, None, None, 0)
+    (datafiles, meshfile, outbase, order) = ([], None, None, '0')
+    (fields, jobs) = (None, 1)
     (data_bin, mesh_bin) = (True, True)
     for o, a in opts:
         if o in ('-h', '--help'):
@@ -217,23 +353,33 @@ if __name__ == '__main__':
             mesh_bin = False
             continue
         if o == '--data':
-            datafile = a
+            datafiles = datafiles + (sorted(glob.glob(a)) or [a,])
             data_bin = True
             continue
         if o == '--adata':
-            datafile = a
+            datafiles = datafiles + (sorted(glob.glob(a)) or [a,])
             data_bin = False
             continue
         if o == '--out':
             outbase = a
             continue
         if o == '--order':
-            order = int(a)
+            order = a
+            continue
+        if o == '--fields':
+            fields = [k for k in a.split(',') if k != '']
+            continue
+        if o == '--jobs':
+            jobs = int(a)
+            continue
+        if o == '--profile':
+            GF.PROFILE = GF.GF_PROFILE()
             continue
         continue
 
     #-------------- DATA INPUT --------------
-    if datafile == None or meshfile == None:
+    datafiles = datafiles + args # rest of files expanded by shell
+    if len(datafiles) < 1 or meshfile == None:
         print('%s: invalid argument.' % sys.argv[0])
         usage0()
         sys.exit(1)
@@ -241,49 +387,141 @@ if __name__ == '__main__':
     Mesh = GF.GF_FILE()
     sys.stdout.write('reading mesh file: %s ...' % meshfile)
     sys.stdout.flush()
-    if mesh_bin:
-        ret = Mesh.read(meshfile)
-    else:
-        ret = Mesh.read_ascii(meshfile)
+    with GF.profile_stage('read mesh'):
+        if mesh_bin:
+            ret = Mesh.read(meshfile)
+        else:
+            ret = Mesh.read_ascii(meshfile)
     if not ret:
         print('%s: mesh file load failed: %s\n' % (sys.argv[0], meshfile))
         sys.exit(2)
     print('done')
 
-    Data = GF.GF_FILE()
-    sys.stdout.write('reading data file: %s ...' % datafile)
-    sys.stdout.flush()
-    if data_bin:
-        ret = Data.read(datafile)
-    else:
-        ret = Data.read_ascii(datafile)
-    if not ret:
-        print('%s: data file load failed: %s\n' % (sys.argv[0], datafile))
-        sys.exit(3)
-    print('done')
-
     #-------------- DATA OUTPUT --------------
     if outbase == None:
-        outvtk = 'GFDATA.vtk'
+        outbase = 'GFDATA'
     elif outbase.endswith('.vtk'):
-        outvtk = outbase
-    else:
-        outvtk = outbase + '.vtk'
+        outbase = outbase[:-4]
 
     grid = vtk.vtkUnstructuredGrid()
         
-    (nNode, nElem) = setupMesh(grid, Mesh)
-    if nNode < 1 or nElem < 1:
+    with GF.profile_stage('setup mesh'):
+        arrays = meshArrays(Mesh)
+        if arrays != None:
+            (nNode, nElem) = setupGrid(grid, arrays)
+    if arrays == None:
         print('%s: Mesh traverse failed.\n' % sys.argv[0])
         sys.exit(5)
+    del Mesh
+
+    if jobs > 1 and ProcessPoolExecutor == None:
+        print('%s: --jobs needs concurrent.futures, converting serially'
+              % sys.argv[0])
+        jobs = 1
 
-    if setupData(nNode, nElem, grid, Data, order) == 0:
-        print('%s: Data traverse failed.\n' % sys.argv[0])
-        sys.exit(6)
+    #---- loop of time steps ----
+    if jobs > 1:
+        # list time steps, then convert them in a process pool
+        tasks = []
+        for datafile in datafiles:
+            sys.stdout.write('reading data file: %s ...' % datafile)
+            sys.stdout.flush()
+            with GF.profile_stage('read data'):
+                Data = readData(datafile, data_bin)
+            if Data == None:
+                print('%s: data file load failed: %s\n' % \
+                          (sys.argv[0], datafile))
+                sys.exit(3)
+            print('done')
+            if datafile == datafiles[0]: # warn of records skipped by all
+                dataOrders(Data, order, fields, True)
+            for ids in range(len(Data.dataset)):
+                tasks.append(['', datafile, data_bin, ids])
+                continue
+            del Data
+            continue
+        for i in range(len(tasks)):
+            if len(tasks) == 1 and len(datafiles) == 1:
+                tasks[i][0] = outbase + '.vtk'
+            else:
+                tasks[i][0] = outbase + '_%04d.vtk' % i
+            continue
+
+        failed = []
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # workers map arrays of points and cells built above
+            arrayPaths = []
+            for (name, a) in zip(('points', 'types', 'offsets',
+                                  'connectivity'), arrays):
+                arrayPaths.append(os.path.join(tmpdir, name + '.npy'))
+                numpy.save(arrayPaths[-1], a)
+                continue
+            del grid, arrays
+            with GF.profile_stage('write vtk'):
+                with ProcessPoolExecutor(jobs, initializer=initWorker,
+                                         initargs=(arrayPaths, order,
+                                                   fields)) as pool:
+                    # I/O of workers is profiled and merged into PROFILE
+                    futures = [pool.submit(GF.profile_task,
+                                           GF.PROFILE is not None,
+                                           convTask, tuple(t)) for t in tasks]
+                    for (t, f) in zip(tasks, futures):
+                        try:
+                            ((code, msg), prof) = f.result()
+                        except Exception as e:
+                            ((code, msg), prof) = ((6, str(e)), None)
+                        if prof is not None:
+                            GF.PROFILE.merge(prof)
+                        if code != 0:
+                            print('%s: step %d of %s failed: %s' % \
+                                      (sys.argv[0], t[3], t[1], msg))
+                            failed.append(code)
+                            continue
+                        print('writing vtk file: %s ...done' % t[0])
+                        continue
+        finally:
+            shutil.rmtree(tmpdir, True)
+        if len(failed) > 0:
+            print('%s: vtk file output failed: %d of %d steps\n' % \
+                      (sys.argv[0], len(failed), len(tasks)))
+            sys.exit(failed[0])
+    else:
+        nstep = 0
+        for datafile in datafiles:
+            sys.stdout.write('reading data file: %s ...' % datafile)
+            sys.stdout.flush()
+            with GF.profile_stage('read data'):
+                Data = readData(datafile, data_bin)
+            if Data == None:
+                print('%s: data file load failed: %s\n' % \
+                          (sys.argv[0], datafile))
+                sys.exit(3)
+            print('done')
+            if datafile == datafiles[0]: # warn of records skipped by all
+                dataOrders(Data, order, fields, True)
 
-    if outVTK(outvtk, grid) == 0:
-        print('%s: vtk file output failed: %s\n' % (sys.argv[0], outvtk))
-        sys.exit(7)
+            for step in stepFiles(Data):
+                if len(datafiles) == 1 and len(Data.dataset) == 1:
+                    outvtk = outbase + '.vtk'
+                else:
+                    outvtk = outbase + '_%04d.vtk' % nstep
+                sys.stdout.write('writing vtk file: %s ...' % outvtk)
+                sys.stdout.flush()
+                with GF.profile_stage('write vtk'):
+                    (code, msg) = convStep(outvtk, nNode, nElem, grid, step,
+                                           order, fields)
+                if code != 0:
+                    print('%s: %s\n' % (sys.argv[0], msg))
+                    sys.exit(code)
+                print('done')
+                nstep = nstep + 1
+                continue
+            del Data
+            continue # end of for(datafile)
+    #---- loop of time steps ----
 
     #-------------- DONE --------------
+    if GF.PROFILE is not None:
+        sys.stdout.write(GF.PROFILE.report())
     sys.exit(0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+common helpers of tests: small GF files generated by benchmarks/gendata.py,
+a reference reader of binary GF files, and comparison of GF_FILEs
+"""
+import sys, os
+import struct
+import numpy
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(TOP, 'benchmarks'))
+sys.path.insert(0, os.path.join(TOP, 'pyGF'))
+import GF
+import gendata
+
+# nodes of generated meshes (7 x 7 x 7)
+NODES = 343
+
+
+def generate(outdir, kind = 'mixed', steps = 2, domains = 0):
+    """
+    generate MESH, FLOW (.be), AMESH, AFLOW (and DDD, MESH.Pnnnn,
+    FLOW.Pnnnn if domains) into outdir (see gendata.generate)
+    returns dict of name: path
+    """
+    return gendata.generate(outdir, NODES, kind, steps, domains, True)
+
+
+def _str(b):
+    if isinstance(b, bytes) and not isinstance(b, str):
+        return b.decode('latin-1')
+    return b
+
+
+def refRead(path):
+    """
+    read a binary GF file (4-byte markers, no subrecords) record by record
+    with struct alone, as the reader did before numpy decoding
+    returns (fileType, comment, [[(keyword, comment, array), ...], ...])
+    """
+    ifp = open(path, 'rb')
+    buff = ifp.read()
+    ifp.close()
+    bo = '<'
+    if struct.unpack('<i', buff[:4])[0] != 8:
+        bo = '>'
+    pos = [0]
+    def rec():
+        sz = struct.unpack(bo + 'i', buff[pos[0]:pos[0] + 4])[0]
+        body = buff[pos[0] + 4:pos[0] + 4 + sz]
+        assert struct.unpack(bo + 'i', buff[pos[0] + 4 + sz:
+                                            pos[0] + 8 + sz])[0] == sz
+        pos[0] = pos[0] + 8 + sz
+        return body
+    def comments():
+        n = struct.unpack(bo + 'i', rec())[0]
+        return [_str(rec()).rstrip() for i in range(n)]
+
+    fileType = _str(rec())
+    comment = comments()
+    datasets = []
+    tag = _str(rec())
+    while ( tag == '#NEW_SET' ):
+        comments()
+        datas = []
+        tag = _str(rec())
+        while ( tag in ('#FLT_ARY', '#INT_ARY') ):
+            keyword = _str(rec())
+            dcomment = _str(rec())
+            (num2, num) = struct.unpack(bo + 'ii', rec())
+            fmt = 'f'
+            if tag == '#INT_ARY':
+                fmt = 'i'
+            body = rec()
+            vals = struct.unpack(bo + '%d%s' % (num * num2, fmt), body)
+            datas.append((keyword, dcomment,
+                          numpy.array(vals).reshape((num, num2))))
+            tag = _str(rec())
+            continue
+        datasets.append(datas)
+        continue
+    assert tag == '#ENDFILE', tag
+    return (fileType, comment, datasets)
+
+
+def sameAsRef(test, gf, ref):
+    """
+    assert a GF_FILE has the records of refRead
+    """
+    (fileType, comment, datasets) = ref
+    test.assertEqual(gf.fileType, fileType)
+    test.assertEqual([c.rstrip() for c in gf.comment], comment)
+    test.assertEqual(len(gf.dataset), len(datasets))
+    for (ds, datas) in zip(gf.dataset, datasets):
+        test.assertEqual(len(ds.data), len(datas))
+        for (d, (keyword, dcomment, ary)) in zip(ds.data, datas):
+            test.assertEqual(d.keyword, keyword)
+            test.assertEqual(d.comment, dcomment)
+            test.assertEqual(list(d.aryNum), list(ary.shape))
+            test.assertTrue(numpy.array_equal(numpy.asarray(d.array), ary),
+                            d.keyword)
+            continue
+        continue
+    return
+
+
+def sameFile(test, a, b, native = False):
+    """
+    assert two GF_FILEs have the same records (arrays of the same dtype
+    if native)
+    """
+    test.assertEqual(a.fileType[3:], b.fileType[3:])
+    test.assertEqual([c.rstrip() for c in a.comment],
+                     [c.rstrip() for c in b.comment])
+    test.assertEqual(len(a.dataset), len(b.dataset))
+    for (da, db) in zip(a.dataset, b.dataset):
+        test.assertEqual(len(da.data), len(db.data))
+        for (x, y) in zip(da.data, db.data):
+            test.assertEqual(x.keyword, y.keyword)
+            test.assertEqual(x.aryType, y.aryType)
+            test.assertEqual(list(x.aryNum), list(y.aryNum))
+            if native:
+                test.assertEqual(x.array.dtype, y.array.dtype)
+            test.assertTrue(numpy.array_equal(x.array, y.array), x.keyword)
+            continue
+        continue
+    return
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+reading ascii GF files, compared with the binary files of the same
+records, and GF_SIDECAR images of them
+"""
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, sameFile
+
+
+class TestAscii(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'tet', 2)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def tearDown(self):
+        GF.SIDECAR = None
+        return
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def read_ascii(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read_ascii(path, **kw), path)
+        return gf
+
+    def same(self, asc, ref):
+        """
+        values are written by 8 digits, not exact as float32
+        """
+        self.assertEqual(asc.fileType, '#A' + ref.fileType[2:])
+        self.assertEqual(len(asc.dataset), len(ref.dataset))
+        for (x, y) in zip(asc.dataset, ref.dataset):
+            self.assertEqual(len(x.data), len(y.data))
+            for (d, e) in zip(x.data, y.data):
+                self.assertEqual(d.keyword, e.keyword)
+                self.assertEqual(d.array.dtype, e.array.dtype)
+                self.assertEqual(d.array.shape, e.array.shape)
+                self.assertTrue(numpy.allclose(d.array, e.array,
+                                               rtol=1.0e-6, atol=0.0))
+                continue
+            continue
+        return
+
+    def test_read_ascii(self):
+        nchunk = GF.ASCII_CHUNK_LINES
+        for lines in (nchunk, 7):
+            GF.ASCII_CHUNK_LINES = lines
+            try:
+                for (a, b) in (('AMESH', 'MESH'), ('AFLOW', 'FLOW')):
+                    for native in (False, True):
+                        self.same(self.read_ascii(self.files[a],
+                                                  native=native),
+                                  self.read(self.files[b], native=native))
+                        continue
+                    continue
+            finally:
+                GF.ASCII_CHUNK_LINES = nchunk
+            continue
+        return
+
+    def test_sidecar(self):
+        path = os.path.join(self.tmpdir, 'AFLOW.s')
+        shutil.copy(self.files['AFLOW'], path)
+        refs = [self.read_ascii(path, native=n) for n in (False, True)]
+        GF.SIDECAR = GF.GF_SIDECAR(os.path.join(self.tmpdir, 'side'))
+        sameFile(self, self.read_ascii(path), refs[0], True)
+        self.assertEqual((GF.SIDECAR.hits, GF.SIDECAR.misses), (0, 1))
+        for native in (False, True):
+            gf = self.read_ascii(path, native=native)
+            sameFile(self, gf, refs[native], True)
+            continue
+        # an image per native flag
+        self.assertEqual((GF.SIDECAR.hits, GF.SIDECAR.misses), (1, 2))
+        gf = self.read_ascii(path, native=True)
+        self.assertEqual((GF.SIDECAR.hits, GF.SIDECAR.misses), (2, 2))
+        self.assertFalse(gf.dataset[0].data[2].array.flags.writeable)
+
+        # the image is not used once the ascii file is modified
+        with open(path, 'a') as f:
+            f.write('\n')
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 10))
+        sameFile(self, self.read_ascii(path), refs[0], True)
+        self.assertEqual((GF.SIDECAR.hits, GF.SIDECAR.misses), (2, 3))
+        return
+
+    def test_sidecar_cap(self):
+        side = os.path.join(self.tmpdir, 'cap')
+        GF.SIDECAR = GF.GF_SIDECAR(side, cap=1)
+        for name in ('AMESH', 'AFLOW'):
+            self.read_ascii(self.files[name])
+            continue
+        self.assertTrue(len(os.listdir(side)) <= 1)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio interface (GF_LOADER, aread, aiter_records), Python 3.6 or later;
+coroutines are run by run_until_complete, so that this file is read by
+Python 2 too (the tests are skipped)
+"""
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, sameFile
+
+ASYNC = sys.version_info >= (3, 6)
+if ASYNC:
+    import asyncio
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def collect(loop, agen, n = -1):
+    """
+    returns list of up to n (all if < 0) items of an async iterator
+    """
+    items = []
+    while ( len(items) != n ):
+        try:
+            items.append(loop.run_until_complete(agen.__anext__()))
+        except StopAsyncIteration:
+            break
+        continue
+    return items
+
+
+@unittest.skipIf(not ASYNC, 'asyncio API needs Python 3.6 or later')
+class TestAsync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'mixed', 3)
+        cls.files['FLOW.gz'] = os.path.join(cls.tmpdir, 'FLOW.gz')
+        gf = GF.GF_FILE()
+        gf.read(cls.files['FLOW'])
+        gf.write(cls.files['FLOW.gz'], compress='gzip')
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        return
+
+    def tearDown(self):
+        self.loop.close()
+        return
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def loader(self, maxBytes):
+        """
+        GF_LOADER recording sizes accounted, and the max in flight
+        (taken as each size is released)
+        """
+        loader = GF.GF_LOADER(2, maxBytes)
+        (loader.accounted, loader.peak) = ([], 0)
+        release = loader._release
+        def _release(nbytes):
+            loader.accounted.append(nbytes)
+            loader.peak = max(loader.peak, loader.inflight)
+            release(nbytes)
+            return
+        loader._release = _release
+        return loader
+
+    def test_read(self):
+        loader = self.loader(4096)
+        names = ('MESH', 'FLOW.be', 'FLOW.gz')
+        tasks = [self.loop.create_task(loader.read(self.files[n]))
+                 for n in names]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        gfs = [t.result() for t in tasks]
+        for (n, gf) in zip(names, gfs):
+            sameFile(self, gf, self.read(self.files[n]))
+            continue
+        self.assertTrue(loader.peak <= 4096)
+        self.assertEqual(loader.inflight, 0)
+        self.assertTrue(self.loop.run_until_complete(
+                loader.read(os.path.join(self.tmpdir, 'NOFILE'))) is None)
+
+        ref = self.read(self.files['FLOW'])
+        gf = self.loop.run_until_complete(
+            loader.read(self.files['FLOW'], keywords=['*PRES_3E'],
+                        mmap=True))
+        for (a, b) in zip(gf.dataset, ref.dataset):
+            for (x, y) in zip(a.data, b.data):
+                if x.keyword == '*PRES_3E':
+                    self.assertTrue(numpy.array_equal(x.array, y.array))
+                else:
+                    self.assertTrue(x.array is None)
+                continue
+            continue
+        sameFile(self, run(GF.aread(self.files['MESH.be'])),
+                 self.read(self.files['MESH']))
+        return
+
+    def test_iter_records(self):
+        ref = list(GF.iter_records(self.files['FLOW']))
+        for name in ('FLOW', 'FLOW.be', 'FLOW.gz'):
+            loader = self.loader(4096)
+            recs = collect(self.loop, loader.iter_records(self.files[name],
+                                                          ahead=3))
+            self.assertEqual(len(recs), len(ref))
+            for ((ds, d), (rds, r)) in zip(recs, ref):
+                self.assertEqual((ds, d.keyword), (rds, r.keyword))
+                self.assertTrue(numpy.array_equal(d.array, r.array))
+                continue
+            self.assertEqual(len(set([id(d) for (ds, d) in recs])),
+                             len(recs))
+            self.assertTrue(loader.peak <= 4096)
+            self.assertEqual(loader.inflight, 0)
+            # after the scan (0 bytes), reads of records are accounted,
+            # of the compressed file too
+            self.assertEqual(loader.accounted[0], 0)
+            self.assertTrue(min(loader.accounted[1:]) > 0)
+            continue
+
+        # the first record of each keyword only
+        recs = collect(self.loop, GF.GF_LOADER().iter_records(
+                self.files['FLOW.gz'], keywords=['*VELO_3D', '*TIME_PS']))
+        self.assertEqual([(ds, d.keyword) for (ds, d) in recs],
+                         [(ds, k) for ds in range(3)
+                          for k in ('*TIME_PS', '*VELO_3D')])
+        return
+
+    def test_close(self):
+        for name in ('FLOW', 'FLOW.gz'):
+            loader = self.loader(4096)
+            agen = loader.iter_records(self.files[name], ahead=4)
+            recs = collect(self.loop, agen, 2)
+            self.assertEqual(len(recs), 2)
+            self.loop.run_until_complete(agen.aclose())
+            loader.executor.shutdown(True)
+            # bytes of records loaded ahead are released when done
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual(loader.inflight, 0)
+            continue
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
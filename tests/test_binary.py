@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+reading and writing binary GF files: both byte orders, native dtypes,
+8-byte record markers and subrecords, GF_WRITER and iter_records
+"""
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, refRead, sameAsRef, sameFile
+
+
+class TestBinary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def test_read(self):
+        for name in ('MESH', 'FLOW', 'MESH.be', 'FLOW.be'):
+            gf = self.read(self.files[name])
+            sameAsRef(self, gf, refRead(self.files[name]))
+            for ds in gf.dataset:
+                for d in ds.data:
+                    self.assertEqual(d.array.dtype.kind,
+                                     numpy.dtype(d.aryType).kind)
+                    self.assertEqual(d.array.dtype.byteorder, '=')
+                    continue
+                continue
+            continue
+        sameFile(self, self.read(self.files['FLOW']),
+                 self.read(self.files['FLOW.be']))
+        return
+
+    def test_native(self):
+        for name in ('MESH', 'MESH.be'):
+            gf = self.read(self.files[name], native=True)
+            self.assertEqual(gf.dataset[0]['*GRID_3D'].array.dtype,
+                             numpy.float32)
+            self.assertEqual(gf.dataset[0]['*NODE_3D'].array.dtype,
+                             numpy.int32)
+            sameAsRef(self, gf, refRead(self.files[name]))
+            gf.setNative(False)
+            sameFile(self, gf, self.read(self.files[name]), True)
+            continue
+        return
+
+    def test_write(self):
+        gf = self.read(self.files['FLOW'])
+        wchunk = GF.WRITE_CHUNK_SIZE
+        GF.WRITE_CHUNK_SIZE = 1000 # written in chunks
+        try:
+            for obo in ('<', '>'):
+                for orm in (4, 8):
+                    out = self.path('out%s%d' % (obo, orm))
+                    self.assertTrue(gf.write(out, obo, orm))
+                    sameFile(self, self.read(out), gf)
+                    if orm == 4:
+                        sameAsRef(self, gf, refRead(out))
+                    continue
+                continue
+        finally:
+            GF.WRITE_CHUNK_SIZE = wchunk
+        # written as generated (by float32 arrays)
+        with open(self.path('out<4'), 'rb') as f:
+            a = f.read()
+        with open(self.files['FLOW'], 'rb') as f:
+            b = f.read()
+        self.assertEqual(a, b)
+        return
+
+    def test_subrecords(self):
+        gf = self.read(self.files['MESH'])
+        out = self.path('MESH.sub')
+        smax = GF.SUBRECORD_MAX
+        GF.SUBRECORD_MAX = 100
+        try:
+            self.assertTrue(gf.write(out, '>'))
+        finally:
+            GF.SUBRECORD_MAX = smax
+        self.assertTrue(os.path.getsize(out) >
+                        os.path.getsize(self.files['MESH']))
+        sameFile(self, self.read(out), gf)
+        sameFile(self, self.read(out, mmap=True), gf)
+        sameFile(self, self.read(out, workers=2), gf)
+        sc = GF.GF_FILE()
+        self.assertTrue(sc.scan(out))
+        d = sc.load('*NODE_3D')
+        self.assertTrue(numpy.array_equal(d.array,
+                                          gf.dataset[0]['*NODE_3D'].array))
+        rows = sc.read_rows('*GRID_3D', [0, 5, 40, 200])
+        self.assertTrue(numpy.array_equal(
+                rows, gf.dataset[0]['*GRID_3D'].array[[0, 5, 40, 200]]))
+        return
+
+    def test_writer(self):
+        gf = self.read(self.files['FLOW.be'])
+        out = self.path('FLOW.w')
+        with GF.GF_WRITER() as w:
+            self.assertTrue(w.open(out, gf.fileType, gf.comment, '<'))
+            for (ds, d) in GF.iter_records(self.files['FLOW.be']):
+                if ds == w.ndataset:
+                    self.assertTrue(w.newDataset(gf.dataset[ds].comment))
+                self.assertTrue(w.writeData(d))
+                continue
+        with open(out, 'rb') as f:
+            a = f.read()
+        with open(self.files['FLOW'], 'rb') as f:
+            b = f.read()
+        self.assertEqual(a, b)
+        return
+
+    def test_iter_records(self):
+        gf = self.read(self.files['FLOW'])
+        for mmap in (False, True):
+            recs = list(GF.iter_records(self.files['FLOW'], mmap))
+            self.assertEqual(len(recs),
+                             sum([len(ds.data) for ds in gf.dataset]))
+            i = 0
+            for (ds, dataset) in enumerate(gf.dataset):
+                for d in dataset.data:
+                    self.assertEqual(recs[i][0], ds)
+                    self.assertEqual(recs[i][1].keyword, d.keyword)
+                    self.assertTrue(numpy.array_equal(recs[i][1].array,
+                                                      d.array))
+                    i = i + 1
+                    continue
+                continue
+            continue
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+process-wide cache of GF files read (GF_CACHE)
+"""
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, sameFile
+
+
+class TestCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'hex', 2)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def tearDown(self):
+        GF.CACHE = None
+        return
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def counts(self):
+        st = GF.CACHE.stats()
+        return (st['hits'], st['misses'], st['evictions'], st['files'])
+
+    def test_hits(self):
+        ref = self.read(self.files['FLOW'])
+        GF.CACHE = GF.GF_CACHE()
+        a = self.read(self.files['FLOW'])
+        b = self.read(self.files['FLOW'])
+        self.assertEqual(self.counts(), (1, 1, 0, 1))
+        sameFile(self, a, ref)
+        sameFile(self, b, ref)
+        # arrays are shared and read-only, GF_DATA are not
+        (x, y) = (a.dataset[1].data[2], b.dataset[1].data[2])
+        self.assertTrue(x is not y)
+        self.assertTrue(x.array is y.array)
+        self.assertFalse(x.array.flags.writeable)
+        # native reads and ascii reads are cached apart
+        n = self.read(self.files['FLOW'], native=True)
+        self.assertEqual(n.dataset[0].data[2].array.dtype, numpy.float32)
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read_ascii(self.files['AFLOW']))
+        self.assertEqual(self.counts(), (1, 3, 0, 3))
+        # mmap and keywords are not cached
+        self.read(self.files['FLOW'], mmap=True)
+        self.read(self.files['FLOW'], keywords=['*VELO_3D'])
+        self.assertEqual(self.counts(), (1, 3, 0, 3))
+        GF.CACHE.clear()
+        self.assertEqual(self.counts(), (1, 3, 0, 0))
+        return
+
+    def test_modified(self):
+        path = os.path.join(self.tmpdir, 'FLOW.m')
+        shutil.copy(self.files['FLOW'], path)
+        GF.CACHE = GF.GF_CACHE()
+        self.read(path)
+        shutil.copy(self.files['FLOW.be'], path + '.tmp')
+        os.rename(path + '.tmp', path)
+        sameFile(self, self.read(path), self.read(self.files['FLOW.be']))
+        self.assertEqual(self.counts()[:2], (0, 3))
+        return
+
+    def test_budget(self):
+        mesh = os.path.getsize(self.files['MESH']) * 2
+        GF.CACHE = GF.GF_CACHE(mesh + 1024)
+        self.read(self.files['MESH'])
+        self.read(self.files['MESH.be'])
+        self.assertEqual(self.counts(), (0, 2, 1, 1))
+        # a file larger than the budget is left writable, and not cached
+        GF.CACHE = GF.GF_CACHE(1024)
+        gf = self.read(self.files['MESH'])
+        self.assertTrue(gf.dataset[0].data[0].array.flags.writeable)
+        self.assertEqual(self.counts(), (0, 1, 0, 0))
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+compressed GF files (gzip, bzip2, xz): written in a background thread,
+and read as streams
+"""
+import sys, os
+import gzip
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, refRead, sameAsRef, sameFile
+
+COMPRESS = ['gzip', 'bz2']
+try:
+    import lzma
+    COMPRESS.append('xz')
+except ImportError:
+    pass
+
+
+class TestCompress(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'hex', 2)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def test_write_read(self):
+        gf = self.read(self.files['FLOW'])
+        for c in COMPRESS:
+            for obo in ('<', '>'):
+                out = self.path('FLOW.%s%s' % (c, obo))
+                self.assertTrue(gf.write(out, obo, compress=c))
+                sameFile(self, self.read(out), gf)
+                # mmap, workers and keywords are ignored
+                sameFile(self, self.read(out, mmap=True, workers=2), gf)
+                sameFile(self, self.read(out, keywords=['*VELO_3D']), gf)
+                self.assertFalse(GF.GF_FILE().scan(out))
+                continue
+            continue
+        # the stream decompressed is the binary file
+        out = self.path('FLOW.gzip<')
+        with open(self.path('FLOW.raw'), 'wb') as f:
+            f.write(gzip.GzipFile(out, 'rb').read())
+        sameAsRef(self, gf, refRead(self.path('FLOW.raw')))
+        return
+
+    def test_iter_records(self):
+        gf = self.read(self.files['MESH'])
+        out = self.path('MESH.bz2')
+        self.assertTrue(gf.write(out, compress='bz2'))
+        recs = list(GF.iter_records(out, True))
+        self.assertEqual(len(recs), len(gf.dataset[0].data))
+        for ((ds, d), e) in zip(recs, gf.dataset[0].data):
+            self.assertEqual(ds, 0)
+            self.assertTrue(numpy.array_equal(d.array, e.array))
+            continue
+        return
+
+    def test_writer(self):
+        gf = self.read(self.files['FLOW'])
+        out = self.path('FLOW.w.gz')
+        with GF.GF_WRITER() as w:
+            self.assertTrue(w.open(out, gf.fileType, gf.comment,
+                                   compress='gzip'))
+            for ds in gf.dataset:
+                self.assertTrue(w.writeDataset(ds))
+                continue
+        sameFile(self, self.read(out), gf)
+        return
+
+    @unittest.skipIf(not os.path.exists('/dev/full'), 'no /dev/full')
+    def test_write_failed(self):
+        gf = self.read(self.files['FLOW'])
+        for c in [None,] + COMPRESS:
+            self.assertFalse(gf.write('/dev/full', compress=c))
+            continue
+        # failed while writing records (not only on close)
+        d = GF.GF_DATA()
+        d.setType(GF.FLT_ARY_TYPE)
+        d.keyword = '*RAND_3D'
+        d.setNums(500000, 3)
+        d.array[:] = numpy.random.RandomState(1).random_sample((500000, 3))
+        gf.dataset[0].append(d)
+        wchunk = GF.WRITE_CHUNK_SIZE
+        GF.WRITE_CHUNK_SIZE = 65536
+        try:
+            for c in COMPRESS:
+                self.assertFalse(gf.write('/dev/full', compress=c))
+                continue
+        finally:
+            GF.WRITE_CHUNK_SIZE = wchunk
+        return
+
+    def test_read_failed(self):
+        out = self.path('FLOW.cut.gz')
+        with open(self.files['FLOW'], 'rb') as f:
+            buff = f.read()
+        g = gzip.GzipFile(out, 'wb')
+        g.write(buff[:len(buff) // 2])
+        g.close()
+        gf = GF.GF_FILE()
+        gf.read(out)
+        # records before the cut are read, no more
+        self.assertTrue(sum([len(ds.data) for ds in gf.dataset]) < 8)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+converters (gf2lsv.py, gf2lsvPara.py, gf2vtk.py) run on generated files:
+outputs converted serially and by --jobs are the same byte by byte, and
+so are those of little- and big-endian inputs
+"""
+import sys, os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from common import TOP, generate
+
+PYGF = os.path.join(TOP, 'pyGF')
+
+try:
+    import vtk
+except ImportError:
+    vtk = None
+
+
+def readFiles(outdir):
+    """
+    returns dict of name: contents of files in outdir
+    """
+    files = {}
+    for name in sorted(os.listdir(outdir)):
+        with open(os.path.join(outdir, name), 'rb') as f:
+            files[name] = f.read()
+        continue
+    return files
+
+
+class TestConvert(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'mixed', 3, 3)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def convert(self, script, args, name):
+        """
+        run a converter in a new directory name, writing outputs named
+        'out...' there
+        returns dict of name: contents of the outputs
+        """
+        outdir = os.path.join(self.tmpdir, name)
+        os.makedirs(outdir)
+        p = subprocess.Popen([sys.executable, os.path.join(PYGF, script)]
+                             + args, cwd=outdir, stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        self.assertEqual(p.returncode, 0, out)
+        files = readFiles(outdir)
+        self.assertTrue(len(files) > 0)
+        return files
+
+    def same(self, script, args, name, variants):
+        """
+        convert by args, and by args + each of variants; all outputs are
+        the same
+        returns the outputs
+        """
+        ref = self.convert(script, args, name)
+        for (i, v) in enumerate(variants):
+            files = self.convert(script, args + v, '%s_%d' % (name, i))
+            self.assertEqual(sorted(files.keys()), sorted(ref.keys()))
+            for k in ref:
+                self.assertEqual(files[k], ref[k], '%s %s: %s' % (name, v, k))
+                continue
+            continue
+        return ref
+
+    def steps(self, idx):
+        """
+        returns list of (index, time) of <step> of an LSV index
+        """
+        steps = []
+        for line in idx.decode('latin-1').splitlines():
+            line = line.strip()
+            if line.startswith('<step '):
+                ix = line.split('"')
+                steps.append((int(ix[1]), float(ix[3])))
+            continue
+        return steps
+
+    def test_gf2lsv(self):
+        f = self.files
+        for (opts, n) in ((['--order', '0'], 'o0'),
+                          (['--order', 'all'], 'oa'),
+                          (['--fields', 'PRES_3E,VELO_3D'], 'of')):
+            args = ['--mesh', f['MESH'], '--data', f['FLOW'],
+                    '--out', 'out'] + opts
+            ref = self.same('gf2lsv.py', args, 'lsv_' + n,
+                            [['--jobs', '2'], ['--jobs', '3']])
+            self.assertEqual(sorted(ref.keys()),
+                             ['out.idx', 'out.unm', 'out_0000.und',
+                              'out_0001.und', 'out_0002.und'])
+            self.assertEqual(self.steps(ref['out.idx']),
+                             [(0, 0.0), (1, 0.01), (2, 0.02)])
+            be = self.convert('gf2lsv.py', ['--mesh', f['MESH.be'],
+                                            '--data', f['FLOW.be'],
+                                            '--out', 'out'] + opts,
+                              'lsv_be_' + n)
+            self.assertEqual(be, ref)
+            continue
+        # ascii
+        self.same('gf2lsv.py', ['--amesh', f['AMESH'], '--adata', f['AFLOW'],
+                                '--out', 'out', '--order', 'all'],
+                  'lsv_a', [['--jobs', '2']])
+        return
+
+    def test_gf2lsv_series(self):
+        # steps of several files, sorted by step
+        f = self.files
+        args = ['--mesh', f['MESH'], '--data', f['FLOW'], f['FLOW.be'],
+                '--out', 'out', '--order', '1']
+        ref = self.same('gf2lsv.py', args, 'lsv_s', [['--jobs', '2']])
+        self.assertEqual(len(ref), 8)
+        self.assertEqual(self.steps(ref['out.idx']),
+                         [(0, 0.0), (1, 0.0), (2, 0.01), (3, 0.01),
+                          (4, 0.02), (5, 0.02)])
+        self.assertEqual(ref['out_0000.und'], ref['out_0003.und'])
+        return
+
+    def test_gf2lsvPara(self):
+        f = self.files
+        base = os.path.join(self.tmpdir, '')
+        for order in ('0', '1'):
+            args = ['--ddd', f['DDD'], '--mesh', base + 'MESH.P',
+                    '--data', base + 'FLOW.P', '--out', 'out',
+                    '--order', order]
+            ref = self.same('gf2lsvPara.py', args, 'para_' + order,
+                            [['--jobs', '2'], ['--jobs', '3']])
+            self.assertEqual(len(ref), 7)
+            self.assertEqual(self.steps(ref['out.idx']), [(0, 0.0)])
+            continue
+        return
+
+    @unittest.skipIf(vtk is None, 'vtk is not installed')
+    def test_gf2vtk(self):
+        f = self.files
+        for (opts, n) in ((['--order', '1'], 'o1'),
+                          (['--order', 'all'], 'oa'),
+                          (['--fields', 'VELO_3D'], 'of')):
+            args = ['--mesh', f['MESH'], '--data', f['FLOW'],
+                    '--out', 'out.vtk'] + opts
+            ref = self.same('gf2vtk.py', args, 'vtk_' + n, [['--jobs', '2']])
+            self.assertEqual(sorted(ref.keys()),
+                             ['out_0000.vtk', 'out_0001.vtk', 'out_0002.vtk'])
+            be = self.convert('gf2vtk.py', ['--mesh', f['MESH.be'],
+                                            '--data', f['FLOW.be'],
+                                            '--out', 'out.vtk'] + opts,
+                              'vtk_be_' + n)
+            self.assertEqual(be, ref)
+            continue
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+per-record I/O profiling (GF_PROFILE), stages, and profiles of worker
+processes merged into the parent
+"""
+import sys, os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from common import GF, generate
+
+
+def countRecords(path):
+    gf = GF.GF_FILE()
+    gf.read(path)
+    return sum([len(ds.data) for ds in gf.dataset])
+
+
+class TestProfile(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'tet', 2)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def tearDown(self):
+        GF.PROFILE = None
+        return
+
+    def test_events(self):
+        nflow = countRecords(self.files['FLOW'])
+        events = []
+        GF.PROFILE = GF.GF_PROFILE(callback=events.append, keep=True)
+        with GF.profile_stage('read'):
+            gf = GF.GF_FILE()
+            self.assertTrue(gf.read(self.files['FLOW']))
+        GF.GF_FILE().read(self.files['FLOW.be'], mmap=True)
+        GF.GF_FILE().read_ascii(self.files['AFLOW'])
+        with GF.profile_stage('write'):
+            gf.write(os.path.join(self.tmpdir, 'FLOW.out'))
+        with GF.profile_stage('read'):
+            GF.GF_FILE().read(self.files['MESH'])
+
+        n = len(events)
+        self.assertEqual(events, GF.PROFILE.events)
+        tot = GF.PROFILE.totals
+        self.assertEqual(sorted(tot.keys()),
+                         ['map', 'read', 'read_ascii', 'write'])
+        self.assertEqual(tot['read'][0], nflow + 2)
+        self.assertEqual(tot['map'][0], nflow)
+        self.assertEqual(tot['read_ascii'][0], nflow)
+        self.assertEqual(tot['write'][0], nflow)
+        self.assertEqual(sum([t[0] for t in tot.values()]), n)
+        velo = [e for e in events
+                if e['op'] == 'read' and e['keyword'] == '*VELO_3D']
+        self.assertEqual(velo[0]['bytes'],
+                         gf.dataset[0]['*VELO_3D'].array.size * 4)
+        self.assertEqual([s[0] for s in GF.PROFILE.stages],
+                         ['read', 'write'])
+        report = GF.PROFILE.report()
+        for op in ('map', 'read', 'read_ascii', 'write'):
+            self.assertTrue('\n' + op + ' ' in report, op)
+            continue
+        return
+
+    def test_merge(self):
+        GF.PROFILE = GF.GF_PROFILE()
+        with GF.profile_stage('stage'):
+            GF.GF_FILE().read(self.files['MESH'])
+        other = GF.GF_PROFILE(keep=True)
+        other.record('read', '*VELO_3D', 100, 0.5, 0.25)
+        other.add_stage('stage', 1.0)
+        other.add_stage('other', 2.0)
+        other = pickle.loads(pickle.dumps(other))
+        (n, nbytes, io, dec) = GF.PROFILE.totals['read']
+        GF.PROFILE.merge(other)
+        GF.PROFILE.merge(other)
+        self.assertEqual(GF.PROFILE.totals['read'][:2], [n + 2, nbytes + 200])
+        self.assertAlmostEqual(GF.PROFILE.totals['read'][2], io + 1.0)
+        self.assertAlmostEqual(GF.PROFILE.totals['read'][3], dec + 0.5)
+        self.assertEqual([s[0] for s in GF.PROFILE.stages],
+                         ['stage', 'other'])
+        self.assertTrue(GF.PROFILE.stages[0][1] >= 2.0)
+        self.assertEqual(GF.PROFILE.stages[1][1], 4.0)
+        self.assertEqual(GF.PROFILE.events, [])
+        return
+
+    def test_profile_task(self):
+        (ret, prof) = GF.profile_task(False, countRecords,
+                                      self.files['FLOW'])
+        self.assertTrue(prof is None)
+        parent = GF.PROFILE = GF.GF_PROFILE()
+        (ret, prof) = GF.profile_task(True, countRecords, self.files['FLOW'])
+        # profiled apart, and given back to be merged
+        self.assertTrue(GF.PROFILE is parent)
+        self.assertEqual(parent.totals, {})
+        self.assertEqual(prof.totals['read'][0], ret)
+        parent.merge(prof)
+        self.assertEqual(parent.totals['read'][0], ret)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+scanning binary GF files and loading records on demand: scan/load,
+mmap, read_rows, workers, keywords and the keyword index of DATASET
+"""
+import sys, os
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from common import GF, generate, sameFile
+
+
+class TestScan(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.files = generate(cls.tmpdir, 'hex', 3)
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def read(self, path, **kw):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.read(path, **kw), path)
+        return gf
+
+    def test_scan_load(self):
+        for name in ('FLOW', 'FLOW.be'):
+            gf = self.read(self.files[name])
+            sc = GF.GF_FILE()
+            self.assertTrue(sc.scan(self.files[name]))
+            self.assertEqual(len(sc.dataset), len(gf.dataset))
+            for (a, b) in zip(sc.dataset, gf.dataset):
+                for (x, y) in zip(a.data, b.data):
+                    self.assertTrue(x.array is None)
+                    self.assertEqual(list(x.aryNum), list(y.aryNum))
+                    continue
+                continue
+            for ds in range(len(sc.dataset)):
+                for i in range(len(sc.dataset[ds].data)):
+                    self.assertTrue(sc.load(i, ds) is not None)
+                    continue
+                continue
+            sameFile(self, sc, gf)
+            self.assertTrue(sc.load('*NOTHING') is None)
+            self.assertTrue(sc.load(99) is None)
+            continue
+        return
+
+    def test_mmap(self):
+        for name in ('MESH.be', 'FLOW'):
+            gf = self.read(self.files[name])
+            mm = self.read(self.files[name], mmap=True)
+            sameFile(self, mm, gf)
+            d = mm.dataset[0].data[-1]
+            self.assertFalse(d.array.flags.writeable)
+            sc = GF.GF_FILE()
+            self.assertTrue(sc.open(self.files[name], mmap=True))
+            for ds in range(len(sc.dataset)):
+                for i in range(len(sc.dataset[ds].data)):
+                    self.assertTrue(sc.load(i, ds, mmap=True) is not None)
+                    continue
+                continue
+            sc.close()
+            sameFile(self, sc, gf)
+            continue
+        return
+
+    def test_read_rows(self):
+        gf = self.read(self.files['FLOW'])
+        velo = gf.dataset[1]['*VELO_3D'].array
+        rgap = GF.READ_GAP_SIZE
+        for gap in (0, rgap):
+            GF.READ_GAP_SIZE = gap
+            try:
+                for mmap in (False, True):
+                    sc = GF.GF_FILE()
+                    self.assertTrue(sc.open(self.files['FLOW.be'], mmap))
+                    for rows in ([0, 3, 4, 100, len(velo) - 1], (10, 20),
+                                 [50, 2, 50]):
+                        r = sc.read_rows('*VELO_3D', rows, ds=1)
+                        if isinstance(rows, tuple):
+                            ref = velo[rows[0]:rows[1]]
+                        else:
+                            ref = velo[rows]
+                        self.assertTrue(numpy.array_equal(r, ref), rows)
+                        continue
+                    r = sc.read_rows('*VELO_3D', (0, 5), ds=1, native=True)
+                    self.assertEqual(r.dtype, numpy.float32)
+                    sc.close()
+                    continue
+            finally:
+                GF.READ_GAP_SIZE = rgap
+            continue
+        return
+
+    def test_workers(self):
+        for name in ('MESH', 'FLOW.be'):
+            gf = self.read(self.files[name])
+            for workers in (2, 4):
+                sameFile(self, self.read(self.files[name], workers=workers),
+                         gf)
+                continue
+            nat = self.read(self.files[name], workers=3, native=True)
+            sameFile(self, nat, self.read(self.files[name], native=True),
+                     True)
+            continue
+        return
+
+    def test_keywords(self):
+        gf = self.read(self.files['FLOW'])
+        for mmap in (False, True):
+            kw = self.read(self.files['FLOW'], keywords=['*PRES_3E ',
+                                                         '*TIME_PS'],
+                           mmap=mmap)
+            for (a, b) in zip(kw.dataset, gf.dataset):
+                for (x, y) in zip(a.data, b.data):
+                    if x.keyword in ('*PRES_3E', '*TIME_PS'):
+                        self.assertTrue(numpy.array_equal(x.array, y.array))
+                    else:
+                        self.assertTrue(x.array is None)
+                    continue
+                continue
+            continue
+        return
+
+    def test_index(self):
+        gf = self.read(self.files['FLOW'])
+        ds = gf.dataset[0]
+        self.assertEqual(ds.keys(), ['*TIME_PS', '*STEP_PS', '*VELO_3D',
+                                     '*PRES_3E'])
+        self.assertTrue('*VELO_3D' in ds)
+        self.assertTrue(' *VELO_3D ' in ds)
+        self.assertFalse('*NOTHING' in ds)
+        self.assertTrue(ds['*PRES_3E'] is ds.data[3])
+        self.assertTrue(ds.get('*NOTHING') is None)
+        self.assertRaises(KeyError, lambda: ds['*NOTHING'])
+        for i in (2, numpy.int64(2), numpy.int32(2)):
+            self.assertTrue(ds[i] is ds.data[2])
+            self.assertTrue(gf.load(i) is ds.data[2])
+            continue
+        # the first record of a keyword, and reindexed when modified
+        dup = GF.GF_DATA()
+        dup.keyword = '*VELO_3D'
+        ds.append(dup)
+        self.assertTrue(ds['*VELO_3D'] is ds.data[2])
+        ds.data.insert(0, dup)
+        self.assertTrue(ds['*VELO_3D'] is dup)
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()
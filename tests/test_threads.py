@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+loading records of one GF file kept open by GF_FILE.open from threads
+"""
+import sys, os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pyGF'))
+import GF
+
+NUM = 20000
+THREADS = 8
+TRIALS = 100
+
+
+def makeData(keyword, atp, ary):
+    d = GF.GF_DATA()
+    d.setType(atp)
+    d.keyword = keyword
+    d.comment = keyword.ljust(30)
+    d.setNums(ary.shape[0], ary.shape[1])
+    d.array[:] = ary
+    return d
+
+
+class TestThreads(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, 'FLOW')
+        cls.velo = []
+        w = GF.GF_WRITER()
+        assert w.open(cls.path, '#U_GF_V1', ['threads test'.ljust(60)])
+        for i in range(3):
+            velo = numpy.arange(NUM * 3, dtype=float).reshape((NUM, 3)) + i
+            cls.velo.append(velo)
+            assert w.newDataset()
+            assert w.writeData(makeData('*VELO_3D', GF.FLT_ARY_TYPE, velo))
+            continue
+        assert w.close()
+        return
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+        return
+
+    def run_threads(self, gf, work):
+        """
+        run work(i) by THREADS threads at once, TRIALS times, unloading
+        the arrays before each trial; returns list of failures
+        """
+        errs = []
+        def target(i, start):
+            start.wait()
+            try:
+                work(i)
+            except Exception as e:
+                errs.append(e)
+            return
+        for trial in range(TRIALS):
+            for ds in gf.dataset:
+                for d in ds.data:
+                    d.array = None
+                    continue
+                continue
+            start = threading.Event()
+            ts = [threading.Thread(target=target, args=(i, start))
+                  for i in range(THREADS)]
+            for t in ts:
+                t.start()
+            start.set()
+            for t in ts:
+                t.join()
+            if errs:
+                break
+            continue
+        return errs
+
+    def check_load(self, mmap):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.open(self.path, mmap=mmap))
+        def work(i):
+            d = gf.load('*VELO_3D', ds=1)
+            assert d is not None
+            assert d.aryNum == [NUM, 3], d.aryNum
+            assert d.array.shape == (NUM, 3), d.array.shape
+            assert (d.array == self.velo[1]).all()
+            return
+        errs = self.run_threads(gf, work)
+        gf.close()
+        self.assertEqual(errs, [])
+        return
+
+    def test_load(self):
+        self.check_load(False)
+        return
+
+    def test_load_mmap(self):
+        self.check_load(True)
+        return
+
+    def test_load_read_rows(self):
+        gf = GF.GF_FILE()
+        self.assertTrue(gf.open(self.path))
+        rows = [0, 7, NUM // 2, NUM - 1]
+        def work(i):
+            if i % 2 == 0:
+                d = gf.load('*VELO_3D', ds=2)
+                assert d is not None and d.array.shape == (NUM, 3)
+            r = gf.read_rows('*VELO_3D', rows, ds=2)
+            assert r is not None
+            assert (r == self.velo[2][rows]).all()
+            r = gf.read_rows('*VELO_3D', (10, 20), ds=2)
+            assert (r == self.velo[2][10:20]).all()
+            return
+        errs = self.run_threads(gf, work)
+        gf.close()
+        self.assertEqual(errs, [])
+        return
+
+
+if __name__ == '__main__':
+    unittest.main()